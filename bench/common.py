@@ -0,0 +1,101 @@
+# bench/common.py
+import os, random, sys, time
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+FLEET = {"drone": 2, "medic": 3, "truck": 2}
+
+
+def load_map(name_or_path):
+    """A bundled map by name (map_small), a YAML path, or synthetic_<size> (see synthetic_map)."""
+    if name_or_path.startswith("synthetic_"):
+        return synthetic_map(int(name_or_path.split("_", 1)[1]))
+    path = name_or_path if os.path.exists(name_or_path) else os.path.join(ROOT, "configs", f"{name_or_path}.yaml")
+    with open(path, "r") as f:
+        return yaml.safe_load(f) or {}
+
+
+def synthetic_map(size, seed=0, density=0.1):
+    """
+    A size x size map config in the configs/map_*.yaml format: `density` of the
+    cells are buildings, fires or rubble; survivors and hospitals scale with area.
+    """
+    rng = random.Random(seed)
+    cells = [(x, y) for x in range(size) for y in range(size) if (x, y) != (0, 0)]
+    rng.shuffle(cells)
+    n = int(len(cells) * density)
+    hospitals = cells[n:n + max(2, size // 16)]
+    return {
+        "width": size,
+        "height": size,
+        "depot": [0, 0],
+        "hospitals": [list(p) for p in hospitals],
+        "buildings": [list(p) for p in cells[:n // 2]],
+        "initial_fires": [list(p) for p in cells[n // 2:3 * n // 4]],
+        "rubble": [list(p) for p in cells[3 * n // 4:n]],
+        "survivors": max(15, size * size // 100),
+    }
+
+
+class GridView:
+    """The width / height / cell_types[y][x] view of a map that tools.routing.shortest_path expects."""
+
+    def __init__(self, cfg):
+        self.width, self.height = cfg.get("width", 20), cfg.get("height", 20)
+        self.cell_types = [["empty"] * self.width for _ in range(self.height)]
+        for key, kind in (("buildings", "building"), ("initial_fires", "fire"), ("rubble", "rubble")):
+            for x, y in cfg.get(key, []) or []:
+                self.cell_types[y][x] = kind
+
+
+def synthetic_state(cfg, seed=0, tick=0, fleet=None):
+    """
+    A summarize_state()-shaped dict built straight from a map config, so the
+    reasoning / logging hot paths can be timed without stepping a CrisisModel.
+    """
+    rng = random.Random(seed)
+    W, H = cfg.get("width", 20), cfg.get("height", 20)
+    depot = list(cfg.get("depot", [0, 0]))
+    blocked = {tuple(p) for key in ("buildings", "initial_fires", "rubble") for p in cfg.get(key, []) or []}
+
+    def free_cell():
+        while True:
+            p = (rng.randrange(W), rng.randrange(H))
+            if p not in blocked:
+                return list(p)
+
+    agents, i = [], 0
+    for kind, n in (fleet or FLEET).items():
+        for _ in range(n):
+            agents.append({"id": str(i), "kind": kind, "pos": free_cell(), "carrying": False,
+                           "battery": rng.randrange(10, 100), "status": "active"})
+            i += 1
+    n_surv = cfg.get("survivors", 10)
+    if isinstance(n_surv, list):
+        n_surv = len(n_surv)
+    return {
+        "tick": tick,
+        "width": W,
+        "height": H,
+        "depot": depot,
+        "agents": agents,
+        "survivors": [{"id": j, "pos": free_cell(), "time_left": rng.randrange(20, 200)} for j in range(n_surv)],
+        "fires": [list(p) for p in cfg.get("initial_fires", []) or []],
+        "rubble": [list(p) for p in cfg.get("rubble", []) or []],
+        "hospitals": [{"pos": list(p), "queue": 0} for p in cfg.get("hospitals", []) or []],
+    }
+
+
+def timeit(fn, repeat=200, warmup=5):
+    """Return per-call seconds (median of `repeat` runs)."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    samples.sort()
+    return samples[len(samples) // 2]
@@ -0,0 +1,69 @@
+# bench/context_budget.py
+"""
+Check that build_budgeted_context() keeps its token budget, and time it.
+
+Random states (up to 60 agents, 600 survivors, 300 fires on 20x20 to 200x200
+maps) at budgets small enough that many calls reach the last resort (compact
+agents, no region detail, agents cut). Every returned context must serialize
+to at most max_tokens, unless even the context without any agent does not
+(then nothing smaller exists). Exit code 1 on a violation.
+
+    python bench/context_budget.py
+    python bench/context_budget.py --states 1000 --budgets 300 500 1500
+"""
+import argparse, json, random, sys, time
+from common import ROOT  # noqa: F401  (puts the repo root on sys.path)
+
+from reasoning.context import build_budgeted_context
+from reasoning.utils import count_tokens
+
+
+def random_state(rng):
+    size = rng.choice([20, 64, 200])
+    cell = lambda: [rng.randrange(size), rng.randrange(size)]
+    return {
+        "tick": rng.randrange(200),
+        "depot": [0, 0],
+        "agents": [{"id": str(i), "kind": rng.choice(["drone", "medic", "truck"]), "pos": cell(),
+                    "carrying": rng.random() < 0.3, "battery": rng.randrange(100)}
+                   for i in range(rng.randrange(1, 60))],
+        "survivors": [{"pos": cell()} for _ in range(rng.randrange(600))],
+        "fires": [cell() for _ in range(rng.randrange(300))],
+        "rubble": [cell() for _ in range(rng.randrange(100))],
+        "hospitals": [{"pos": cell()} for _ in range(2)],
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--states", type=int, default=300)
+    ap.add_argument("--budgets", nargs="+", type=int, default=[300, 500, 1500])
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    rng = random.Random(args.seed)
+    states = [random_state(rng) for _ in range(args.states)]
+    failures = 0
+    print(f"{'budget':>7} {'last resort':>12} {'max tokens':>11} {'ms/call':>8}")
+    for budget in args.budgets:
+        cut, worst, t0 = 0, 0, time.perf_counter()
+        for i, state in enumerate(states):
+            ctx = build_budgeted_context(state, max_tokens=budget)
+            tokens = count_tokens(json.dumps(ctx))
+            worst = max(worst, tokens)
+            if "omitted_agents" in ctx:
+                cut += 1
+            if tokens > budget and not (ctx.get("omitted_agents") and not ctx["agents"]):
+                failures += 1
+                print(f"  state {i}: {tokens} tokens > {budget}")
+        ms = (time.perf_counter() - t0) * 1000 / len(states)
+        print(f"{budget:>7} {cut:>12} {worst:>11} {ms:>8.2f}")
+    if failures:
+        print(f"{failures} context(s) over budget")
+        return 1
+    print("All contexts within budget.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+# bench/fire_dynamics.py
+"""
+Per-tick cost of fire spread and aftershocks, 100x100 to 2000x2000.
+
+Compares the per-burning-cell loop (v1 semantics, env/dynamics.py style:
+every burning cell tries its empty neighbours one draw at a time) with the
+array version in env/fire.py (v2: one pass per tick), at a sparse and a
+dense burning front, and checks that both ignite the same expected number of
+cells per tick.
+
+    python bench/fire_dynamics.py
+    python bench/fire_dynamics.py --sizes 100 500 --burning 0.01 0.2 --ticks 20
+"""
+import argparse, random, time
+import numpy as np
+from common import ROOT  # noqa: F401  (puts the repo root on sys.path)
+
+from env.mapcache import EMPTY, BUILDING, FIRE
+from env.fire import spread_fires, trigger_aftershocks
+
+P_SPREAD, P_AFTERSHOCK, AFTERSHOCK_CELLS = 0.02, 0.02, 3
+
+
+def make_grid(size, burning, seed=0):
+    """size x size grid with 8% buildings and `burning` of the cells on fire."""
+    rng = np.random.default_rng(seed)
+    u = rng.random((size, size))
+    cells = np.full((size, size), EMPTY, dtype=np.uint8)
+    cells[u < 0.08] = BUILDING
+    cells[(u >= 0.08) & (u < 0.08 + burning)] = FIRE
+    return cells
+
+
+def spread_reference(cells, rng, p):
+    """v1: per burning cell, one draw per empty 4-neighbour."""
+    H, W = cells.shape
+    grid = cells.tolist()
+    ys, xs = np.nonzero(cells == FIRE)
+    new = []
+    for y, x in zip(ys.tolist(), xs.tolist()):
+        for nx, ny in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+            if 0 <= nx < W and 0 <= ny < H and grid[ny][nx] == EMPTY and rng.random() < p:
+                new.append((ny, nx))
+    for y, x in new:
+        cells[y, x] = FIRE
+    return len(set(new))
+
+
+def per_tick(fn, cells, ticks):
+    """Median seconds per tick; every tick starts from the same grid."""
+    samples = []
+    for _ in range(ticks):
+        grid = cells.copy()
+        t0 = time.perf_counter()
+        fn(grid)
+        samples.append(time.perf_counter() - t0)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", nargs="+", type=int, default=[100, 250, 500, 1000, 2000])
+    ap.add_argument("--burning", nargs="+", type=float, default=[0.01, 0.1], help="Fraction of cells on fire")
+    ap.add_argument("--ticks", type=int, default=10)
+    args = ap.parse_args()
+
+    print(f"{'size':>6} {'burning':>8} {'v1 ms':>9} {'v2 ms':>8} {'speedup':>8} {'v1 new':>8} {'v2 new':>8}")
+    for size in args.sizes:
+        for burning in args.burning:
+            cells = make_grid(size, burning)
+            py_rng, np_rng = random.Random(0), np.random.default_rng(0)
+            v1 = per_tick(lambda g: spread_reference(g, py_rng, P_SPREAD), cells, args.ticks)
+            v2 = per_tick(lambda g: (spread_fires(g, np_rng, P_SPREAD),
+                                     trigger_aftershocks(g, np_rng, P_AFTERSHOCK, AFTERSHOCK_CELLS)), cells, args.ticks)
+            # same expected ignitions per tick (different draws)
+            n1 = np.mean([spread_reference(cells.copy(), py_rng, P_SPREAD) for _ in range(5)])
+            n2 = np.mean([spread_fires(cells.copy(), np_rng, P_SPREAD).sum() for _ in range(5)])
+            print(f"{size:>6} {burning:>8.2f} {v1 * 1e3:>9.2f} {v2 * 1e3:>8.2f} {v1 / v2:>7.1f}x {n1:>8.1f} {n2:>8.1f}",
+                  flush=True)
+
+
+if __name__ == "__main__":
+    main()
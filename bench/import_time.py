@@ -0,0 +1,125 @@
+# bench/import_time.py
+"""
+Cold-start cost of the command-line entry points.
+
+Every target runs in a fresh interpreter (`python -X importtime -c ...` from the
+repo root), so nothing is cached in sys.modules; the reported time is the
+median wall time minus that of a bare `python -c pass`. The slowest imports by
+self time are listed for the first target, which is where a new eager
+top-level import of pandas / matplotlib / jsonschema / mesa shows up first.
+
+    python bench/import_time.py --save-baseline     # record bench/import_baseline.json
+    python bench/import_time.py                     # fail (exit 1) on a slowdown vs it
+    python bench/import_time.py --runs 20 --threshold 0.5 --top 25
+
+A target counts as a regression when it is slower than the baseline by more
+than `--threshold` (relative) and `--slack-ms` (absolute, start-up noise).
+"""
+import argparse, json, os, platform, shutil, subprocess, sys, time
+from common import ROOT
+
+TARGETS = {
+    "import_main": "import main",
+    "import_harness": "import eval.harness",
+    "import_plots": "import eval.plots",
+    "import_planner": "import reasoning.planner",
+    "import_llm_client": "import reasoning.llm_client",
+    "main_help": "import sys, main; sys.argv = ['main.py', '--help']; main.main()",
+}
+
+
+def run_once(code, importtime=False):
+    """(wall seconds, stderr) of `python -c code` in a fresh interpreter."""
+    cmd = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", code]
+    t0 = time.perf_counter()
+    proc = subprocess.run(cmd, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    sec = time.perf_counter() - t0
+    if proc.returncode != 0:
+        raise RuntimeError(f"{code!r} failed:\n{proc.stderr.strip()[-2000:]}")
+    return sec, proc.stderr
+
+
+def median_time(code, runs):
+    samples = sorted(run_once(code)[0] for _ in range(runs))
+    return samples[len(samples) // 2]
+
+
+def top_imports(code, n):
+    """[(self ms, cumulative ms, module)] of the n slowest imports by self time."""
+    rows = []
+    for line in run_once(code, importtime=True)[1].splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cum_us, name = (part.strip() for part in line[len("import time:"):].split("|", 2))
+        rows.append((int(self_us) / 1e3, int(cum_us) / 1e3, name.strip()))
+    return sorted(rows, reverse=True)[:n]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--targets", nargs="+", default=list(TARGETS), choices=list(TARGETS))
+    ap.add_argument("--runs", type=int, default=10, help="Fresh interpreters per target (median is reported)")
+    ap.add_argument("--top", type=int, default=15, help="Slowest imports to list (0 = none)")
+    ap.add_argument("--out", type=str, default=os.path.join(ROOT, "bench", "results", "import_time.json"))
+    ap.add_argument("--baseline", type=str, default=os.path.join(ROOT, "bench", "import_baseline.json"))
+    ap.add_argument("--threshold", type=float, default=0.3, help="Allowed slowdown vs the baseline (0.3 = 30%%)")
+    ap.add_argument("--slack-ms", type=float, default=10.0, help="Slowdowns below this many ms never count")
+    ap.add_argument("--save-baseline", action="store_true", help="Write the results as the new baseline")
+    args = ap.parse_args()
+
+    bare = median_time("pass", args.runs)
+    results = {}
+    print(f"interpreter start-up: {bare * 1e3:.1f} ms (subtracted below)")
+    print(f"{'target':<20} {'ms':>8}")
+    for name in args.targets:
+        results[name] = max(0.0, median_time(TARGETS[name], args.runs) - bare)
+        print(f"{name:<20} {results[name] * 1e3:>8.1f}", flush=True)
+
+    top = top_imports(TARGETS[args.targets[0]], args.top) if args.top else []
+    if top:
+        print(f"\nslowest imports of {args.targets[0]} (self / cumulative ms)")
+        for self_ms, cum_ms, module in top:
+            print(f"{self_ms:>8.1f} {cum_ms:>8.1f}  {module}")
+
+    doc = {
+        "meta": {"python": platform.python_version(), "machine": platform.machine(),
+                 "platform": platform.platform(), "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                 "runs": args.runs, "startup_s": bare},
+        "results": results,
+        "top_imports": [{"module": m, "self_ms": s, "cumulative_ms": c} for s, c, m in top],
+    }
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(doc, f, indent=2)
+    print(f"\nWrote {len(results)} result(s) to {args.out}")
+
+    if args.save_baseline:
+        shutil.copyfile(args.out, args.baseline)
+        print(f"Saved baseline {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline} (record one with --save-baseline)")
+        return 0
+
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f).get("results", {})
+    print(f"\nvs baseline {args.baseline}, threshold +{args.threshold:.0%} and +{args.slack_ms:g} ms")
+    print(f"{'target':<20} {'base ms':>8} {'now ms':>8}")
+    regressions = []
+    for name, sec in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        regressed = sec > base * (1 + args.threshold) and (sec - base) * 1e3 > args.slack_ms
+        print(f"{name:<20} {base * 1e3:>8.1f} {sec * 1e3:>8.1f}{'  REGRESSION' if regressed else ''}")
+        if regressed:
+            regressions.append(name)
+    if regressions:
+        print(f"{len(regressions)} regression(s)")
+        return 1
+    print("No regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
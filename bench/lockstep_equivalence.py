@@ -0,0 +1,66 @@
+# bench/lockstep_equivalence.py
+"""
+Check that lockstep batches reproduce sequential runs, and compare their speed.
+
+Runs the same seeds once with run_lean_episode() one after another and once
+through eval/lockstep.py in a single batch, then compares the end-of-run
+metrics of every seed (timings excluded). Exit code 1 on any difference.
+
+    python bench/lockstep_equivalence.py
+    python bench/lockstep_equivalence.py --map configs/map_medium.yaml --seeds 0 1 2 3 4 5 --ticks 60 --policy heuristic
+"""
+import argparse, os, sys, time
+from common import ROOT
+
+# timings and what is derived from them differ between any two runs
+TIMING_KEYS = ("avg_plan_latency_ms", "p95_plan_latency_ms")
+
+
+def comparable(metrics):
+    return {k: v for k, v in metrics.items() if k not in TIMING_KEYS and not k.startswith("phase_")}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--map", type=str, default=os.path.join(ROOT, "configs", "map_small.yaml"))
+    ap.add_argument("--seeds", nargs="+", type=int, default=[0, 1, 2, 3, 4, 5])
+    ap.add_argument("--ticks", type=int, default=60)
+    ap.add_argument("--policy", type=str, default="llm", choices=["llm", "heuristic", "numpy"])
+    ap.add_argument("--strategy", type=str, default="react")
+    args = ap.parse_args()
+
+    from main import run_lean_episode
+    from eval.harness import run_specs
+    from eval.lockstep import run_lockstep
+    label = args.strategy if args.policy == "llm" else args.policy
+    specs = run_specs([args.map], [label], args.seeds)
+    opts = {"ticks": args.ticks, "policy": args.policy, "provider": "mock", "log_level": "none",
+            "context_tokens": None}
+
+    t0 = time.perf_counter()
+    sequential = {s["run_id"]: run_lean_episode(s["map_path"], seed=s["seed"], ticks=args.ticks, policy=args.policy,
+                                                strategy=args.strategy, provider="mock", run_id=s["run_id"],
+                                                log_level="none")
+                  for s in specs}
+    t_seq = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    lockstep = run_lockstep(specs, opts, batch_size=len(specs))
+    t_lock = time.perf_counter() - t0
+
+    print(f"{len(specs)} episodes x {args.ticks} ticks: sequential {t_seq:.2f}s, lockstep {t_lock:.2f}s")
+    failures = 0
+    for spec in specs:
+        a, b = comparable(sequential[spec["run_id"]]), comparable(lockstep[spec["run_id"]])
+        diff = sorted(k for k in a.keys() | b.keys() if a.get(k) != b.get(k))
+        if diff:
+            failures += 1
+            print(f"  {spec['run_id']}: " + ", ".join(f"{k} {a.get(k)} != {b.get(k)}" for k in diff))
+    if failures:
+        print(f"{failures} episode(s) differ")
+        return 1
+    print("Lockstep matches sequential runs.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
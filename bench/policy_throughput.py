@@ -0,0 +1,35 @@
+# bench/policy_throughput.py
+"""
+Per-tick decision cost of each policy on a map (no environment stepping).
+
+    python bench/policy_throughput.py --map map_medium
+"""
+import argparse, json
+from common import load_map, synthetic_state, timeit
+
+from reasoning.policy import make_policy
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--map", type=str, default="map_medium")
+    ap.add_argument("--repeat", type=int, default=300)
+    ap.add_argument("--survivors", type=int, default=None, help="Override the survivor count of the map")
+    args = ap.parse_args()
+
+    cfg = load_map(args.map)
+    if args.survivors is not None:
+        cfg["survivors"] = args.survivors
+    state = synthetic_state(cfg, seed=0)
+
+    out = {"map": args.map, "survivors": len(state["survivors"])}
+    for name, kwargs in (("llm", {"strategy": "react"}), ("heuristic", {}), ("numpy", {})):
+        pol = make_policy(name, **kwargs)
+        sec = timeit(lambda: pol.observe(0, state), repeat=args.repeat)
+        out[f"{name}_us"] = round(sec * 1e6, 1)
+        pol.close()
+    print(json.dumps(out, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+# bench/suite.py
+"""
+Benchmark and regression suite for the simulation hot paths.
+
+Every case runs on the bundled maps plus synthetic large maps with fixed seeds
+and reports the median per-call time. Results go to a JSON file; with a
+baseline the run fails (exit code 1) when a case got slower than
+`--threshold` (relative) compared to it.
+
+    python bench/suite.py --save-baseline            # record bench/baseline.json on this machine
+    python bench/suite.py                            # compare against it
+    python bench/suite.py --cases routing mock --maps map_small synthetic_128 --threshold 0.1
+
+Cases that need the simulation (summarize_state, episode_*) are reported as
+skipped when env.world / mesa cannot be imported.
+"""
+import argparse, json, os, platform, random, shutil, sys, tempfile, time
+from common import ROOT, GridView, load_map, synthetic_state, timeit
+
+MAPS = ["map_small", "map_medium", "map_hard", "synthetic_64", "synthetic_128"]
+EPISODE_MAPS = ["map_small", "map_medium", "map_hard"]
+SEED = 0
+
+
+# ---------------------------------------------------------------------------
+# Cases: fn(cfg, name, repeat) -> {metric: seconds per call}
+# ---------------------------------------------------------------------------
+def bench_routing(cfg, name, repeat):
+    from tools.routing import shortest_path
+    grid = GridView(cfg)
+    rng = random.Random(SEED)
+    free = [(x, y) for y in range(grid.height) for x in range(grid.width)
+            if grid.cell_types[y][x] not in ("fire", "rubble")]
+    pairs = [(rng.choice(free), rng.choice(free)) for _ in range(10)]
+    sec = timeit(lambda: [shortest_path(grid, a, b) for a, b in pairs], repeat=max(3, repeat // 10))
+    return {"path": sec / len(pairs)}
+
+
+def bench_state_export(cfg, name, repeat):
+    from reasoning.state import TickState
+    state = synthetic_state(cfg, seed=SEED)
+    return {"tick_state": timeit(lambda: TickState(state, tick=0), repeat=repeat)}
+
+
+def bench_summarize_state(cfg, name, repeat):
+    from env.world import CrisisModel
+    model = CrisisModel(cfg.get("width", 20), cfg.get("height", 20), rng_seed=SEED, config=cfg, render=False)
+    return {"summarize_state": timeit(model.summarize_state, repeat=repeat)}
+
+
+def bench_world_index(cfg, name, repeat):
+    from env.spatial import WorldIndex
+    state = synthetic_state(cfg, seed=SEED)
+    index = WorldIndex.from_state(state)
+    index.summary()
+    ids = [a["id"] for a in state["agents"]]
+    step = [0]
+
+    def move_all():
+        # a typical tick: every agent moves, nothing else changes
+        step[0] = -step[0] or 1
+        for a in ids:
+            x, y = index.agents.pos_of(a)
+            index.on_move(a, (x + step[0], y))
+
+    def tick():
+        move_all()
+        return index.summary()
+
+    def rebuild():
+        # the same tick without incremental rendering
+        move_all()
+        index.invalidate()
+        return index.summary()
+
+    # run_episode's per-tick catch-up from the summary it takes anyway
+    moved = dict(state, agents=[dict(a, pos=[a["pos"][0] + 1, a["pos"][1]]) for a in state["agents"]])
+    states = [moved, state]
+
+    def sync():
+        states.reverse()
+        return index.sync(states[0])
+
+    return {"summary_incremental": timeit(tick, repeat=repeat),
+            "summary_full": timeit(rebuild, repeat=repeat),
+            "sync": timeit(sync, repeat=repeat),
+            "nearest_survivor": timeit(lambda: index.nearest_survivor((0, 0)), repeat=repeat)}
+
+
+def bench_prompt(cfg, name, repeat):
+    from reasoning import react, cot, plan_execute
+    from reasoning.state import TickState
+    from reasoning.utils import count_tokens
+    ts = TickState(synthetic_state(cfg, seed=SEED), tick=0)
+    out = {}
+    for label, mod in (("react", react), ("cot", cot), ("plan_execute", plan_execute)):
+        out[label] = timeit(lambda: mod.build_messages(ts), repeat=repeat)
+    messages = react.build_messages(ts)
+    out["count_tokens"] = timeit(lambda: sum(count_tokens(m["content"]) for m in messages), repeat=repeat)
+    return out
+
+
+def bench_mock(cfg, name, repeat):
+    from reasoning import react
+    from reasoning.llm_client import _call_mock
+    from reasoning.state import TickState
+    ts = TickState(synthetic_state(cfg, seed=SEED), tick=0)
+    messages = react.build_messages(ts)
+    return {
+        "call_mock": timeit(lambda: _call_mock(messages, context=ts), repeat=repeat),
+        "call_mock_parse": timeit(lambda: _call_mock(messages), repeat=repeat),   # prompt text only
+    }
+
+
+def bench_fire_dynamics(cfg, name, repeat):
+    import numpy as np
+    from env.fire import spread_fires, trigger_aftershocks
+    from env.mapcache import compile_config
+    cells = compile_config(cfg)[0]["cell_types"]
+    rng = np.random.default_rng(SEED)
+    return {
+        "spread_fires": timeit(lambda: spread_fires(cells.copy(), rng, 0.02), repeat=repeat),
+        "aftershocks": timeit(lambda: trigger_aftershocks(cells.copy(), rng, 1.0, 3), repeat=repeat),
+    }
+
+
+def bench_validation(cfg, name, repeat):
+    from reasoning import react
+    from reasoning.llm_client import _call_mock
+    from reasoning.state import TickState
+    from reasoning.utils import validate_action_json
+    ts = TickState(synthetic_state(cfg, seed=SEED), tick=0)
+    text = _call_mock(react.build_messages(ts), context=ts)["content"]
+    return {"validate_action_json": timeit(lambda: validate_action_json(text), repeat=repeat)}
+
+
+def bench_logging(cfg, name, repeat):
+    from eval.logger import EpisodeLogWriter, log_prompt_response
+    from reasoning import react
+    from reasoning.llm_client import _call_mock
+    from reasoning.state import TickState
+    ts = TickState(synthetic_state(cfg, seed=SEED), tick=0)
+    messages = react.build_messages(ts)
+    text = _call_mock(messages, context=ts)["content"]
+    tmp = tempfile.mkdtemp(prefix="bench_log_")
+    try:
+        tick = iter(range(10 ** 9))
+        out = {"dir": timeit(lambda: log_prompt_response("react", "bench", next(tick), messages, text, logdir=tmp),
+                             repeat=repeat)}
+        writer = EpisodeLogWriter("react", "bench_ep", logdir=tmp)
+        out["episode"] = timeit(lambda: writer.log_prompt_response(next(tick), messages, text), repeat=repeat)
+        writer.close()
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return out
+
+
+def _episode(fn, name, repeat):
+    """Median wall time of a whole episode, run in a scratch directory (episodes write logs/ and results/)."""
+    path = os.path.join(ROOT, "configs", f"{name}.yaml")
+    cwd, tmp = os.getcwd(), tempfile.mkdtemp(prefix="bench_ep_")
+    try:
+        os.chdir(tmp)
+        return timeit(lambda: fn(path), repeat=max(1, repeat // 100), warmup=1)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def bench_episode_mock(cfg, name, repeat):
+    from main import run_episode
+    return {"ticks_50": _episode(lambda p: run_episode(p, seed=SEED, ticks=50, provider="mock", strategy="react",
+                                                       run_id="bench"), name, repeat)}
+
+
+def bench_episode_heuristic(cfg, name, repeat):
+    from main import run_lean_episode
+    return {"ticks_50": _episode(lambda p: run_lean_episode(p, seed=SEED, ticks=50, policy="heuristic",
+                                                            log_level="none"), name, repeat)}
+
+
+CASES = {
+    "routing": (bench_routing, MAPS),
+    "state_export": (bench_state_export, MAPS),
+    "summarize_state": (bench_summarize_state, MAPS),
+    "world_index": (bench_world_index, MAPS),
+    "prompt": (bench_prompt, MAPS),
+    "mock": (bench_mock, MAPS),
+    "fire_dynamics": (bench_fire_dynamics, MAPS),
+    "validation": (bench_validation, MAPS),
+    "logging": (bench_logging, MAPS),
+    "episode_mock": (bench_episode_mock, EPISODE_MAPS),
+    "episode_heuristic": (bench_episode_heuristic, EPISODE_MAPS),
+}
+
+
+# ---------------------------------------------------------------------------
+# Running and comparing
+# ---------------------------------------------------------------------------
+def run_suite(cases, maps, repeat):
+    """Returns ({"<case>/<map>/<metric>": seconds}, {"<case>/<map>": reason skipped})."""
+    results, skipped = {}, {}
+    for case in cases:
+        fn, case_maps = CASES[case]
+        for name in maps:
+            if name not in case_maps:
+                continue
+            key = f"{case}/{name}"
+            try:
+                out = fn(load_map(name), name, repeat)
+            except ImportError as e:
+                skipped[key] = f"missing dependency: {e.name or e}"
+                print(f"{key:<40} skipped ({skipped[key]})", flush=True)
+                continue
+            for metric, sec in out.items():
+                results[f"{key}/{metric}"] = sec
+                print(f"{key + '/' + metric:<60} {sec * 1e6:>12.1f} us", flush=True)
+    return results, skipped
+
+
+def compare(results, baseline, threshold):
+    """Rows (key, baseline_s, current_s, ratio, regressed) for keys present in both."""
+    rows = []
+    for key, sec in results.items():
+        base = baseline.get(key)
+        if base:
+            ratio = sec / base
+            rows.append((key, base, sec, ratio, ratio > 1 + threshold))
+    return rows
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--cases", nargs="+", default=list(CASES), choices=list(CASES))
+    ap.add_argument("--maps", nargs="+", default=MAPS, help="Bundled map names, YAML paths or synthetic_<size>")
+    ap.add_argument("--repeat", type=int, default=200, help="Timed calls per metric (episodes: repeat // 100)")
+    ap.add_argument("--out", type=str, default=os.path.join(ROOT, "bench", "results", "latest.json"))
+    ap.add_argument("--baseline", type=str, default=os.path.join(ROOT, "bench", "baseline.json"))
+    ap.add_argument("--threshold", type=float, default=0.2, help="Allowed slowdown vs the baseline (0.2 = 20%%)")
+    ap.add_argument("--save-baseline", action="store_true", help="Write the results as the new baseline")
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    results, skipped = run_suite(args.cases, args.maps, args.repeat)
+    doc = {
+        "meta": {"python": platform.python_version(), "machine": platform.machine(),
+                 "platform": platform.platform(), "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                 "repeat": args.repeat, "seed": SEED, "wall_s": round(time.perf_counter() - t0, 1)},
+        "results": results,
+        "skipped": skipped,
+    }
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(doc, f, indent=2)
+    print(f"Wrote {len(results)} result(s) to {args.out}")
+
+    if args.save_baseline:
+        shutil.copyfile(args.out, args.baseline)
+        print(f"Saved baseline {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline} (record one with --save-baseline)")
+        return 0
+
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    rows = compare(results, baseline.get("results", {}), args.threshold)
+    print(f"\nvs baseline {args.baseline} ({baseline.get('meta', {}).get('time', '?')}), threshold +{args.threshold:.0%}")
+    print(f"{'case':<60} {'base us':>10} {'now us':>10} {'ratio':>7}")
+    for key, base, sec, ratio, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{key:<60} {base * 1e6:>10.1f} {sec * 1e6:>10.1f} {ratio:>7.2f}{flag}")
+    regressions = [r[0] for r in rows if r[4]]
+    if regressions:
+        print(f"{len(regressions)} regression(s) above +{args.threshold:.0%}")
+        return 1
+    print("No regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
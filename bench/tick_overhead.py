@@ -0,0 +1,54 @@
+# bench/tick_overhead.py
+"""
+Per-tick serialization overhead of run_episode on a map, before and after
+TickState (state serialized once and shared by prompt, .txt log and mock).
+
+    python bench/tick_overhead.py --map map_medium
+"""
+import argparse, json
+from common import load_map, synthetic_state, timeit
+
+from reasoning.react import build_messages
+from reasoning.llm_client import _call_mock
+from reasoning.state import TickState
+
+
+def per_tick_before(state):
+    messages = build_messages(state)                        # json.dumps #1
+    resp = _call_mock(messages)                             # json.loads of the prompt
+    plan = {"commands": []}
+    json.dumps({"context": state, "plan": plan})[:2000]     # json.dumps #2 for the .txt log
+    return resp
+
+
+def per_tick_after(state, tick=0):
+    ts = TickState(state, tick=tick)                        # the only json.dumps
+    messages = build_messages(ts)
+    resp = _call_mock(messages, context=ts)                 # no parsing
+    plan = {"commands": []}
+    ('{"context": ' + ts.text + ', "plan": ' + json.dumps(plan) + "}")[:2000]
+    return resp
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--map", type=str, default="map_medium")
+    ap.add_argument("--repeat", type=int, default=500)
+    args = ap.parse_args()
+
+    state = synthetic_state(load_map(args.map), seed=0)
+    assert per_tick_before(state)["content"] == per_tick_after(state)["content"]
+
+    before = timeit(lambda: per_tick_before(state), repeat=args.repeat)
+    after = timeit(lambda: per_tick_after(state), repeat=args.repeat)
+    print(json.dumps({
+        "map": args.map,
+        "state_bytes": len(json.dumps(state)),
+        "before_us": round(before * 1e6, 1),
+        "after_us": round(after * 1e6, 1),
+        "speedup": round(before / after, 2),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
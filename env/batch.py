@@ -0,0 +1,427 @@
+# env/batch.py
+"""
+Vectorized multi-world environment for batch evaluation of heuristic policies.
+
+B worlds of one map are held in stacked NumPy arrays — grid cells, agent
+positions / batteries / cargo, survivor positions / deadlines / states and
+hospital queues — and advanced together with array operations. Every world
+draws from its own RNG stream (SeedSequence of its seed), so a world's
+trajectory depends only on its seed, not on the batch it runs in.
+
+Rules per tick (parameters come from the map config, defaults in DEFAULTS):
+    1. commands: one per agent, either a move towards a target cell (one step
+       along the longer axis, as mock_policy steps) or an action
+       (pickup_survivor, drop_at_hospital, extinguish_fire, clear_rubble,
+       recharge); agents act in id order
+    2. movement: medics cannot enter fire or rubble, trucks go anywhere,
+       drones fly over everything but spend battery; a carrying medic only
+       moves every other tick; drones with an empty battery stop
+    3. fire spread: an empty cell with k burning 4-neighbours ignites with
+       probability 1 - (1 - fire_spread_p)^k (env/fire.py, semantics v2)
+    4. aftershocks: with probability aftershock_p, aftershock_cells random
+       empty cells turn into rubble
+    5. deadlines: waiting or carried survivors die at their deadline
+    6. hospitals: each serves up to service_rate queued survivors per tick
+       (FIFO); a drop at a full queue is an overflow and the medic keeps the
+       survivor
+
+env/world.py (CrisisModel) is the reference; compare_with_model() runs both
+on the same seeds with the heuristic policy and reports the counters side by
+side.
+
+    python env/batch.py --map configs/map_small.yaml --worlds 256 --ticks 200
+"""
+import argparse, os, sys, time
+import numpy as np
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from env.mapcache import EMPTY, BUILDING, FIRE, RUBBLE
+from env.fire import spread_fires, trigger_aftershocks
+
+DRONE, MEDIC, TRUCK = 0, 1, 2
+KINDS = ["drone", "medic", "truck"]
+FLEET = {"drone": 2, "medic": 3, "truck": 2}
+
+NOOP, PICKUP, DROP, EXTINGUISH, CLEAR, RECHARGE = 0, 1, 2, 3, 4, 5
+ACTIONS = {"pickup_survivor": PICKUP, "drop_at_hospital": DROP, "extinguish_fire": EXTINGUISH,
+           "clear_rubble": CLEAR, "recharge": RECHARGE}
+
+WAITING, CARRIED, QUEUED, RESCUED, DEAD = 0, 1, 2, 3, 4
+
+DEFAULTS = {
+    "fire_spread_p": 0.02,
+    "aftershock_p": 0.02,
+    "aftershock_cells": 3,
+    "deadline_min": 60,
+    "deadline_max": 200,
+    "hospital_capacity": 5,
+    "hospital_service_rate": 1,
+    "drone_battery": 100.0,
+    "drone_move_cost": 1.0,
+}
+
+COUNTERS = ["rescued", "deaths", "fires_extinguished", "roads_cleared", "energy_used",
+            "tool_calls", "invalid_json", "replans", "hospital_overflow_events", "battery_recharges"]
+
+
+class BatchCrisisEnv:
+    """
+    B copies of one map, one per seed.
+
+    Args:
+        cfg: map config (configs/map_*.yaml schema, plus optional DEFAULTS keys and "fleet")
+        seeds: one seed per world
+    """
+
+    def __init__(self, cfg, seeds):
+        self.cfg = cfg
+        self.params = {k: cfg.get(k, v) for k, v in DEFAULTS.items()}
+        self.seeds = list(seeds)
+        self.rngs = [np.random.default_rng(np.random.SeedSequence(int(s))) for s in self.seeds]
+        B = self.B = len(self.seeds)
+        W, H = self.W, self.H = int(cfg.get("width", 20)), int(cfg.get("height", 20))
+        self.depot = np.asarray(cfg.get("depot", [1, 1]), dtype=np.int64)
+        self.hpos = np.asarray(cfg.get("hospitals") or [], dtype=np.int64).reshape(-1, 2)
+        self.tick = 0
+
+        base = np.zeros((H, W), dtype=np.uint8)
+        for key, code in (("buildings", BUILDING), ("initial_fires", FIRE), ("rubble", RUBBLE)):
+            pts = np.asarray(cfg.get(key) or [], dtype=np.int64).reshape(-1, 2)
+            base[pts[:, 1], pts[:, 0]] = code
+        self.cells = np.repeat(base[None], B, axis=0)
+
+        # agents: same fleet in every world, all start at the depot
+        fleet = cfg.get("fleet") or FLEET
+        self.kind = np.array([KINDS.index(k) for k, n in fleet.items() for _ in range(n)], dtype=np.int8)
+        A = self.A = len(self.kind)
+        self.apos = np.broadcast_to(self.depot, (B, A, 2)).copy()
+        self.battery = np.full((B, A), float(self.params["drone_battery"]))
+        self.carrying = np.full((B, A), -1, dtype=np.int64)     # survivor index or -1
+        self.active = np.ones((B, A), dtype=bool)
+
+        # survivors: random free cells and deadlines, per world stream
+        n = cfg.get("survivors", 10)
+        S = self.S = len(n) if isinstance(n, list) else int(n)
+        self.spos = np.zeros((B, S, 2), dtype=np.int64)
+        self.deadline = np.zeros((B, S), dtype=np.int64)
+        free = np.flatnonzero(base.ravel() == EMPTY)
+        for b, rng in enumerate(self.rngs):
+            if isinstance(n, list):
+                self.spos[b] = np.asarray(n, dtype=np.int64).reshape(-1, 2)
+            else:
+                idx = rng.choice(free, size=S, replace=len(free) < S)
+                self.spos[b] = np.column_stack([idx % W, idx // W])
+            self.deadline[b] = rng.integers(self.params["deadline_min"], self.params["deadline_max"] + 1, size=S)
+        self.sstate = np.full((B, S), WAITING, dtype=np.int8)
+        self.shosp = np.full((B, S), -1, dtype=np.int64)
+        self.queued_at = np.full((B, S), -1, dtype=np.int64)
+
+        self.counters = {name: np.zeros(B, dtype=np.int64) for name in COUNTERS}
+        self.rescue_time_sum = np.zeros(B, dtype=np.int64)
+        self.running = np.ones(B, dtype=bool)
+
+    # ---- commands ----
+    def empty_commands(self):
+        """(move_to (B, A, 2) with -1 = no move, act (B, A))"""
+        return np.full((self.B, self.A, 2), -1, dtype=np.int64), np.zeros((self.B, self.A), dtype=np.int8)
+
+    def commands_from_plans(self, plans):
+        """Convert one mock_policy-style command list per world into command arrays."""
+        move_to, act = self.empty_commands()
+        for b, cmds in enumerate(plans):
+            for c in cmds or []:
+                try:
+                    a = int(c["agent_id"])
+                except (KeyError, TypeError, ValueError):
+                    continue
+                if not 0 <= a < self.A:
+                    continue
+                if c.get("type") == "move" and c.get("to") is not None:
+                    move_to[b, a] = c["to"][:2]
+                elif c.get("type") == "act":
+                    act[b, a] = ACTIONS.get(c.get("action_name"), NOOP)
+        return move_to, act
+
+    # ---- stepping ----
+    def _step_towards(self, pos, target):
+        """One step along the longer axis (ties: y), as mock_policy's next_step."""
+        d = target - pos
+        along_x = np.abs(d[..., 0]) > np.abs(d[..., 1])
+        step = np.zeros_like(pos)
+        step[..., 0] = np.where(along_x, np.sign(d[..., 0]), 0)
+        step[..., 1] = np.where(along_x, 0, np.sign(d[..., 1]))
+        return pos + step
+
+    def step(self, move_to, act):
+        """Advance every world by one tick."""
+        B, W, H = self.B, self.W, self.H
+        bi = np.arange(B)
+        live = self.running[:, None] & self.active
+
+        # 1. moves
+        wants = live & (move_to[..., 0] >= 0) & (act == NOOP)
+        nxt = self._step_towards(self.apos, move_to)
+        inside = (nxt[..., 0] >= 0) & (nxt[..., 0] < W) & (nxt[..., 1] >= 0) & (nxt[..., 1] < H)
+        cx, cy = np.clip(nxt[..., 0], 0, W - 1), np.clip(nxt[..., 1], 0, H - 1)
+        ct = self.cells[bi[:, None], cy, cx]
+        medic = self.kind == MEDIC
+        blocked = medic & ((ct == FIRE) | (ct == RUBBLE))
+        slowed = medic & (self.carrying >= 0) & (self.tick % 2 == 1)
+        moved = wants & inside & ~blocked & ~slowed & (nxt != self.apos).any(axis=-1)
+        self.apos[moved] = nxt[moved]
+        self.counters["energy_used"] += moved.sum(axis=1)
+        drone_moved = moved & (self.kind == DRONE)
+        self.battery[drone_moved] -= self.params["drone_move_cost"]
+        self.active &= ~((self.kind == DRONE) & (self.battery <= 0))
+        carried = self.carrying >= 0
+        bs, as_ = np.nonzero(carried)
+        self.spos[bs, self.carrying[bs, as_]] = self.apos[bs, as_]
+
+        # 2. actions, in agent order (vectorized over worlds)
+        for a in range(self.A):
+            code = np.where(live[:, a], act[:, a], NOOP)
+            if not code.any():
+                continue
+            x, y = self.apos[:, a, 0], self.apos[:, a, 1]
+            ct = self.cells[bi, y, x]
+            k = self.kind[a]
+            done = np.zeros(B, dtype=bool)
+            if k == MEDIC:
+                w = (code == PICKUP) & (self.carrying[:, a] < 0)
+                here = (self.spos == self.apos[:, a][:, None, :]).all(axis=-1) & (self.sstate == WAITING)
+                has = w & here.any(axis=1)
+                s = here.argmax(axis=1)
+                self.carrying[has, a] = s[has]
+                self.sstate[has, s[has]] = CARRIED
+                done |= has
+
+                w = (code == DROP) & (self.carrying[:, a] >= 0)
+                if len(self.hpos) and w.any():
+                    at = (self.hpos[None] == self.apos[:, a][:, None, :]).all(axis=-1)      # (B, K)
+                    w &= at.any(axis=1)
+                    h = at.argmax(axis=1)
+                    qlen = ((self.sstate == QUEUED) & (self.shosp == h[:, None])).sum(axis=1)
+                    ok = w & (qlen < self.params["hospital_capacity"])
+                    self.counters["hospital_overflow_events"] += w & ~ok
+                    s = self.carrying[:, a]
+                    self.sstate[ok, s[ok]] = QUEUED
+                    self.shosp[ok, s[ok]] = h[ok]
+                    self.queued_at[ok, s[ok]] = self.tick
+                    self.carrying[ok, a] = -1
+                    done |= ok
+            elif k == TRUCK:
+                for code_, cell, counter in ((EXTINGUISH, FIRE, "fires_extinguished"), (CLEAR, RUBBLE, "roads_cleared")):
+                    ok = (code == code_) & (ct == cell)
+                    self.cells[bi[ok], y[ok], x[ok]] = EMPTY
+                    self.counters[counter] += ok
+                    done |= ok
+            elif k == DRONE:
+                ok = (code == RECHARGE) & (self.apos[:, a] == self.depot).all(axis=1)
+                self.battery[ok, a] = self.params["drone_battery"]
+                self.counters["battery_recharges"] += ok
+                done |= ok
+            self.counters["energy_used"] += done
+
+        # 3. + 4. fire spread and aftershocks (one draw per world per tick, whatever the state)
+        self._dynamics()
+
+        # 5. deadlines
+        dies = self.running[:, None] & ((self.sstate == WAITING) | (self.sstate == CARRIED)) & (self.tick >= self.deadline)
+        self.counters["deaths"] += dies.sum(axis=1)
+        self.sstate[dies] = DEAD
+        holder = self.carrying >= 0
+        lost = holder & np.take_along_axis(dies, np.where(holder, self.carrying, 0), axis=1)
+        self.carrying[lost] = -1
+
+        # 6. hospital service, FIFO per hospital
+        big = np.iinfo(np.int64).max
+        for h in range(len(self.hpos)):
+            for _ in range(int(self.params["hospital_service_rate"])):
+                key = np.where((self.sstate == QUEUED) & (self.shosp == h),
+                               self.queued_at * self.S + np.arange(self.S), big)
+                s = key.argmin(axis=1)
+                ok = self.running & (key[bi, s] != big)
+                self.sstate[ok, s[ok]] = RESCUED
+                self.counters["rescued"] += ok
+                self.rescue_time_sum += np.where(ok, self.tick + 1, 0)
+
+        self.tick += 1
+        self.running &= ((self.sstate == WAITING) | (self.sstate == CARRIED) | (self.sstate == QUEUED)).any(axis=1)
+
+    def _dynamics(self):
+        p = self.params
+        spread_fires(self.cells, self.rngs, p["fire_spread_p"], active=self.running)
+        trigger_aftershocks(self.cells, self.rngs, p["aftershock_p"], p["aftershock_cells"], active=self.running)
+
+    # ---- observation ----
+    def summarize(self, b):
+        """World b in the summarize_state() format (for LLM policies and cross-checks)."""
+        waiting = np.flatnonzero(self.sstate[b] == WAITING)
+        fy, fx = np.nonzero(self.cells[b] == FIRE)
+        ry, rx = np.nonzero(self.cells[b] == RUBBLE)
+        return {
+            "tick": self.tick,
+            "agents": [{"id": str(a), "kind": KINDS[self.kind[a]], "pos": self.apos[b, a].tolist(),
+                        "carrying": bool(self.carrying[b, a] >= 0), "battery": float(self.battery[b, a])}
+                       for a in range(self.A)],
+            "survivors": [{"pos": self.spos[b, s].tolist()} for s in waiting],
+            "fires": np.column_stack([fx, fy]).tolist(),
+            "rubble": np.column_stack([rx, ry]).tolist(),
+            "hospitals": [{"pos": p.tolist()} for p in self.hpos],
+            "depot": self.depot.tolist(),
+        }
+
+    def metrics(self):
+        """One dict per world with the run_episode counter keys."""
+        out = []
+        for b in range(self.B):
+            m = {name: int(self.counters[name][b]) for name in COUNTERS}
+            m["avg_rescue_time"] = float(self.rescue_time_sum[b] / m["rescued"]) if m["rescued"] else 0.0
+            m["map_cells"] = self.W * self.H
+            out.append(m)
+        return out
+
+
+# ---------------------------------------------------------------------------
+# Vectorized heuristic (mock_policy's rules over all worlds at once)
+# ---------------------------------------------------------------------------
+def _nearest(pos, targets, valid):
+    """pos (B, A, 2), targets (B, T, 2), valid (B, T) -> index (B, A), distance (B, A) (inf if none)."""
+    if targets.shape[1] == 0:
+        B, A = pos.shape[:2]
+        return np.zeros((B, A), dtype=np.int64), np.full((B, A), np.inf)
+    d = np.abs(pos[:, :, None, :] - targets[:, None, :, :]).sum(axis=-1).astype(np.float64)
+    d[~np.broadcast_to(valid[:, None, :], d.shape)] = np.inf
+    idx = d.argmin(axis=2)
+    return idx, np.take_along_axis(d, idx[..., None], axis=2)[..., 0]
+
+
+def _cells_of(cells, code):
+    """Padded (B, T, 2) [x, y] coordinates (row-major order) and validity mask of every `code` cell."""
+    b, y, x = np.nonzero(cells == code)
+    counts = np.bincount(b, minlength=cells.shape[0])
+    T = int(counts.max()) if len(counts) else 0
+    out = np.zeros((cells.shape[0], T, 2), dtype=np.int64)
+    valid = np.zeros((cells.shape[0], T), dtype=bool)
+    slot = np.arange(len(b)) - np.repeat(np.cumsum(counts) - counts, counts)
+    out[b, slot, 0], out[b, slot, 1] = x, y
+    valid[b, slot] = True
+    return out, valid
+
+
+def heuristic_commands(env):
+    """Command arrays that mock_policy would produce for every world (no per-world dicts)."""
+    move_to, act = env.empty_commands()
+    pos = env.apos
+    kind = np.broadcast_to(env.kind, pos.shape[:2])
+    live = env.active & env.running[:, None]
+
+    waiting = env.sstate == WAITING
+    s_idx, s_dist = _nearest(pos, env.spos, waiting)
+    s_tgt = np.take_along_axis(env.spos, s_idx[..., None], axis=1)
+
+    # medics
+    medic = live & (kind == MEDIC)
+    carrying = env.carrying >= 0
+    if len(env.hpos):
+        hp = np.broadcast_to(env.hpos, (env.B,) + env.hpos.shape)
+        h_idx, h_dist = _nearest(pos, hp, np.ones(hp.shape[:2], dtype=bool))
+        m = medic & carrying
+        act[m & (h_dist == 0)] = DROP
+        sel = m & (h_dist > 0)
+        move_to[sel] = env.hpos[h_idx[sel]]
+    m = medic & ~carrying & np.isfinite(s_dist)
+    act[m & (s_dist == 0)] = PICKUP
+    sel = m & (s_dist > 0)
+    move_to[sel] = s_tgt[sel]
+
+    # trucks: fires first, rubble only in worlds without fire
+    truck = live & (kind == TRUCK)
+    fires, fvalid = _cells_of(env.cells, FIRE)
+    rubble, rvalid = _cells_of(env.cells, RUBBLE)
+    any_fire = fvalid.any(axis=1)[:, None]
+    for targets, valid, action, which in ((fires, fvalid, EXTINGUISH, truck & any_fire),
+                                          (rubble, rvalid, CLEAR, truck & ~any_fire)):
+        idx, dist = _nearest(pos, targets, valid)
+        tgt = np.take_along_axis(targets, idx[..., None], axis=1) if targets.shape[1] else pos
+        w = which & np.isfinite(dist)
+        act[w & (dist == 0)] = action
+        sel = w & (dist > 0)
+        move_to[sel] = tgt[sel]
+
+    # drones: recharge below 20 battery, otherwise head for the nearest survivor
+    drone = live & (kind == DRONE)
+    low = drone & (env.battery < 20)
+    at_depot = (pos == env.depot).all(axis=-1)
+    act[low & at_depot] = RECHARGE
+    move_to[low & ~at_depot] = env.depot
+    d = drone & ~low & np.isfinite(s_dist)
+    move_to[d] = s_tgt[d]
+    # mock_policy steps a drone standing on its survivor one cell up
+    on = d & (s_dist == 0)
+    move_to[on] = pos[on] + np.array([0, -1])
+    return move_to, act
+
+
+def run_batch(cfg, seeds, ticks=200):
+    """Run the vectorized heuristic on one world per seed. Returns one metrics dict per seed."""
+    env = BatchCrisisEnv(cfg, seeds)
+    for _ in range(ticks):
+        if not env.running.any():
+            break
+        env.step(*heuristic_commands(env))
+    return env.metrics()
+
+
+def compare_with_model(cfg, seeds, ticks=50):
+    """
+    Run CrisisModel with HeuristicPolicy and this environment with the
+    vectorized heuristic on the same seeds; returns [(seed, model counters,
+    batch counters)] for inspection. Needs env/world.py (and mesa).
+    """
+    from env.world import CrisisModel
+    from eval.replay import seed_globals
+    from reasoning.policy import HeuristicPolicy
+    from main import model_counters     # raises on a counter CrisisModel does not have
+    batch = run_batch(cfg, seeds, ticks)
+    rows = []
+    for seed, got in zip(seeds, batch):
+        seed_globals(seed)
+        model = CrisisModel(cfg.get("width", 20), cfg.get("height", 20), rng_seed=seed, config=cfg, render=False)
+        pol = HeuristicPolicy()
+        for t in range(ticks):
+            model.set_plan(pol.observe(t, model.summarize_state()))
+            model.step()
+        counters = model_counters(model)
+        ref = {name: counters[name] for name in COUNTERS}
+        rows.append((seed, ref, {name: got[name] for name in COUNTERS}))
+    return rows
+
+
+def main():
+    from env.mapcache import load_map_config
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--map", type=str, default="configs/map_small.yaml")
+    ap.add_argument("--worlds", type=int, default=64)
+    ap.add_argument("--ticks", type=int, default=200)
+    ap.add_argument("--seed", type=int, default=0, help="First seed (worlds use seed .. seed + worlds - 1)")
+    ap.add_argument("--compare", action="store_true", help="Also run CrisisModel on the first seeds and compare")
+    args = ap.parse_args()
+
+    cfg = load_map_config(args.map)
+    seeds = list(range(args.seed, args.seed + args.worlds))
+    t0 = time.perf_counter()
+    results = run_batch(cfg, seeds, args.ticks)
+    wall = time.perf_counter() - t0
+    rescued = np.mean([m["rescued"] for m in results])
+    deaths = np.mean([m["deaths"] for m in results])
+    print(f"{args.worlds} worlds x {args.ticks} ticks in {wall:.2f}s "
+          f"({args.worlds / wall * 3600:.0f} episodes/hour); mean rescued {rescued:.2f}, deaths {deaths:.2f}")
+    if args.compare:
+        for seed, ref, got in compare_with_model(cfg, seeds[:4], args.ticks):
+            diff = {k: (ref[k], got[k]) for k in COUNTERS if ref[k] != got[k]}
+            print(f"seed {seed}: " + ("identical counters" if not diff else f"model vs batch {diff}"))
+
+
+if __name__ == "__main__":
+    main()
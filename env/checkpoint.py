@@ -0,0 +1,116 @@
+# env/checkpoint.py
+import glob
+import os
+import pickle
+import random
+
+CHECKPOINT_VERSION = 1
+
+
+def _global_rng_state():
+    state = {"random": random.getstate()}
+    try:
+        import numpy as np
+        state["numpy"] = np.random.get_state()
+    except ImportError:
+        pass
+    return state
+
+
+def _set_global_rng_state(state):
+    if "random" in state:
+        random.setstate(state["random"])
+    if "numpy" in state:
+        import numpy as np
+        np.random.set_state(state["numpy"])
+
+
+def snapshot(model, tick=None, extra=None) -> bytes:
+    """
+    Serialize a CrisisModel mid-episode.
+
+    The model is pickled whole (grid, schedule and agents, cell types,
+    hospital queues, counters, datacollector and its own `random`), together
+    with the global random / numpy RNG states the environment may draw from
+    and an `extra` dict for caller state such as the planner transcript.
+    """
+    return pickle.dumps({
+        "version": CHECKPOINT_VERSION,
+        "tick": tick,
+        "model": model,
+        "rng": _global_rng_state(),
+        "extra": extra or {},
+    }, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def restore(blob: bytes, restore_rng=True):
+    """
+    Inverse of snapshot().
+
+    Returns:
+        tuple: (model, tick, extra)
+    """
+    data = pickle.loads(blob)
+    if data.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(f"unsupported checkpoint version: {data.get('version')}")
+    if restore_rng:
+        _set_global_rng_state(data["rng"])
+    return data["model"], data["tick"], data["extra"]
+
+
+def fork(model, seed=None):
+    """
+    Independent in-memory copy of a model for rollouts.
+
+    A pickle round trip is cheaper than copy.deepcopy() on mesa models (no memo
+    dict walk). The global RNGs are left alone; pass `seed` to reseed the
+    copy's own RNG so sibling rollouts diverge.
+    """
+    clone = pickle.loads(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL))
+    if seed is not None and hasattr(clone, "random"):
+        clone.random.seed(seed)
+    return clone
+
+
+class Checkpointer:
+    """
+    Writes a snapshot every `every` ticks to <ckpt_dir>/tick_<t>.ckpt and keeps
+    the newest `keep` files. Writes go through a temp file + rename, so a crash
+    mid-write never leaves a truncated latest checkpoint.
+    """
+
+    def __init__(self, ckpt_dir, every=10, keep=2):
+        self.ckpt_dir = ckpt_dir
+        self.every = every
+        self.keep = keep
+        os.makedirs(ckpt_dir, exist_ok=True)
+
+    def _files(self):
+        return sorted(glob.glob(os.path.join(self.ckpt_dir, "tick_*.ckpt")))
+
+    def maybe_save(self, tick, model, extra=None):
+        """Save after tick `tick` if it falls on the interval. Returns the path or None."""
+        if not self.every or (tick + 1) % self.every:
+            return None
+        return self.save(tick, model, extra)
+
+    def save(self, tick, model, extra=None):
+        path = os.path.join(self.ckpt_dir, f"tick_{tick:06d}.ckpt")
+        with open(path + ".tmp", "wb") as f:
+            f.write(snapshot(model, tick=tick, extra=extra))
+        os.replace(path + ".tmp", path)
+        for old in self._files()[:-self.keep]:
+            os.remove(old)
+        return path
+
+    def latest(self):
+        files = self._files()
+        return files[-1] if files else None
+
+    def load_latest(self, restore_rng=True):
+        """Return (model, tick, extra) from the newest checkpoint, or None if there is none."""
+        path = self.latest()
+        if path is None:
+            return None
+        with open(path, "rb") as f:
+            return restore(f.read(), restore_rng=restore_rng)
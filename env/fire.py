@@ -0,0 +1,94 @@
+# env/fire.py
+"""
+Array implementation of the per-tick hazard dynamics: fire spread and aftershocks.
+
+Works on cell-type grids with the map cache codes (env.mapcache EMPTY /
+BUILDING / FIRE / RUBBLE), either one world (H, W) or a stack (B, H, W) with
+one numpy Generator per world. Fire spread costs one pass over the grid per
+tick — a neighbour count of the fire mask and one uniform draw per cell —
+whatever the size of the burning front.
+
+Semantics, versioned because fixed-seed trajectories change:
+    v1  (env/dynamics.py spread_fires / trigger_aftershocks): each burning
+        cell tries each empty 4-neighbour with probability p, drawing from the
+        global `random` stream in iteration order; cost grows with the front
+    v2  (this module): one float32 uniform per cell per tick from the world's
+        Generator; an empty cell with k burning neighbours ignites when
+        u < 1 - (1 - p)^k. That is the probability that at least one of the
+        k v1 trials succeeds, so per-cell ignition odds match v1, but the draws
+        differ: compare distributions, not individual runs.
+    Aftershocks (both versions): with probability aftershock_p, n_cells
+    uniformly random cells are hit and the empty ones turn into rubble.
+"""
+import numpy as np
+
+from env.mapcache import EMPTY, FIRE, RUBBLE
+
+SEMANTICS_VERSION = 2
+
+
+def neighbour_count(fire):
+    """Burning 4-neighbours of every cell of a boolean fire mask (..., H, W) -> int8."""
+    k = np.zeros(fire.shape, dtype=np.int8)
+    k[..., 1:, :] += fire[..., :-1, :]
+    k[..., :-1, :] += fire[..., 1:, :]
+    k[..., :, 1:] += fire[..., :, :-1]
+    k[..., :, :-1] += fire[..., :, 1:]
+    return k
+
+
+def _per_world(cells, rngs):
+    """(stacked cells, list of generators) for a single grid or a stack."""
+    if cells.ndim == 2:
+        return cells[None], [rngs]
+    return cells, list(rngs)
+
+
+def spread_fires(cells, rngs, p, active=None):
+    """
+    One tick of fire spread, in place.
+
+    Args:
+        cells: (H, W) or (B, H, W) uint8 cell types
+        rngs: a Generator, or one per world for a stack
+        p: per-neighbour ignition probability
+        active: optional (B,) bool; inactive worlds still draw (so their
+            streams stay aligned) but do not change
+
+    Returns:
+        boolean mask of newly ignited cells (same shape as cells)
+    """
+    grid, gens = _per_world(cells, rngs)
+    k = neighbour_count(grid == FIRE)
+    odds = (1.0 - (1.0 - p) ** np.arange(5)).astype(np.float32)    # k = 0..4
+    u = np.empty(grid.shape, dtype=np.float32)
+    for b, rng in enumerate(gens):
+        rng.random(out=u[b], dtype=np.float32)
+    ignite = (grid == EMPTY) & (u < odds[k])
+    if active is not None:
+        ignite &= np.asarray(active, dtype=bool)[:, None, None]
+    grid[ignite] = FIRE
+    return ignite.reshape(cells.shape)
+
+
+def trigger_aftershocks(cells, rngs, p, n_cells, active=None):
+    """
+    One tick of aftershocks, in place: every world draws whether it is hit,
+    hit worlds then draw their cells.
+
+    Returns:
+        (B,) number of cells turned into rubble per world (a scalar for one grid)
+    """
+    grid, gens = _per_world(cells, rngs)
+    B, H, W = grid.shape
+    hit = np.array([rng.random() < p for rng in gens])
+    if active is not None:
+        hit &= np.asarray(active, dtype=bool)
+    added = np.zeros(B, dtype=np.int64)
+    for b in np.flatnonzero(hit):
+        idx = gens[b].integers(0, H * W, size=int(n_cells))
+        ys, xs = idx // W, idx % W
+        ok = grid[b, ys, xs] == EMPTY
+        grid[b, ys[ok], xs[ok]] = RUBBLE
+        added[b] = np.unique(idx[ok]).size
+    return added if cells.ndim == 3 else int(added[0])
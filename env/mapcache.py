@@ -0,0 +1,233 @@
+# env/mapcache.py
+"""
+Compiled map cache.
+
+A map YAML is compiled once into a directory of plain .npy arrays — cell
+types, entity coordinates, the passability mask and BFS distance fields to
+the depot and the nearest hospital — keyed by a hash of the YAML bytes and
+FORMAT_VERSION. Later loads memory-map the arrays (np.load(mmap_mode="r"))
+instead of parsing YAML, so a 2000x2000 map starts in milliseconds.
+
+    python env/mapcache.py configs/generated/scale_2000_s0.yaml     # compile ahead of a sweep
+
+Set CRISIS_MAP_CACHE to move the cache (default results/mapcache) or to
+"off" to always parse the YAML.
+"""
+import hashlib, json, os, shutil, sys, tempfile, time
+import numpy as np
+import yaml
+
+FORMAT_VERSION = 1
+
+# cell_types codes; hospitals and the depot are entities, kept in their own arrays
+EMPTY, BUILDING, FIRE, RUBBLE = 0, 1, 2, 3
+CELL_NAMES = ["empty", "building", "fire", "rubble"]
+CELL_KEYS = {"buildings": BUILDING, "initial_fires": FIRE, "rubble": RUBBLE}
+COORD_KEYS = ("hospitals", "buildings", "initial_fires", "rubble")
+
+# libyaml's parser when PyYAML was built with it (several times faster on big maps)
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+def cache_dir():
+    return os.environ.get("CRISIS_MAP_CACHE", os.path.join("results", "mapcache"))
+
+
+def _hash_file(path):
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"v{FORMAT_VERSION}:".encode())
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+# ---------------------------------------------------------------------------
+# Compilation
+# ---------------------------------------------------------------------------
+def distance_field(passable, sources):
+    """
+    4-connected BFS distance (in steps) from the nearest of `sources` ([x, y])
+    over `passable`; -1 where unreachable. Frontier-at-a-time, so the cost is
+    linear in the number of cells.
+    """
+    H, W = passable.shape
+    dist = np.full(H * W, -1, dtype=np.int32)
+    ok = passable.ravel()
+    src = np.asarray(sources, dtype=np.int64).reshape(-1, 2)
+    frontier = np.unique(src[:, 1] * W + src[:, 0])
+    dist[frontier] = 0       # sources count even if they stand on a blocked cell
+    d = 0
+    while len(frontier):
+        d += 1
+        x = frontier % W
+        nbrs = np.concatenate([frontier[x > 0] - 1, frontier[x < W - 1] + 1,
+                               frontier[frontier >= W] - W, frontier[frontier < (H - 1) * W] + W])
+        nbrs = np.unique(nbrs[(dist[nbrs] < 0) & ok[nbrs]])
+        dist[nbrs] = d
+        frontier = nbrs
+    return dist.reshape(H, W)
+
+
+def _coords(cfg, key, W, H):
+    """
+    int32 (n, 2) [x, y] array of cfg[key]; ValueError unless every entry is an
+    [x, y] pair inside the W x H grid (reshape(-1, 2) alone would silently
+    regroup [x, y, z] entries and numpy indexing would wrap negatives).
+    """
+    pts = np.asarray(cfg.get(key) or [], dtype=np.int32)
+    if pts.size == 0:
+        return pts.reshape(0, 2)
+    if pts.ndim != 2 or pts.shape[1] != 2:
+        raise ValueError(f"{key}: expected a list of [x, y] pairs, got shape {pts.shape}")
+    bad = (pts[:, 0] < 0) | (pts[:, 0] >= W) | (pts[:, 1] < 0) | (pts[:, 1] >= H)
+    if bad.any():
+        raise ValueError(f"{key}: {pts[bad][0].tolist()} outside the {W}x{H} grid")
+    return pts
+
+
+def compile_config(cfg):
+    """
+    Arrays and metadata of a parsed map config.
+
+    Returns:
+        (arrays, meta): arrays holds cell_types (uint8 H x W), passable (bool,
+        not fire / rubble — the tools.routing.shortest_path default), one
+        int32 (n, 2) [x, y] array per coordinate list, depot_dist and
+        hospital_dist (int32 H x W); meta holds everything else in the config
+
+    Raises:
+        ValueError: a coordinate list is not [x, y] pairs inside the grid
+    """
+    W, H = int(cfg.get("width", 20)), int(cfg.get("height", 20))
+    arrays = {}
+    for key in COORD_KEYS:
+        arrays[key] = _coords(cfg, key, W, H)
+    cells = np.zeros((H, W), dtype=np.uint8)
+    for key, code in CELL_KEYS.items():
+        pts = arrays[key]
+        cells[pts[:, 1], pts[:, 0]] = code
+    arrays["cell_types"] = cells
+    arrays["passable"] = (cells != FIRE) & (cells != RUBBLE)
+
+    depot = _coords({"depot": [cfg.get("depot", [0, 0])]}, "depot", W, H)
+    arrays["depot_dist"] = distance_field(arrays["passable"], depot)
+    if len(arrays["hospitals"]):
+        arrays["hospital_dist"] = distance_field(arrays["passable"], arrays["hospitals"])
+    else:
+        arrays["hospital_dist"] = np.full((H, W), -1, dtype=np.int32)
+
+    survivors = cfg.get("survivors")
+    if isinstance(survivors, list):
+        arrays["survivors"] = _coords(cfg, "survivors", W, H)
+    # scalars and small values are kept as they are; the key order of the YAML is preserved
+    meta = {"version": FORMAT_VERSION, "keys": list(cfg.keys()),
+            "config": {k: v for k, v in cfg.items() if k not in arrays}}
+    return arrays, meta
+
+
+def compile_map(path, root=None, cfg=None):
+    """
+    Compile `path` into the cache (once per content hash). Returns the artifact directory.
+
+    Pass `cfg` when the caller already holds the parsed config of exactly this
+    file (e.g. it just generated it) to skip parsing the YAML.
+    """
+    root = root or cache_dir()
+    out = os.path.join(root, f"{_hash_file(path)}")
+    if os.path.exists(os.path.join(out, "meta.json")):
+        return out
+    if cfg is None:
+        with open(path, "r", encoding="utf-8") as f:
+            cfg = yaml.load(f, Loader=_YAML_LOADER) or {}
+    arrays, meta = compile_config(cfg)
+    meta["source"] = os.path.abspath(path)
+    os.makedirs(root, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix=".compile-", dir=root)
+    for name, arr in arrays.items():
+        np.save(os.path.join(tmp, f"{name}.npy"), arr)
+    with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    try:
+        os.replace(tmp, out)
+    except OSError:
+        # another process compiled the same map first
+        shutil.rmtree(tmp, ignore_errors=True)
+    return out
+
+
+# ---------------------------------------------------------------------------
+# Loading
+# ---------------------------------------------------------------------------
+class CompiledMap:
+    """Memory-mapped arrays of one compiled map (see compile_config for the names)."""
+
+    def __init__(self, artifact_dir):
+        self.dir = artifact_dir
+        with open(os.path.join(artifact_dir, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"{artifact_dir}: map cache format {self.meta.get('version')} != {FORMAT_VERSION}")
+        self._arrays = {}
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if name not in self._arrays:
+            path = os.path.join(self.dir, f"{name}.npy")
+            if not os.path.exists(path):
+                raise AttributeError(name)
+            self._arrays[name] = np.load(path, mmap_mode="r")
+        return self._arrays[name]
+
+    @property
+    def width(self):
+        return self.cell_types.shape[1]
+
+    @property
+    def height(self):
+        return self.cell_types.shape[0]
+
+    def config(self):
+        """The map config as yaml.safe_load would have returned it."""
+        cfg = {}
+        for key in self.meta["keys"]:
+            if key in self.meta["config"]:
+                cfg[key] = self.meta["config"][key]
+            else:
+                cfg[key] = np.asarray(getattr(self, key)).tolist()
+        return cfg
+
+
+def load_compiled(path, root=None):
+    """Compile if needed, then memory-map the artifact of `path`."""
+    return CompiledMap(compile_map(path, root))
+
+
+def load_map_config(path):
+    """
+    Map config of a YAML file through the compiled cache (plain YAML parsing
+    when CRISIS_MAP_CACHE=off or the map cannot be compiled / cached).
+    """
+    if cache_dir().lower() != "off":
+        try:
+            return load_compiled(path).config()
+        except (OSError, ValueError, TypeError, IndexError):
+            pass   # unwritable cache or a config the compiler does not understand
+    with open(path, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f) or {}
+
+
+def main():
+    for path in sys.argv[1:]:
+        t0 = time.perf_counter()
+        out = compile_map(path)
+        t1 = time.perf_counter()
+        cfg = load_compiled(path).config()
+        t2 = time.perf_counter()
+        print(f"{path} -> {out}  {cfg.get('width')}x{cfg.get('height')}  "
+              f"compile {t1 - t0:.2f}s  load {1000 * (t2 - t1):.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
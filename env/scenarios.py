@@ -0,0 +1,173 @@
+# env/scenarios.py
+"""
+Seeded procedural scenarios in the configs/map_*.yaml schema (width, height,
+depot, hospitals, buildings, initial_fires, rubble, survivors), for scaling
+studies beyond the hand-made maps.
+
+Cells are tracked in one uint8 occupancy grid, so generation stays linear in
+the map area (5000x5000 with 100k survivors takes a few seconds).
+
+    python env/scenarios.py --size 1000 --survivors 20000 --out configs/generated/big.yaml
+"""
+import argparse, os
+import numpy as np
+
+FREE, BUILDING, FIRE, RUBBLE, RESERVED = 0, 1, 2, 3, 4
+
+
+def default_survivors(width, height):
+    """One survivor per 100 cells, at least 10."""
+    return max(10, width * height // 100)
+
+
+def _sample_free(rng, occ, n, max_rounds=64):
+    """n distinct free cells as (n, 2) [x, y] (rejection sampling on the occupancy grid)."""
+    H, W = occ.shape
+    picked = np.empty(0, dtype=np.int64)
+    for _ in range(max_rounds):
+        if len(picked) >= n:
+            break
+        cand = rng.integers(0, H * W, size=2 * (n - len(picked)) + 16)
+        cand = cand[occ.ravel()[cand] == FREE]
+        picked = np.concatenate([picked, cand])
+        _, first = np.unique(picked, return_index=True)
+        picked = picked[np.sort(first)]
+    if len(picked) < n:
+        raise ValueError(f"could not place {n} cells: map too crowded")
+    picked = picked[:n]
+    return np.column_stack([picked % W, picked // W])
+
+
+def generate_scenario(width, height=None, seed=0, obstacle_density=0.08, rubble_density=0.01,
+                      fire_clusters=None, fire_cluster_size=6, hospitals=None, survivors=None, depot=None):
+    """
+    Build a scenario config.
+
+    Args:
+        width, height: grid size (height defaults to width)
+        obstacle_density: fraction of cells that are buildings
+        rubble_density: fraction of cells covered by rubble
+        fire_clusters: number of fire clusters (default: one per ~2500 cells, at least 2)
+        fire_cluster_size: mean number of burning cells per cluster (clustered around a centre)
+        hospitals: number of hospitals (default: one per ~10k cells, at least 2)
+        survivors: survivor count (default: one per 100 cells, at least 10)
+        depot: [x, y] (default: near the top-left corner)
+
+    Returns:
+        dict in the configs/map_*.yaml schema
+    """
+    height = height or width
+    area = width * height
+    rng = np.random.default_rng(seed)
+    fire_clusters = max(2, area // 2500) if fire_clusters is None else fire_clusters
+    hospitals = max(2, area // 10_000) if hospitals is None else hospitals
+    survivors = default_survivors(width, height) if survivors is None else survivors
+    depot = list(depot) if depot is not None else [min(1, width - 1), min(1, height - 1)]
+
+    occ = np.zeros((height, width), dtype=np.uint8)
+    # keep the depot and its neighbourhood clear so agents can leave it
+    x0, y0 = depot
+    occ[max(0, y0 - 1):y0 + 2, max(0, x0 - 1):x0 + 2] = RESERVED
+
+    # buildings: independent per cell, generated in row blocks to bound memory
+    rows = max(1, 4_000_000 // width)
+    for y in range(0, height, rows):
+        block = occ[y:y + rows]
+        block[(rng.random(block.shape, dtype=np.float32) < obstacle_density) & (block == FREE)] = BUILDING
+
+    hosp = _sample_free(rng, occ, hospitals)
+    occ[hosp[:, 1], hosp[:, 0]] = RESERVED
+
+    # fires: gaussian blobs around random centres
+    centres = _sample_free(rng, occ, fire_clusters)
+    sizes = rng.poisson(max(1, fire_cluster_size - 1), size=fire_clusters) + 1
+    spread = max(1.0, np.sqrt(fire_cluster_size) / 2)
+    pts = np.repeat(centres, sizes, axis=0) + np.rint(rng.normal(0, spread, size=(sizes.sum(), 2))).astype(np.int64)
+    pts[:, 0] = np.clip(pts[:, 0], 0, width - 1)
+    pts[:, 1] = np.clip(pts[:, 1], 0, height - 1)
+    pts = pts[occ[pts[:, 1], pts[:, 0]] == FREE]
+    flat = np.unique(pts[:, 1] * width + pts[:, 0])
+    fires = np.column_stack([flat % width, flat // width])
+    occ[fires[:, 1], fires[:, 0]] = FIRE
+
+    rubble = _sample_free(rng, occ, int(area * rubble_density))
+    occ[rubble[:, 1], rubble[:, 0]] = RUBBLE
+
+    buildings = np.argwhere(occ == BUILDING)[:, ::-1]
+    return {
+        "width": int(width),
+        "height": int(height),
+        "depot": [int(x0), int(y0)],
+        "hospitals": hosp.tolist(),
+        "buildings": buildings.tolist(),
+        "initial_fires": fires.tolist(),
+        "rubble": rubble.tolist(),
+        "survivors": int(survivors),
+    }
+
+
+def write_scenario(cfg, path):
+    """
+    Write a scenario as YAML in the layout of the bundled maps. Emitted
+    directly rather than via yaml.safe_dump, which is far too slow for
+    millions of coordinates.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def cells(key):
+        pts = cfg.get(key) or []
+        if not pts:
+            return f"{key}: []\n"
+        return f"{key}:\n" + "".join(f"  - [{x}, {y}]\n" for x, y in pts)
+
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(f"width: {cfg['width']}\nheight: {cfg['height']}\n")
+        f.write(f"depot: [{cfg['depot'][0]}, {cfg['depot'][1]}]\n")
+        for key in ("hospitals", "buildings", "initial_fires", "rubble"):
+            f.write(cells(key))
+        f.write(f"survivors: {cfg['survivors']}\n")
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def scenario_path(size, seed=0, outdir="configs/generated", **params):
+    """Generate (once) and return configs/generated/scale_<size>_s<seed>[_<params>].yaml."""
+    params = {k: v for k, v in params.items() if v is not None}   # None = generator default
+    tag = "".join(f"_{k}{v}" for k, v in sorted(params.items()))
+    path = os.path.join(outdir, f"scale_{size}_s{seed}{tag}.yaml")
+    if not os.path.exists(path):
+        cfg = generate_scenario(size, seed=seed, **params)
+        write_scenario(cfg, path)
+        from env.mapcache import cache_dir, compile_map
+        if cache_dir().lower() != "off":
+            compile_map(path, cfg=cfg)   # runs load it from the cache instead of parsing the YAML
+    return path
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--size", type=int, required=True, help="Width (and height unless --height)")
+    ap.add_argument("--height", type=int, default=None)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--obstacle-density", type=float, default=0.08)
+    ap.add_argument("--rubble-density", type=float, default=0.01)
+    ap.add_argument("--fire-clusters", type=int, default=None)
+    ap.add_argument("--fire-cluster-size", type=int, default=6)
+    ap.add_argument("--hospitals", type=int, default=None)
+    ap.add_argument("--survivors", type=int, default=None)
+    ap.add_argument("--out", type=str, default=None, help="Output YAML (default: configs/generated/scale_<size>_s<seed>.yaml)")
+    args = ap.parse_args()
+
+    cfg = generate_scenario(args.size, args.height, seed=args.seed, obstacle_density=args.obstacle_density,
+                            rubble_density=args.rubble_density, fire_clusters=args.fire_clusters,
+                            fire_cluster_size=args.fire_cluster_size, hospitals=args.hospitals,
+                            survivors=args.survivors)
+    out = args.out or os.path.join("configs", "generated", f"scale_{args.size}_s{args.seed}.yaml")
+    write_scenario(cfg, out)
+    print(f"Wrote {out}: {cfg['width']}x{cfg['height']}, {len(cfg['buildings'])} buildings, "
+          f"{len(cfg['initial_fires'])} fires, {len(cfg['rubble'])} rubble, {len(cfg['hospitals'])} hospitals, "
+          f"{cfg['survivors']} survivors")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,468 @@
+# env/spatial.py
+"""
+Spatial index, entity counters and an incremental summarize_state().
+
+The model keeps one WorldIndex and reports every change through its hooks —
+agent moves and battery, pickup, drop, admission, death, fires and rubble
+appearing or going. Cell queries ("what is at (x, y)", "what is within r")
+read grid buckets instead of scanning schedule.agents, the counts the GUI
+shows (survivors on map, carried, queued, rescued, deaths) are kept by the
+same hooks, and summary() only re-renders the entries touched since the last
+call: a section nobody touched hands back the list it returned before. A
+touched section still gets a fresh list (a copy of entry references, linear in
+the section's size), so earlier summaries are never changed under their
+holders; only the rendering work is proportional to what changed.
+
+A model that does not call the hooks can still have its index kept current by
+whoever takes its summaries: sync() diffs a newer summarize_state() into the
+hooks (main.run_episode does this every tick for `model.world_index`).
+
+SpatialIndex is also the index reasoning/context.py prunes prompt contexts with.
+
+    index = WorldIndex.from_state(model.summarize_state())
+    index.on_move("3", (4, 7))
+    index.on_pickup("3", survivor_id)
+    state = index.summary(tick=model.time)
+    index.sync(model.summarize_state())     # or catch up from a later summary
+"""
+import heapq
+
+
+class SpatialIndex:
+    """
+    Uniform grid buckets: key -> position, plus bucket (x // size, y // size) -> keys.
+
+    Args:
+        size: bucket edge in cells (1 = one bucket per cell)
+    """
+
+    def __init__(self, size=1):
+        self.size = max(1, int(size))
+        self._pos = {}
+        self._buckets = {}
+        self._bounds = None     # bucket bounding box seen so far (never shrinks)
+
+    def _bucket(self, pos):
+        return (pos[0] // self.size, pos[1] // self.size)
+
+    def __len__(self):
+        return len(self._pos)
+
+    def __contains__(self, key):
+        return key in self._pos
+
+    def pos_of(self, key):
+        return self._pos.get(key)
+
+    def add(self, key, pos):
+        pos = (int(pos[0]), int(pos[1]))
+        if key in self._pos:
+            self.remove(key)
+        self._pos[key] = pos
+        b = self._bucket(pos)
+        self._buckets.setdefault(b, {})[key] = None
+        if self._bounds is None:
+            self._bounds = (b[0], b[1], b[0], b[1])
+        else:
+            x0, y0, x1, y1 = self._bounds
+            self._bounds = (min(x0, b[0]), min(y0, b[1]), max(x1, b[0]), max(y1, b[1]))
+
+    def remove(self, key):
+        pos = self._pos.pop(key, None)
+        if pos is None:
+            return None
+        b = self._bucket(pos)
+        bucket = self._buckets[b]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[b]
+        return pos
+
+    def move(self, key, pos):
+        old = self._pos.get(key)
+        if old is None:
+            return self.add(key, pos)
+        pos = (int(pos[0]), int(pos[1]))
+        self._pos[key] = pos
+        size = self.size
+        ob, nb = (old[0] // size, old[1] // size), (pos[0] // size, pos[1] // size)
+        if ob == nb:
+            return
+        # the hot path (agents move every tick): relink buckets directly instead of remove() + add()
+        bucket = self._buckets[ob]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[ob]
+        self._buckets.setdefault(nb, {})[key] = None
+        x0, y0, x1, y1 = self._bounds
+        if not (x0 <= nb[0] <= x1 and y0 <= nb[1] <= y1):
+            self._bounds = (min(x0, nb[0]), min(y0, nb[1]), max(x1, nb[0]), max(y1, nb[1]))
+
+    def at(self, pos):
+        """Keys exactly at `pos`."""
+        pos = (int(pos[0]), int(pos[1]))
+        return [k for k in self._buckets.get(self._bucket(pos), ()) if self._pos[k] == pos]
+
+    def near(self, pos, radius):
+        """Keys within Manhattan distance `radius` of `pos`."""
+        x, y = int(pos[0]), int(pos[1])
+        bx0, by0 = self._bucket((x - radius, y - radius))
+        bx1, by1 = self._bucket((x + radius, y + radius))
+        out = []
+        for bx in range(bx0, bx1 + 1):
+            for by in range(by0, by1 + 1):
+                for k in self._buckets.get((bx, by), ()):
+                    px, py = self._pos[k]
+                    if abs(px - x) + abs(py - y) <= radius:
+                        out.append(k)
+        return out
+
+    def nearest(self, pos, max_radius=None):
+        """(key, Manhattan distance) of a closest entry within max_radius, or (None, None). Ties: any."""
+        if not self._pos:
+            return None, None
+        x, y = int(pos[0]), int(pos[1])
+        bx, by = self._bucket((x, y))
+        x0, y0, x1, y1 = self._bounds
+        last = max(abs(bx - x0), abs(bx - x1), abs(by - y0), abs(by - y1))
+        best, best_d = None, None
+        for ring in range(last + 1):
+            for cell in self._ring(bx, by, ring):
+                for k in self._buckets.get(cell, ()):
+                    px, py = self._pos[k]
+                    d = abs(px - x) + abs(py - y)
+                    if best is None or d < best_d:
+                        best, best_d = k, d
+            # entries in further rings are at least ring * size + 1 away
+            reach = ring * self.size + 1
+            if best is not None and best_d <= reach or max_radius is not None and reach > max_radius:
+                break
+        if best is None or max_radius is not None and best_d > max_radius:
+            return None, None
+        return best, best_d
+
+    def nearest_k(self, pos, k):
+        """Up to k (Manhattan distance, key) pairs, closest first (ties by key)."""
+        if k <= 0 or not self._pos:
+            return []
+        x, y = int(pos[0]), int(pos[1])
+        bx, by = self._bucket((x, y))
+        x0, y0, x1, y1 = self._bounds
+        last = max(abs(bx - x0), abs(bx - x1), abs(by - y0), abs(by - y1))
+        found = []
+        for ring in range(last + 1):
+            for cell in self._ring(bx, by, ring):
+                for key in self._buckets.get(cell, ()):
+                    px, py = self._pos[key]
+                    found.append((abs(px - x) + abs(py - y), key))
+            if len(found) >= k:
+                best = heapq.nsmallest(k, found)
+                # entries in further rings are at least ring * size + 1 away
+                if best[-1][0] <= ring * self.size:
+                    return best
+        return heapq.nsmallest(k, found)
+
+    @staticmethod
+    def _ring(bx, by, ring):
+        if ring == 0:
+            yield bx, by
+            return
+        for cx in range(bx - ring, bx + ring + 1):
+            yield cx, by - ring
+            yield cx, by + ring
+        for cy in range(by - ring + 1, by + ring):
+            yield bx - ring, cy
+            yield bx + ring, cy
+
+
+class EntityCounters:
+    """Survivor counts kept by the WorldIndex hooks (what StatsPanel shows)."""
+
+    __slots__ = ("on_map", "carried", "queued", "rescued", "deaths")
+
+    def __init__(self):
+        self.on_map = self.carried = self.queued = self.rescued = self.deaths = 0
+
+    @property
+    def total(self):
+        return self.on_map + self.carried + self.queued + self.rescued + self.deaths
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class WorldIndex:
+    """
+    Entities of one world, kept current by event hooks.
+
+    Summary entries are rendered on demand: a hook only marks its entity
+    dirty, and summary() renders the dirty entries and reuses every other
+    entry (and whole unchanged sections) from the previous call. Returned
+    entries are never mutated afterwards, so earlier summaries stay valid.
+    """
+
+    def __init__(self, depot=None, hospitals=(), bucket=1):
+        self.agents = SpatialIndex(bucket)
+        self.survivors = SpatialIndex(bucket)
+        self.counters = EntityCounters()
+        self.depot = list(depot) if depot is not None else None
+        self.hospitals = [tuple(p) for p in hospitals]
+        self.queues = {p: 0 for p in self.hospitals}
+
+        self._agent = {}        # id -> {"kind", "battery", "carrying"} (pos lives in the spatial index)
+        self._carried_by = {}   # agent id -> survivor id
+        self._hazards = {"fires": {}, "rubble": {}}
+        self._entries = {"agents": {}, "survivors": {}}     # id -> rendered entry, in summary order
+        self._dirty = {"agents": set(), "survivors": set()}
+        self._sections = {}
+        self._changed = {"agents", "survivors", "fires", "rubble", "hospitals"}
+        self._new_ids = 0       # survivors sync() found without an "id"
+        self._synced = {}       # summary of the last sync()
+
+    @classmethod
+    def from_state(cls, state, bucket=1):
+        """Index built from one full summarize_state() dict (survivors get ids 0..n-1)."""
+        index = cls(state.get("depot"), [h["pos"] for h in state.get("hospitals", [])], bucket)
+        for a in state.get("agents", []):
+            index.add_agent(a["id"], a.get("kind"), a["pos"], a.get("battery"), a.get("carrying", False))
+        for i, s in enumerate(state.get("survivors", [])):
+            index.add_survivor(s.get("id", i), s["pos"])
+        for p in state.get("fires", []):
+            index.add_hazard("fires", p)
+        for p in state.get("rubble", []):
+            index.add_hazard("rubble", p)
+        return index
+
+    # ---- hooks ----
+    def _touch(self, section, key=None):
+        self._changed.add(section)
+        if key is not None:
+            self._dirty[section].add(key)
+
+    def add_agent(self, agent_id, kind, pos, battery=None, carrying=False):
+        self._agent[agent_id] = {"kind": kind, "battery": battery, "carrying": bool(carrying)}
+        if carrying:    # survivor not known by id (e.g. built from a summary mid-episode)
+            self._carried_by[agent_id] = ("unknown", agent_id)
+            self.counters.carried += 1
+        self.agents.add(agent_id, pos)
+        self._entries["agents"][agent_id] = None
+        self._touch("agents", agent_id)
+
+    def add_survivor(self, survivor_id, pos):
+        self.survivors.add(survivor_id, pos)
+        self._entries["survivors"][survivor_id] = None
+        self.counters.on_map += 1
+        self._touch("survivors", survivor_id)
+
+    def on_move(self, agent_id, pos):
+        self.agents.move(agent_id, pos)
+        self._changed.add("agents")
+        self._dirty["agents"].add(agent_id)
+
+    def on_battery(self, agent_id, battery):
+        if self._agent[agent_id]["battery"] != battery:
+            self._agent[agent_id]["battery"] = battery
+            self._touch("agents", agent_id)
+
+    def on_pickup(self, agent_id, survivor_id):
+        if self.survivors.remove(survivor_id) is None:
+            return
+        self._carried_by[agent_id] = survivor_id
+        self._agent[agent_id]["carrying"] = True
+        self.counters.on_map -= 1
+        self.counters.carried += 1
+        self._touch("agents", agent_id)
+        self._touch("survivors", survivor_id)
+
+    def on_drop(self, agent_id, hospital_pos):
+        if self._carried_by.pop(agent_id, None) is None:
+            return
+        self._agent[agent_id]["carrying"] = False
+        self.counters.carried -= 1
+        self.counters.queued += 1
+        hospital_pos = tuple(hospital_pos)
+        self.queues[hospital_pos] = self.queues.get(hospital_pos, 0) + 1
+        self._touch("agents", agent_id)
+
+    def on_admit(self, hospital_pos, n=1):
+        """n survivors served from a hospital queue."""
+        hospital_pos = tuple(hospital_pos)
+        n = min(n, self.queues.get(hospital_pos, 0))
+        self.queues[hospital_pos] -= n
+        self.counters.queued -= n
+        self.counters.rescued += n
+
+    def on_death(self, survivor_id):
+        if self.survivors.remove(survivor_id) is not None:
+            self.counters.on_map -= 1
+            self._touch("survivors", survivor_id)
+        else:
+            carrier = next((a for a, s in self._carried_by.items() if s == survivor_id), None)
+            if carrier is None:
+                return
+            del self._carried_by[carrier]
+            self._agent[carrier]["carrying"] = False
+            self.counters.carried -= 1
+            self._touch("agents", carrier)
+        self.counters.deaths += 1
+
+    def add_hazard(self, kind, pos):
+        """kind: "fires" or "rubble"."""
+        pos = (int(pos[0]), int(pos[1]))
+        if pos not in self._hazards[kind]:
+            self._hazards[kind][pos] = [pos[0], pos[1]]
+            self._touch(kind)
+
+    def remove_hazard(self, kind, pos):
+        if self._hazards[kind].pop((int(pos[0]), int(pos[1])), None) is not None:
+            self._touch(kind)
+
+    def sync(self, state, queues=None):
+        """
+        Catch up with a newer summarize_state() through the hooks above, for a
+        driver that takes the summary every tick anyway (main.run_episode) while
+        the model does not call the hooks itself. Costs one pass over the
+        summary's entities and renders nothing.
+
+        Survivors are matched by "id" when the summary has one, otherwise by
+        position (survivors do not move). An agent that starts carrying picks up
+        a survivor gone from its cell; one that stops drops at a hospital it
+        stands on (otherwise its survivor died on the way). Survivors that are
+        gone otherwise died. Without ids, a death and a new survivor on the same
+        cell in one tick look like no change (the on-map count is still right).
+
+        Args:
+            state: summarize_state() dict of the same world
+            queues: {hospital pos: survivors waiting} (e.g. from model.hospital_queues);
+                a shorter queue counts as admissions. Without it nothing is admitted.
+        """
+        # sections equal to the last synced summary's are skipped (summaries are not mutated later)
+        last, self._synced = self._synced, state
+        survivors = state.get("survivors", [])
+        changed = survivors != last.get("survivors")
+        gone = {}       # survivor id -> pos, of survivors no longer on the map
+        seen = set()
+        by_pos = None
+        for s in survivors if changed else ():
+            pos = (int(s["pos"][0]), int(s["pos"][1]))
+            sid = s.get("id")
+            if sid is None:
+                if by_pos is None:
+                    by_pos = {}
+                    for key, p in self.survivors._pos.items():
+                        by_pos.setdefault(p, []).append(key)
+                if by_pos.get(pos):
+                    sid = by_pos[pos].pop()
+                else:
+                    sid, self._new_ids = ("new", self._new_ids), self._new_ids + 1
+            if sid not in self.survivors:
+                self.add_survivor(sid, pos)
+            seen.add(sid)
+        if changed and len(seen) < len(self.survivors):
+            gone = {sid: p for sid, p in self.survivors._pos.items() if sid not in seen}
+
+        hospitals = set(self.hospitals)
+        for a in state.get("agents", []):
+            aid = a["id"]
+            if aid not in self._agent:
+                self.add_agent(aid, a.get("kind"), a["pos"], a.get("battery"), a.get("carrying", False))
+                continue
+            info = self._agent[aid]
+            old = self.agents.pos_of(aid)
+            pos = (int(a["pos"][0]), int(a["pos"][1]))
+            if pos != old:
+                self.on_move(aid, pos)
+            if a.get("battery") != info["battery"]:
+                self.on_battery(aid, a.get("battery"))
+            carrying = bool(a.get("carrying", False))
+            if carrying and not info["carrying"]:
+                sid = next((k for k, p in gone.items() if p == pos or p == old), None)
+                if sid is None:     # survivor not known (gone before the index saw it)
+                    self._carried_by[aid] = ("unknown", aid)
+                    info["carrying"] = True
+                    self.counters.carried += 1
+                    self._touch("agents", aid)
+                else:
+                    del gone[sid]
+                    self.on_pickup(aid, sid)
+            elif info["carrying"] and not carrying:
+                if pos in hospitals:
+                    self.on_drop(aid, pos)
+                else:
+                    self.on_death(self._carried_by[aid])
+        for sid in gone:
+            self.on_death(sid)
+
+        for kind in ("fires", "rubble"):
+            if state.get(kind, []) == last.get(kind):
+                continue
+            now = {(int(p[0]), int(p[1])) for p in state.get(kind, [])}
+            have = self._hazards[kind]
+            if len(now) != len(have) or not now.issuperset(have):
+                for pos in [p for p in have if p not in now]:
+                    self.remove_hazard(kind, pos)
+                for pos in now:
+                    if pos not in have:
+                        self.add_hazard(kind, pos)
+
+        if queues is not None:
+            for pos, n in queues.items():
+                pos = tuple(pos)
+                if n < self.queues.get(pos, 0):
+                    self.on_admit(pos, self.queues[pos] - n)
+        return self
+
+    # ---- queries ----
+    def survivors_at(self, pos):
+        return self.survivors.at(pos)
+
+    def agents_near(self, pos, radius):
+        return self.agents.near(pos, radius)
+
+    def nearest_survivor(self, pos):
+        return self.survivors.nearest(pos)
+
+    def is_hazard(self, kind, pos):
+        return (int(pos[0]), int(pos[1])) in self._hazards[kind]
+
+    # ---- summary ----
+    def _render(self, section, key):
+        if section == "agents":
+            a = self._agent[key]
+            return {"id": key, "pos": list(self.agents.pos_of(key)), "kind": a["kind"],
+                    "carrying": a["carrying"], "battery": a["battery"]}
+        return {"pos": list(self.survivors.pos_of(key))}
+
+    def summary(self, tick=None):
+        """
+        summarize_state()-shaped dict. Rendering is proportional to the entries
+        changed since the last call; each changed section is also copied into
+        a new list (linear in its size, no rendering), untouched ones are reused.
+        """
+        for section in ("agents", "survivors"):
+            if section not in self._changed:
+                continue
+            entries, live = self._entries[section], self.agents if section == "agents" else self.survivors
+            for key in self._dirty[section]:
+                if key in live:
+                    entries[key] = self._render(section, key)
+                else:
+                    entries.pop(key, None)
+            self._dirty[section].clear()
+            self._sections[section] = list(entries.values())
+        for kind in ("fires", "rubble"):
+            if kind in self._changed:
+                self._sections[kind] = list(self._hazards[kind].values())
+        if "hospitals" in self._changed:
+            self._sections["hospitals"] = [{"pos": list(p)} for p in self.hospitals]
+        self._changed.clear()
+        state = dict(self._sections)
+        state["depot"] = self.depot
+        if tick is not None:
+            state["tick"] = tick
+        return state
+
+    def invalidate(self):
+        """Drop every cached entry (the next summary() renders everything)."""
+        self._dirty = {section: set(entries) for section, entries in self._entries.items()}
+        self._changed = {"agents", "survivors", "fires", "rubble", "hospitals"}
@@ -0,0 +1,195 @@
+# eval/adaptive.py
+"""
+Adaptive seed allocation for the harness (--adaptive).
+
+Seeds are run in rounds. Every map x strategy cell keeps streaming (Welford)
+statistics of its metrics; a cell stops once the confidence interval of the
+primary metric is narrower than the target, once its rank among the
+strategies of its map is decided (its interval no longer overlaps any
+other's), or once it reaches max_seeds. Each round gives one more seed to
+every open cell, widest interval first, until the run budget is spent.
+"""
+import math
+from statistics import NormalDist
+
+ADAPTIVE_METRICS = ["rescued", "deaths", "avg_rescue_time"]
+
+
+def t_quantile(p, dof):
+    """
+    Student-t quantile. scipy when installed, otherwise exact closed forms
+    for 1 and 2 degrees of freedom and the Cornish-Fisher expansion around the
+    normal quantile above that (Abramowitz & Stegun 26.7.5; within 1% of the
+    exact value from 3 degrees of freedom on, while at 1 it is ~11% low).
+    """
+    dof = max(1, int(dof))
+    try:
+        from scipy import stats
+        return float(stats.t.ppf(p, dof))
+    except ImportError:
+        pass
+    if dof == 1:
+        return math.tan(math.pi * (p - 0.5))
+    if dof == 2:
+        return (2 * p - 1) / math.sqrt(2 * p * (1 - p))
+    z = NormalDist().inv_cdf(p)
+    v = float(dof)
+    return (z + (z ** 3 + z) / (4 * v)
+            + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * v ** 2)
+            + (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / (384 * v ** 3)
+            + (79 * z ** 9 + 776 * z ** 7 + 1482 * z ** 5 - 1920 * z ** 3 - 945 * z) / (92160 * v ** 4))
+
+
+class RunningStats:
+    """Welford's streaming mean / variance of one metric."""
+
+    __slots__ = ("n", "mean", "_m2")
+
+    def __init__(self):
+        self.n, self.mean, self._m2 = 0, 0.0, 0.0
+
+    def add(self, x):
+        self.n += 1
+        d = x - self.mean
+        self.mean += d / self.n
+        self._m2 += d * (x - self.mean)
+
+    @property
+    def var(self):
+        return self._m2 / (self.n - 1) if self.n > 1 else float("nan")
+
+    @property
+    def std(self):
+        return math.sqrt(self.var) if self.n > 1 else float("nan")
+
+    def half_width(self, confidence=0.95):
+        """Half-width of the t confidence interval of the mean (inf below 2 samples)."""
+        if self.n < 2:
+            return float("inf")
+        return t_quantile(0.5 + confidence / 2, self.n - 1) * self.std / math.sqrt(self.n)
+
+
+class Cell:
+    """One map x strategy cell: its seeds so far and running stats per metric."""
+
+    def __init__(self, map_name, strategy, metrics):
+        self.map, self.strategy = map_name, strategy
+        self.stats = {m: RunningStats() for m in metrics}
+        self.seeds = []     # seeds with a result
+        self.tried = []     # seeds handed out (failed runs are not retried)
+        self.stop_reason = None
+
+    def add(self, seed, result):
+        self.seeds.append(seed)
+        for m, st in self.stats.items():
+            if result.get(m) is not None:
+                st.add(float(result[m]))
+
+    def interval(self, metric, confidence):
+        st = self.stats[metric]
+        h = st.half_width(confidence)
+        return st.mean - h, st.mean + h
+
+
+class AdaptiveAllocator:
+    """
+    Decides which (map, strategy, seed) runs come next.
+
+    Args:
+        cells: [(map name, strategy)]
+        seeds: seeds every cell runs in the first round (padded up to min_seeds)
+        metric: primary metric the stopping rules look at
+        target: stop a cell once the CI half-width of `metric` is <= target
+        confidence: CI level
+        min_seeds / max_seeds: per-cell bounds (min_seeds is raised to 3)
+        budget: total runs across all rounds (None = unbounded)
+    """
+
+    def __init__(self, cells, seeds, metric="rescued", target=1.0, confidence=0.95,
+                 min_seeds=3, max_seeds=30, budget=None, metrics=None):
+        self.metric, self.target, self.confidence = metric, target, confidence
+        # at least 3 seeds (2 degrees of freedom) before a cell's CI may stop it
+        self.min_seeds, self.max_seeds, self.budget = max(3, min_seeds), max_seeds, budget
+        metrics = list(dict.fromkeys([metric] + list(metrics or ADAPTIVE_METRICS)))
+        self.cells = {key: Cell(key[0], key[1], metrics) for key in cells}
+        self.initial = list(seeds)
+        extra = max(self.initial, default=-1) + 1
+        while len(self.initial) < self.min_seeds:
+            self.initial.append(extra)
+            extra += 1
+        self.spent = 0
+        self.rounds = 0
+
+    def _next_seed(self, cell):
+        used = set(cell.tried)
+        for s in self.initial:
+            if s not in used:
+                return s
+        return max(used | set(self.initial)) + 1
+
+    def record(self, map_name, strategy, seed, result):
+        self.cells[(map_name, strategy)].add(seed, result)
+
+    def _update_stops(self):
+        for key, cell in self.cells.items():
+            if cell.stop_reason:
+                continue
+            if len(cell.tried) >= self.max_seeds:
+                cell.stop_reason = "max_seeds"
+            elif len(cell.seeds) < self.min_seeds:
+                continue
+            elif cell.stats[self.metric].half_width(self.confidence) <= self.target:
+                cell.stop_reason = "ci_target"
+            elif self._rank_decided(cell):
+                cell.stop_reason = "rank_decided"
+
+    def _rank_decided(self, cell):
+        lo, hi = cell.interval(self.metric, self.confidence)
+        rivals = [c for c in self.cells.values() if c.map == cell.map and c is not cell]
+        if not rivals:
+            return False
+        for other in rivals:
+            if len(other.seeds) < self.min_seeds:
+                return False
+            olo, ohi = other.interval(self.metric, self.confidence)
+            if lo <= ohi and olo <= hi:
+                return False
+        return True
+
+    def next_round(self):
+        """
+        Runs for the next round as [(map name, strategy, seed)]; [] when every
+        cell has stopped or the budget is spent. Call record() for each result
+        before asking for the next round.
+        """
+        self._update_stops()
+        open_cells = [c for c in self.cells.values() if not c.stop_reason]
+        if self.rounds == 0:
+            runs = [(c.map, c.strategy, s) for c in open_cells for s in self.initial[:self.max_seeds]]
+        else:
+            # widest interval first, so a tight budget goes where it matters
+            open_cells.sort(key=lambda c: -c.stats[self.metric].half_width(self.confidence))
+            runs = [(c.map, c.strategy, self._next_seed(c)) for c in open_cells]
+        if self.budget is not None:
+            runs = runs[:max(0, self.budget - self.spent)]
+            if not runs:
+                for c in open_cells:
+                    c.stop_reason = "budget"
+        for map_name, strategy, seed in runs:
+            self.cells[(map_name, strategy)].tried.append(seed)
+        self.spent += len(runs)
+        self.rounds += 1
+        return runs
+
+    def summary(self):
+        """One row per cell with n, mean, std and CI half-width of every metric plus the stop reason."""
+        rows = []
+        for cell in self.cells.values():
+            row = {"map": cell.map, "strategy": cell.strategy, "n": len(cell.seeds),
+                   "stop_reason": cell.stop_reason or "open"}
+            for m, st in cell.stats.items():
+                row[f"{m}_mean"] = round(st.mean, 4) if st.n else None
+                row[f"{m}_std"] = round(st.std, 4) if st.n > 1 else None
+                row[f"{m}_ci_half"] = round(st.half_width(self.confidence), 4) if st.n > 1 else None
+            rows.append(row)
+        return rows
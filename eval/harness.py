@@ -1,24 +1,272 @@
 # eval/harness.py
-import argparse, os, csv, random
-import numpy as np
+import argparse, os, csv, json, random, time
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
-from tqdm import trange
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from eval.logger import save_run_metrics
-from main import run_episode  # assuming run_episode returns dict of metrics
+from eval.logger import save_run_metrics, load_run_metrics
+from eval.tracing import PROFILERS, profile_call
+from main import run_episode, run_lean_episode  # assuming run_episode returns dict of metrics
+
+FIELDNAMES = [
+    "run_id","map","strategy","seed",
+    "rescued","deaths","avg_rescue_time",
+    "fires_extinguished","roads_cleared","energy_used",
+    "tool_calls","invalid_json","replans","hospital_overflow_events",
+    "battery_recharges","map_cells","avg_prompt_tokens","avg_plan_latency_ms","wall_time_s",
+    "ms_per_tick","peak_rss_mb","batch_wall_s"
+]
+
+
+def run_specs(maps, strategies, seeds):
+    """The map × strategy × seed grid in a fixed order (this is also the order of summary.csv)."""
+    specs = []
+    for mappath in maps:
+        mapname = Path(mappath).stem
+        for strategy in strategies:
+            for seed in seeds:
+                specs.append({"run_id": f"{mapname}_{strategy}_seed{seed}", "map_path": mappath,
+                              "map": mapname, "strategy": strategy, "seed": seed})
+    return specs
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # not available on Windows
+        return None
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)  # KiB on Linux
+
+
+def execute_run(spec, opts):
+    """Run one episode and save results/raw/<run_id>.json. Module-level so worker processes can call it."""
+    seed = spec["seed"]
+
+    # 🔒 seed fixing
+    import numpy as np
+    random.seed(seed)
+    np.random.seed(seed)
+
+    t0 = time.perf_counter()
+    # Run one episode (pass run_id explicitly)
+    if opts["policy"]:
+        run = lambda: run_lean_episode(
+            spec["map_path"], seed=seed, ticks=opts["ticks"], policy=opts["policy"], strategy=spec["strategy"],
+            provider=opts["provider"], run_id=spec["run_id"], log_level=opts["log_level"],
+            context_tokens=opts["context_tokens"], trace=opts.get("trace", False))
+    else:
+        run = lambda: run_episode(
+            spec["map_path"],
+            seed=seed,
+            ticks=opts["ticks"],
+            provider=opts["provider"],
+            strategy=spec["strategy"],
+            run_id=spec["run_id"],          # 🔹 NEW
+            log_path=None,
+            render=False,
+            context_tokens=opts["context_tokens"],
+            log_format=opts["log_format"],
+            log_compression=opts["log_compression"],
+            checkpoint_every=opts["checkpoint_every"],
+            resume=opts["resume"],
+            trace=opts.get("trace", False),
+        )
+    if opts.get("profile"):
+        # results/profiles/<run_id>.prof + .txt (cprofile) or .html + .txt (sampling)
+        metrics = profile_call(run, os.path.join("results", "profiles", spec["run_id"]), mode=opts["profile"])
+    else:
+        metrics = run()
+
+    return finish_run(spec, opts, metrics, time.perf_counter() - t0)
+
+
+# options that change a run's results; a saved run only counts as done when they match
+RESULT_OPTS = ("ticks", "provider", "context_tokens", "policy")
+
+
+def run_options(spec, opts):
+    """
+    What a saved result was produced with, as a JSON string (a flat column for
+    summary / store readers), stored as "run_options" and compared by skip-if-done.
+    """
+    return json.dumps({"map_path": spec["map_path"], **{k: opts.get(k) for k in RESULT_OPTS}}, sort_keys=True)
+
+
+def finish_run(spec, opts, metrics, wall, batch_wall=None):
+    """
+    Attach the run's identifiers and timings to its metrics and save results/raw/<run_id>.json.
+
+    Lockstep runs pass their share of the batch as `wall` and the batch's own
+    wall time as `batch_wall` (left empty in summary.csv for other runs).
+    """
+    seed = spec["seed"]
+    # Attach identifiers (safety, in case run_episode doesn’t add all)
+    metrics.update({
+        "run_id": spec["run_id"],
+        "map": spec["map"],
+        "strategy": spec["strategy"],
+        "seed": seed,
+        "wall_time_s": round(wall, 3),
+        "ms_per_tick": round(wall * 1000 / max(1, opts["ticks"]), 3),
+        "peak_rss_mb": _peak_rss_mb(),   # of this process: only per-run when each run gets a fresh process
+        "run_options": run_options(spec, opts),
+    })
+    if batch_wall is not None:
+        metrics["batch_wall_s"] = round(batch_wall, 3)
+
+    # Save JSON per run
+    save_run_metrics(spec["run_id"], metrics)
+    return metrics
+
+
+# ---------------------------------------------------------------------------
+# Worker processes
+# ---------------------------------------------------------------------------
+def parse_worker_env(items):
+    """["OLLAMA_BASE_URL=http://a:11434,http://b:11434", ...] -> {key: [values]}"""
+    env = {}
+    for item in items or []:
+        key, _, values = item.partition("=")
+        env[key] = values.split(",")
+    return env
+
+
+def _init_worker(counter, worker_env, provider):
+    # each worker takes the next slot and picks its own provider settings round-robin
+    with counter.get_lock():
+        slot = counter.value
+        counter.value += 1
+    os.environ["LLM_PROVIDER"] = provider
+    for key, values in worker_env.items():
+        os.environ[key] = values[slot % len(values)]
+
+
+def _fmt_secs(s):
+    s = int(round(s))
+    return f"{s // 3600}h{s % 3600 // 60:02d}m{s % 60:02d}s" if s >= 3600 else f"{s // 60}m{s % 60:02d}s"
+
+
+def write_summary(path, rows, fieldnames=FIELDNAMES):
+    """
+    Rewrite summary.csv atomically: rows of earlier sweeps first (as they were),
+    then `rows` in spec order, replacing earlier rows with the same run_id.
+    """
+    new_ids = {r["run_id"] for r in rows}
+    old = []
+    if os.path.exists(path):
+        with open(path, "r", newline="") as f:
+            old = [r for r in csv.DictReader(f) if r.get("run_id") not in new_ids]
+    with open(path + ".tmp", "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames, restval="", extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(old)
+        writer.writerows(rows)
+    os.replace(path + ".tmp", path)
+
+
+def scale_maps(sizes, survivors=None, obstacle_density=None, outdir="configs/generated"):
+    """Generate (once) one scenario per size; returns ({map path: size}, {map name: survivors})."""
+    from env.scenarios import default_survivors, scenario_path
+    paths, counts = {}, {}
+    for i, size in enumerate(sizes):
+        n = survivors[i] if survivors else None
+        path = scenario_path(size, survivors=n, obstacle_density=obstacle_density, outdir=outdir)
+        paths[path] = size
+        counts[Path(path).stem] = n if n is not None else default_survivors(size, size)
+    return paths, counts
+
+
+def write_scaling(path, rows, survivors):
+    """Per-map means of the sweep (time, memory and prompt size per tick) -> scaling.csv; returns the rows."""
+    by_map = {}
+    for m in rows:
+        by_map.setdefault(m["map"], []).append(m)
+    out = []
+    for name, ms in by_map.items():
+        def mean(key, digits):
+            vals = [m[key] for m in ms if m.get(key) is not None]
+            return round(sum(vals) / len(vals), digits) if vals else None
+
+        out.append({"map": name, "map_cells": ms[0].get("map_cells"), "survivors": survivors.get(name),
+                    "runs": len(ms), "ms_per_tick": mean("ms_per_tick", 3), "peak_rss_mb": mean("peak_rss_mb", 1),
+                    "avg_prompt_tokens": mean("avg_prompt_tokens", 1),
+                    "avg_plan_latency_ms": mean("avg_plan_latency_ms", 3)})
+    out.sort(key=lambda r: r["map_cells"] or 0)
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(out[0]) if out else ["map"])
+        writer.writeheader()
+        writer.writerows(out)
+    return out
 
 
 def main():
     ap = argparse.ArgumentParser()
-    ap.add_argument("--maps", nargs="+", required=True)
+    ap.add_argument("--maps", nargs="+", default=[])
     ap.add_argument("--strategies", nargs="+", required=True)
     ap.add_argument("--seeds", nargs="+", type=int, default=[0,1,2,3,4])
     ap.add_argument("--ticks", type=int, default=200)
     ap.add_argument("--provider", type=str, default="mock", choices=["mock","groq","gemini","ollama"])
+    ap.add_argument("--context-tokens", type=int, default=None, help="Token budget for the planner context (default: full state)")
+    ap.add_argument("--log-format", type=str, default="dir", choices=["dir", "episode", "dedup"])
+    ap.add_argument("--log-compression", type=str, default=None, choices=["gzip", "lzma"])
+    ap.add_argument("--checkpoint-every", type=int, default=None, help="Snapshot each run every N ticks")
+    ap.add_argument("--resume", action="store_true", help="Continue each run from its newest checkpoint")
+    ap.add_argument("--policy", type=str, default=None, choices=["llm", "heuristic", "numpy"],
+                    help="Use the lean policy loop (llm runs each --strategies entry; heuristics replace them)")
+    ap.add_argument("--log-level", type=str, default="metrics", choices=["none", "metrics", "full"],
+                    help="Logging for --policy runs")
+    ap.add_argument("--workers", type=int, default=1, help="Run episodes in N processes (1 = in this process)")
+    ap.add_argument("--worker-env", action="append", default=[], metavar="KEY=V1,V2,...",
+                    help="Per-worker environment, assigned round-robin (e.g. OLLAMA_BASE_URL=http://a:11434,http://b:11434)")
+    ap.add_argument("--queue", type=str, default=None, metavar="DB",
+                    help="Enqueue the grid into a shared SQLite work queue instead of running it")
+    ap.add_argument("--force", action="store_true", help="Re-run episodes that already have results/raw/<run_id>.json")
+    ap.add_argument("--scale", nargs="+", type=int, default=None, metavar="SIZE",
+                    help="Scale sweep: generate a SIZE x SIZE scenario per value (env/scenarios.py) and run those "
+                         "instead of --maps, each episode in a fresh process")
+    ap.add_argument("--scale-survivors", nargs="+", type=int, default=None, metavar="N",
+                    help="Survivor count per --scale size (default: one per 100 cells)")
+    ap.add_argument("--scale-obstacles", type=float, default=None, help="Building density of the generated maps")
+    ap.add_argument("--adaptive", action="store_true",
+                    help="Run seeds in rounds and stop each map x strategy cell once it is precise enough "
+                         "(--seeds is the first round)")
+    ap.add_argument("--adaptive-metric", type=str, default="rescued", choices=["rescued", "deaths", "avg_rescue_time"],
+                    help="Metric the adaptive stopping rules look at")
+    ap.add_argument("--target-ci", type=float, default=1.0, help="Stop a cell once its CI half-width is <= this")
+    ap.add_argument("--confidence", type=float, default=0.95)
+    ap.add_argument("--min-seeds", type=int, default=3)
+    ap.add_argument("--max-seeds", type=int, default=30)
+    ap.add_argument("--budget", type=int, default=None, help="Total runs the adaptive mode may spend")
+    ap.add_argument("--lockstep", type=int, default=None, metavar="N",
+                    help="Advance N episodes together and issue their planner calls as one batch (--policy runs)")
+    ap.add_argument("--concurrency", type=int, default=None,
+                    help="Max planner calls in flight per lockstep batch (default: N; match the provider's limit)")
+    ap.add_argument("--trace", action="store_true",
+                    help="Write each run's phase spans to logs/strategy=<s>/run=<id>/trace.json (chrome://tracing)")
+    ap.add_argument("--profile", nargs="?", const="cprofile", default=None, choices=PROFILERS,
+                    help="Profile each run (cprofile, or sampling via pyinstrument) into results/profiles/<run_id>.*")
     args = ap.parse_args()
-    
+    if args.profile and args.lockstep:
+        ap.error("--profile profiles one run at a time; it cannot be combined with --lockstep")
+    if args.lockstep and not args.policy:
+        ap.error("--lockstep drives the lean policy loop; pass --policy")
+    if args.lockstep and (args.workers > 1 or args.scale):
+        ap.error("--lockstep runs its batches in this process; drop --workers / --scale")
+    if args.adaptive and args.queue:
+        ap.error("--adaptive runs rounds itself; it cannot be combined with --queue")
+    if not args.maps and not args.scale:
+        ap.error("--maps or --scale is required")
+    if args.scale_survivors and len(args.scale_survivors) != len(args.scale or []):
+        ap.error("--scale-survivors needs one value per --scale size")
+    survivors = {}
+    if args.scale:
+        scaled, survivors = scale_maps(args.scale, args.scale_survivors, args.scale_obstacles)
+        args.maps = list(scaled)
+    if args.policy in ("heuristic", "numpy"):
+        args.strategies = [args.policy]   # no prompt strategy involved; label rows by policy
+
     # Set the LLM provider environment variable
     os.environ["LLM_PROVIDER"] = args.provider
 
@@ -26,57 +274,162 @@ def main():
     os.makedirs("results/agg", exist_ok=True)
     os.makedirs("logs", exist_ok=True)
 
-    fieldnames = [
-        "run_id","map","strategy","seed",
-        "rescued","deaths","avg_rescue_time",
-        "fires_extinguished","roads_cleared","energy_used",
-        "tool_calls","invalid_json","replans","hospital_overflow_events",
-        "battery_recharges"
-    ]
+    opts = {k: getattr(args, k) for k in ("ticks", "provider", "context_tokens", "log_format", "log_compression",
+                                          "checkpoint_every", "resume", "policy", "log_level", "trace", "profile")}
+    specs = run_specs(args.maps, args.strategies, args.seeds)
+
+    # work-queue mode: only enqueue; `python eval/workqueue.py worker --db <file>` runs the jobs
+    if args.queue:
+        from eval.workqueue import WorkQueue
+        added = WorkQueue(args.queue).enqueue(specs, opts)
+        print(f"Enqueued {added} of {len(specs)} runs in {args.queue}")
+        return
 
     summary_csv = "results/agg/summary.csv"
-    write_header = not os.path.exists(summary_csv)
-    with open(summary_csv, "a", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        if write_header:
+    results, failed = {}, []
+    pool = None
+    if args.workers > 1 or args.scale:
+        counter = mp.Value("i", 0)
+        pool_kwargs = {}
+        if args.scale:
+            # scale sweeps: one process per episode so peak_rss_mb is that episode's own peak
+            # (max_tasks_per_child is Python 3.11+; older workers run several episodes each)
+            if sys.version_info >= (3, 11):
+                pool_kwargs["max_tasks_per_child"] = 1
+            else:
+                print("Python < 3.11: workers are reused, so peak_rss_mb is the peak of each worker "
+                      "so far, not of one episode", file=sys.stderr)
+        pool = ProcessPoolExecutor(max_workers=max(1, args.workers), initializer=_init_worker,
+                                   initargs=(counter, parse_worker_env(args.worker_env), args.provider),
+                                   **pool_kwargs)
+    else:
+        os.environ.update({key: values[0] for key, values in parse_worker_env(args.worker_env).items()})
+
+    def run_round(round_specs):
+        # skip-if-done: finished runs are read back from their per-run JSON, unless they
+        # were produced with other options (ticks, provider, ...) — those are re-run
+        if not args.force:
+            for spec in round_specs:
+                done = load_run_metrics(spec["run_id"])
+                if done is not None and done.get("run_options") == run_options(spec, opts):
+                    results[spec["run_id"]] = done
+        todo = [s for s in round_specs if s["run_id"] not in results]
+        print(f"{len(round_specs)} runs: {len(round_specs) - len(todo)} already done, "
+              f"{len(todo)} to run with {args.workers} worker(s)")
+        t_start, walls = time.perf_counter(), []
+
+        def report(spec, metrics=None, error=None):
+            walls.append(metrics["wall_time_s"] if metrics else 0.0)
+            k = len(walls)
+            elapsed = time.perf_counter() - t_start
+            eta = elapsed / k * (len(todo) - k)
+            status = f"{metrics['wall_time_s']:.1f}s" if metrics else f"FAILED ({error})"
+            print(f"[{k}/{len(todo)}] {spec['run_id']}  {status}  elapsed {_fmt_secs(elapsed)}  ETA {_fmt_secs(eta)}",
+                  flush=True)
+
+        if args.lockstep:
+            from eval.lockstep import run_lockstep
+
+            def done(spec, metrics, wall, batch_wall):
+                results[spec["run_id"]] = finish_run(spec, opts, metrics, wall, batch_wall)
+                report(spec, results[spec["run_id"]])
+
+            run_lockstep(todo, opts, batch_size=args.lockstep, concurrency=args.concurrency, on_done=done)
+            elapsed = time.perf_counter() - t_start
+            if todo:
+                print(f"{len(todo)} episodes in {_fmt_secs(elapsed)} = {len(todo) / elapsed * 3600:.0f} episodes/hour "
+                      f"(lockstep batch {args.lockstep}, concurrency {args.concurrency or args.lockstep})")
+            return
+        if pool is None:
+            for spec in todo:
+                results[spec["run_id"]] = execute_run(spec, opts)
+                report(spec, results[spec["run_id"]])
+            return
+        futures = {pool.submit(execute_run, spec, opts): spec for spec in todo}
+        for fut in as_completed(futures):
+            spec = futures[fut]
+            try:
+                results[spec["run_id"]] = fut.result()
+                report(spec, results[spec["run_id"]])
+            except Exception as e:
+                failed.append(spec["run_id"])
+                report(spec, error=e)
+
+    allocator = None
+    try:
+        if args.adaptive:
+            # rounds of seeds until every map x strategy cell is precise enough (or decided)
+            from eval.adaptive import AdaptiveAllocator
+            allocator = AdaptiveAllocator(
+                [(Path(m).stem, strategy) for m in args.maps for strategy in args.strategies], args.seeds,
+                metric=args.adaptive_metric, target=args.target_ci, confidence=args.confidence,
+                min_seeds=args.min_seeds, max_seeds=args.max_seeds, budget=args.budget)
+            map_paths = {Path(m).stem: m for m in args.maps}
+            specs = []
+            while True:
+                round_specs = [spec for name, strategy, seed in allocator.next_round()
+                               for spec in run_specs([map_paths[name]], [strategy], [seed])]
+                if not round_specs:
+                    break
+                open_cells = len({(s["map"], s["strategy"]) for s in round_specs})
+                print(f"--- round {allocator.rounds}: {open_cells} open cell(s), "
+                      f"{allocator.spent} run(s) allocated so far")
+                specs.extend(round_specs)
+                run_round(round_specs)
+                for spec in round_specs:
+                    if spec["run_id"] in results:
+                        allocator.record(spec["map"], spec["strategy"], spec["seed"], results[spec["run_id"]])
+        else:
+            run_round(specs)
+    finally:
+        if pool is not None:
+            # on Ctrl-C / errors do not run (or wait for) the rest of the queue
+            pool.shutdown(cancel_futures=True)
+        # deterministic order regardless of completion order; also runs on Ctrl-C
+        rows = [results[s["run_id"]] for s in specs if s["run_id"] in results]
+        write_summary(summary_csv, rows)
+
+    if allocator is not None:
+        # achieved precision per cell
+        adaptive_rows = allocator.summary()
+        with open("results/agg/adaptive.csv", "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(adaptive_rows[0]))
             writer.writeheader()
+            writer.writerows(adaptive_rows)
+        m = args.adaptive_metric
+        print(f"{'map':<20} {'strategy':<14} {'n':>3} {m + ' mean':>14} {'± CI':>8}  stop")
+        for r in adaptive_rows:
+            mean, half = r[f"{m}_mean"], r[f"{m}_ci_half"]
+            print(f"{r['map']:<20} {r['strategy']:<14} {r['n']:>3} {mean if mean is not None else float('nan'):>14.2f} "
+                  f"{half if half is not None else float('nan'):>8.2f}  {r['stop_reason']}")
+        print(f"{allocator.spent} runs in {allocator.rounds - 1} round(s); precision in results/agg/adaptive.csv")
+
+    # --- prompt size / planning latency vs map size
+    scaling = {}  # map_cells -> [(avg_prompt_tokens, avg_plan_latency_ms)]
+    for m in rows:
+        if m.get("map_cells") is not None:
+            scaling.setdefault(m["map_cells"], []).append((m["avg_prompt_tokens"], m["avg_plan_latency_ms"]))
+    print("map_cells  avg_prompt_tokens  avg_plan_latency_ms")
+    for cells in sorted(scaling):
+        toks = sum(p for p, _ in scaling[cells]) / len(scaling[cells])
+        lat = sum(l for _, l in scaling[cells]) / len(scaling[cells])
+        print(f"{cells:>9}  {toks:>17.1f}  {lat:>19.2f}")
 
-        for mappath in args.maps:
-            mapname = Path(mappath).stem
-            for strategy in args.strategies:
-                for seed in args.seeds:
-                    run_id = f"{mapname}_{strategy}_seed{seed}"
-
-                    # 🔒 seed fixing
-                    random.seed(seed)
-                    np.random.seed(seed)
-
-                    # Run one episode (pass run_id explicitly)
-                    metrics = run_episode(
-                        mappath,
-                        seed=seed,
-                        ticks=args.ticks,
-                        strategy=strategy,
-                        run_id=run_id,          # 🔹 NEW
-                        log_path=None,
-                        render=False
-                    )
-
-                    # Attach identifiers (safety, in case run_episode doesn’t add all)
-                    metrics.update({
-                        "run_id": run_id,
-                        "map": mapname,
-                        "strategy": strategy,
-                        "seed": seed
-                    })
-
-                    # Save JSON per run
-                    save_run_metrics(run_id, metrics)
-
-                    # Append CSV row
-                    row = {k: metrics.get(k,"") for k in fieldnames}
-                    writer.writerow(row)
+    if args.scale and rows:
+        scaling_csv = "results/agg/scaling.csv"
+        table = write_scaling(scaling_csv, rows, survivors)
+        print(f"{'map':<28} {'cells':>10} {'survivors':>9} {'ms/tick':>9} {'peak MB':>8} {'prompt tok':>10}")
+        for r in table:
+            print(f"{r['map']:<28} {r['map_cells'] or 0:>10} {r['survivors'] or 0:>9} {r['ms_per_tick'] or 0:>9.2f} "
+                  f"{r['peak_rss_mb'] or 0:>8.1f} {r['avg_prompt_tokens'] or 0:>10.1f}")
+        try:
+            from eval.plots import plot_scale_sweep
+            print(f"Scale plot: {plot_scale_sweep(scaling_csv)}")
+        except ImportError as e:
+            print(f"Wrote {scaling_csv} (no plot: {e})")
 
+    if failed:
+        print(f"{len(failed)} run(s) failed: {', '.join(failed)} (re-run the same command to retry them)")
     print(f"Done. Results in results/raw/ and results/agg/summary.csv")
 
 
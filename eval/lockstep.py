@@ -0,0 +1,151 @@
+# eval/lockstep.py
+"""
+Lockstep batch runner: advance N episodes together, one tick at a time.
+
+At every tick the N states are gathered and their planner calls issued
+together — concurrently, at most `concurrency` in flight (the provider's
+limit) — and each plan is then applied to its own model. An inference server
+that would otherwise sit idle between one episode's requests stays busy.
+
+    python eval/lockstep.py --map configs/map_small.yaml --seeds 0-24 --batch-size 25 --concurrency 8
+
+Each episode keeps its own global RNG state (swapped in around its
+environment work), so a lockstep run produces the same per-episode results as
+running the episodes one after another (bench/lockstep_equivalence.py checks
+this).
+"""
+import argparse, os, random, sys, time
+from concurrent.futures import ThreadPoolExecutor
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+
+
+class _RNGSlot:
+    """Global random / numpy RNG state of one episode, swapped in while that episode touches the model."""
+
+    def __init__(self):
+        self.state = (random.getstate(), np.random.get_state())
+
+    def __enter__(self):
+        self._outer = (random.getstate(), np.random.get_state())
+        random.setstate(self.state[0])
+        np.random.set_state(self.state[1])
+
+    def __exit__(self, *exc):
+        self.state = (random.getstate(), np.random.get_state())
+        random.setstate(self._outer[0])
+        np.random.set_state(self._outer[1])
+
+
+def plan_batch(episodes, pool=None):
+    """
+    Plans of the current tick for every episode, in order: [(commands, latency_ms)].
+
+    With a pool the calls run concurrently (LLM providers are I/O bound);
+    without one they run inline (heuristic policies are CPU bound, threads
+    would only add overhead). A provider with a real multi-prompt batch
+    endpoint would plug in here.
+    """
+    if pool is None:
+        return [ep.plan() for ep in episodes]
+    return list(pool.map(lambda ep: ep.plan(), episodes))
+
+
+def run_lockstep(specs, opts, batch_size=8, concurrency=None, on_done=None):
+    """
+    Run episodes in lockstep batches of `batch_size`.
+
+    Args:
+        specs: harness run specs ({"run_id", "map_path", "strategy", "seed", ...})
+        opts: harness options (ticks, policy, provider, log_level, context_tokens)
+        concurrency: max planner calls in flight (default: batch_size); LLM policy only
+        on_done: called as on_done(spec, metrics, wall_s, batch_wall_s) for every
+            episode of a finished batch; the episodes of a batch share its wall
+            time, so wall_s is the episode's share (batch_wall_s / batch size)
+
+    Returns:
+        {run_id: metrics}
+    """
+    from main import LeanEpisode
+    policy = opts.get("policy") or "llm"
+    concurrency = concurrency or batch_size
+    results = {}
+    pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="lockstep") if policy == "llm" else None
+    try:
+        for start in range(0, len(specs), batch_size):
+            batch = specs[start:start + batch_size]
+            t0 = time.perf_counter()
+            episodes, slots = [], []
+            for spec in batch:
+                episodes.append(LeanEpisode(
+                    spec["map_path"], seed=spec["seed"], ticks=opts["ticks"], policy=policy,
+                    strategy=spec["strategy"], provider=opts.get("provider", "mock"), run_id=spec["run_id"],
+                    log_level=opts.get("log_level", "metrics"), context_tokens=opts.get("context_tokens"),
+                    trace=opts.get("trace", False)))
+                slots.append(_RNGSlot())   # LeanEpisode just seeded the globals for this episode
+
+            while True:
+                active = [i for i, ep in enumerate(episodes) if not ep.done]
+                if not active:
+                    break
+                for i in active:
+                    with slots[i]:
+                        episodes[i].observe()
+                plans = plan_batch([episodes[i] for i in active], pool)
+                for i, (cmds, latency_ms) in zip(active, plans):
+                    with slots[i]:
+                        episodes[i].advance(cmds, latency_ms)
+
+            batch_wall = time.perf_counter() - t0
+            for spec, ep in zip(batch, episodes):
+                results[spec["run_id"]] = ep.finish()
+                if on_done is not None:
+                    on_done(spec, results[spec["run_id"]], batch_wall / len(batch), batch_wall)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return results
+
+
+def _parse_seeds(items):
+    """["0-24"] or ["0", "1", "5"] -> [0, ..., 24] / [0, 1, 5]"""
+    seeds = []
+    for item in items:
+        lo, _, hi = item.partition("-")
+        seeds.extend(range(int(lo), int(hi) + 1) if hi else [int(lo)])
+    return seeds
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--map", type=str, default="configs/map_small.yaml")
+    ap.add_argument("--seeds", nargs="+", default=["0-7"], help="Seeds or ranges (0-24)")
+    ap.add_argument("--ticks", type=int, default=200)
+    ap.add_argument("--strategy", type=str, default="react")
+    ap.add_argument("--policy", type=str, default="llm", choices=["llm", "heuristic", "numpy"])
+    ap.add_argument("--provider", type=str, default="mock", choices=["mock", "groq", "gemini", "ollama"])
+    ap.add_argument("--batch-size", type=int, default=8, help="Episodes advanced together")
+    ap.add_argument("--concurrency", type=int, default=None, help="Planner calls in flight (default: batch size)")
+    ap.add_argument("--log-level", type=str, default="metrics", choices=["none", "metrics", "full"])
+    args = ap.parse_args()
+
+    from eval.harness import run_specs
+    os.environ["LLM_PROVIDER"] = args.provider
+    label = args.strategy if args.policy == "llm" else args.policy
+    specs = run_specs([args.map], [label], _parse_seeds(args.seeds))
+    opts = {"ticks": args.ticks, "policy": args.policy, "provider": args.provider,
+            "log_level": args.log_level, "context_tokens": None}
+    t0 = time.perf_counter()
+
+    def done(spec, metrics, wall, batch_wall):
+        print(f"{spec['run_id']}: rescued={metrics['rescued']} deaths={metrics['deaths']} "
+              f"(batch {batch_wall:.1f}s)", flush=True)
+
+    run_lockstep(specs, opts, batch_size=args.batch_size, concurrency=args.concurrency, on_done=done)
+    elapsed = time.perf_counter() - t0
+    print(f"{len(specs)} episodes in {elapsed:.1f}s = {len(specs) / elapsed * 3600:.0f} episodes/hour "
+          f"(batch {args.batch_size}, concurrency {args.concurrency or args.batch_size})")
+
+
+if __name__ == "__main__":
+    main()
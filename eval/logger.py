@@ -1,5 +1,5 @@
 # eval/logger.py
-import os, json
+import os, json, difflib, gzip, hashlib, lzma, queue, threading, time, zlib
 
 def log_prompt_response(strategy, run_id, tick, messages, response_text, logdir="logs"):
     """Append structured conversation entries into logs/strategy=<name>/run=<id>/tick_x.jsonl"""
@@ -30,9 +30,449 @@ def log_metrics_snapshot(strategy, run_id, tick, metrics, logdir="logs"):
         f.write(json.dumps(snapshot, ensure_ascii=False) + "\n")
 
 
+def trim_run_logs(strategy, run_id, after_tick, logdir="logs"):
+    """Drop per-tick files and metrics lines logged after `after_tick` (used when resuming a run)."""
+    run_dir = os.path.join(logdir, f"strategy={strategy}", f"run={run_id}")
+    if not os.path.isdir(run_dir):
+        return
+    for name in os.listdir(run_dir):
+        if name.startswith("tick_") and name.endswith(".jsonl") and int(name[5:-6]) > after_tick:
+            os.remove(os.path.join(run_dir, name))
+    path = os.path.join(run_dir, "metrics.jsonl")
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            lines = [l for l in f if l.endswith("\n") and json.loads(l)["tick"] <= after_tick]
+        with open(path, "w", encoding="utf-8") as f:
+            f.writelines(lines)
+
+
 def save_run_metrics(run_id, metrics, outdir="results/raw"):
-    """Dump one JSON file per run with all final metrics"""
+    """Dump one JSON file per run with all final metrics (written atomically)"""
     os.makedirs(outdir, exist_ok=True)
     out_path = os.path.join(outdir, f"{run_id}.json")
-    with open(out_path, "w", encoding="utf-8") as f:
+    with open(out_path + ".tmp", "w", encoding="utf-8") as f:
         json.dump(metrics, f, indent=2, ensure_ascii=False)
+    os.replace(out_path + ".tmp", out_path)
+
+
+def load_run_metrics(run_id, outdir="results/raw"):
+    """Metrics saved by save_run_metrics, or None if the run has not finished."""
+    path = os.path.join(outdir, f"{run_id}.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+# ---------------------------------------------------------------------------
+# Buffered single-file episode log
+# ---------------------------------------------------------------------------
+_COMPRESSORS = {
+    None: (lambda b: b, ""),
+    "gzip": (gzip.compress, ".gz"),
+    "lzma": (lzma.compress, ".xz"),
+}
+
+
+def _decompress(data, compression):
+    if compression == "gzip":
+        return gzip.decompress(data)
+    if compression == "lzma":
+        return lzma.decompress(data)
+    return data
+
+
+class EpisodeLogWriter:
+    """
+    One open handle per run instead of a file (and a makedirs) per tick.
+
+    Records are buffered in memory and flushed as a segment once `flush_records`
+    records or `flush_seconds` have accumulated. With compression each segment is
+    an independent gzip/xz member, so a tick can be read back by seeking to its
+    segment. The tick -> (segment offset, segment length, offset, length) index is
+    written to episode.idx.json on close().
+
+    Layout: logs/strategy=<name>/run=<id>/episode.jsonl[.gz|.xz] + episode.idx.json
+    """
+
+    def __init__(self, strategy, run_id, logdir="logs", compression=None,
+                 flush_records=256, flush_seconds=2.0, background=False, resume_after=None):
+        if compression not in _COMPRESSORS:
+            raise ValueError(f"unknown compression: {compression}")
+        self.run_dir = os.path.join(logdir, f"strategy={strategy}", f"run={run_id}")
+        os.makedirs(self.run_dir, exist_ok=True)
+        self.compression = compression
+        self._compress, ext = _COMPRESSORS[compression]
+        self.path = os.path.join(self.run_dir, "episode.jsonl" + ext)
+        self.index_path = os.path.join(self.run_dir, "episode.idx.json")
+        self.flush_records = flush_records
+        self.flush_seconds = flush_seconds
+
+        # resuming from a checkpoint: keep what was logged up to that tick, drop the rest
+        kept = []
+        if resume_after is not None and os.path.exists(self.path):
+            kept = [rec for rec in EpisodeLogReader(self.run_dir).iter_records() if rec["tick"] <= resume_after]
+            if os.path.exists(self.index_path):
+                os.remove(self.index_path)
+        self.resumed_blobs = {rec["hash"]: rec["tick"] for rec in kept if rec["kind"] == "blob"}
+
+        self._f = open(self.path, "wb")
+        self._lock = threading.Lock()
+        self._buf = []            # [(tick, line_bytes)]
+        self._last_flush = time.monotonic()
+        self._index = {}          # tick -> [[seg_off, seg_len, off, len], ...]
+        self._closed = False
+
+        self._queue = None
+        self._thread = None
+        if background:
+            self._queue = queue.Queue()
+            self._thread = threading.Thread(target=self._run, name="episode-log", daemon=True)
+            self._thread.start()
+        for rec in kept:
+            self.write(rec.pop("tick"), rec.pop("kind"), rec)
+
+    # ---- writing ----
+    def write(self, tick, kind, payload):
+        """Buffer one record: {"tick": tick, "kind": kind, **payload}."""
+        rec = {"tick": tick, "kind": kind}
+        rec.update(payload)
+        line = (json.dumps(rec, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._lock:
+            self._buf.append((tick, line))
+            due = (len(self._buf) >= self.flush_records
+                   or time.monotonic() - self._last_flush >= self.flush_seconds)
+        if due:
+            self.flush()
+
+    def log_prompt_response(self, tick, messages, response_text):
+        self.write(tick, "prompt", {"messages": messages, "response": response_text})
+
+    def log_metrics_snapshot(self, tick, metrics):
+        self.write(tick, "metrics", {"metrics": metrics})
+
+    def flush(self):
+        with self._lock:
+            buf, self._buf = self._buf, []
+            self._last_flush = time.monotonic()
+        if not buf:
+            return
+        if self._queue is not None:
+            self._queue.put(buf)
+        else:
+            self._write_segment(buf)
+
+    def _write_segment(self, buf):
+        raw = b"".join(line for _, line in buf)
+        seg = self._compress(raw)
+        seg_off = self._f.tell()
+        self._f.write(seg)
+        self._f.flush()
+        off = 0
+        for tick, line in buf:
+            self._index.setdefault(tick, []).append([seg_off, len(seg), off, len(line)])
+            off += len(line)
+
+    def _run(self):
+        while True:
+            try:
+                buf = self._queue.get(timeout=self.flush_seconds)
+            except queue.Empty:
+                self.flush()
+                continue
+            if buf is None:
+                return
+            self._write_segment(buf)
+
+    def close(self):
+        if self._closed:
+            return
+        self.flush()
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+        self._f.close()
+        with open(self.index_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "file": os.path.basename(self.path), "compression": self.compression,
+                       "ticks": {str(t): v for t, v in sorted(self._index.items())}}, f)
+        os.replace(self.index_path + ".tmp", self.index_path)
+        self._closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class EpisodeLogReader:
+    """Random access to an episode log written by EpisodeLogWriter."""
+
+    def __init__(self, run_dir):
+        self.run_dir = run_dir
+        index_path = os.path.join(run_dir, "episode.idx.json")
+        if os.path.exists(index_path):
+            with open(index_path, "r", encoding="utf-8") as f:
+                idx = json.load(f)
+            self.compression = idx["compression"]
+            self.path = os.path.join(run_dir, idx["file"])
+            self.index = {int(t): v for t, v in idx["ticks"].items()}
+        else:
+            # run died before close(): rebuild the index by scanning segments
+            for compression, (_, ext) in _COMPRESSORS.items():
+                path = os.path.join(run_dir, "episode.jsonl" + ext)
+                if os.path.exists(path):
+                    break
+            else:
+                raise FileNotFoundError(f"no episode log in {run_dir}")
+            self.compression, self.path = compression, path
+            self.index = self._scan()
+
+    def _segments(self):
+        """Yield (seg_off, seg_len, raw_bytes) for every segment in the file."""
+        with open(self.path, "rb") as f:
+            data = f.read()
+        if self.compression is None:
+            yield 0, len(data), data
+            return
+        pos = 0
+        while pos < len(data):
+            d = zlib.decompressobj(31) if self.compression == "gzip" else lzma.LZMADecompressor()
+            try:
+                raw = d.decompress(data[pos:])
+            except (zlib.error, lzma.LZMAError, EOFError):
+                return  # truncated tail of a crashed run
+            rest = len(d.unused_data)
+            seg_len = len(data) - pos - rest
+            yield pos, seg_len, raw
+            pos += seg_len
+
+    def _scan(self):
+        index = {}
+        for seg_off, seg_len, raw in self._segments():
+            off = 0
+            for line in raw.splitlines(keepends=True):
+                if line.endswith(b"\n"):
+                    tick = json.loads(line)["tick"]
+                    index.setdefault(tick, []).append([seg_off, seg_len, off, len(line)])
+                off += len(line)
+        return index
+
+    def ticks(self):
+        return sorted(self.index)
+
+    def read_tick(self, tick):
+        """Return the records of one tick without scanning the rest of the file."""
+        out, cache = [], {}
+        with open(self.path, "rb") as f:
+            for seg_off, seg_len, off, length in self.index.get(tick, []):
+                if self.compression is None:
+                    f.seek(seg_off + off)
+                    line = f.read(length)
+                else:
+                    if seg_off not in cache:
+                        f.seek(seg_off)
+                        cache[seg_off] = _decompress(f.read(seg_len), self.compression)
+                    line = cache[seg_off][off:off + length]
+                out.append(json.loads(line))
+        return out
+
+    def iter_records(self, kind=None):
+        for _, _, raw in self._segments():
+            for line in raw.splitlines(keepends=True):
+                if not line.endswith(b"\n"):
+                    continue  # truncated tail of a crashed run
+                rec = json.loads(line)
+                if kind is None or rec["kind"] == kind:
+                    yield rec
+
+
+# ---------------------------------------------------------------------------
+# Content-addressed prompt log (dedup + deltas)
+# ---------------------------------------------------------------------------
+def _content_hash(text):
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _common_prefix_len(a, b):
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _common_suffix_len(a, b, limit):
+    lo, hi = 0, min(len(a), len(b)) - limit
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[len(a) - mid:] == b[len(b) - mid:]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _make_delta(base, text):
+    """
+    Delta of `text` against `base`: common prefix/suffix lengths plus copy/insert
+    ops over the ", "-separated chunks in between (one chunk ~ one JSON entity).
+    """
+    p = _common_prefix_len(base, text)
+    sfx = _common_suffix_len(base, text, p)
+    old_chunks = base[p:len(base) - sfx].split(", ")
+    new_chunks = text[p:len(text) - sfx].split(", ")
+    ops = []
+    sm = difflib.SequenceMatcher(None, old_chunks, new_chunks, autojunk=False)
+    for tag, i1, i2, j1, j2 in sm.get_opcodes():
+        if tag == "equal":
+            ops.append([i1, i2])
+        elif j2 > j1:
+            ops.append(new_chunks[j1:j2])
+    return {"p": p, "s": sfx, "ops": ops}
+
+
+def _apply_delta(base, delta):
+    p, sfx = delta["p"], delta["s"]
+    old_chunks = base[p:len(base) - sfx].split(", ")
+    chunks = []
+    for op in delta["ops"]:
+        if len(op) == 2 and isinstance(op[0], int):
+            chunks.extend(old_chunks[op[0]:op[1]])
+        else:
+            chunks.extend(op)
+    return base[:p] + ", ".join(chunks) + base[len(base) - sfx:]
+
+
+class DedupPromptLog:
+    """
+    Content-addressed prompt logging on top of an EpisodeLogWriter.
+
+    Every message body is hashed and written once as a "blob" record; per-tick
+    "prompt_ref" records only carry hashes. Large bodies (the CONTEXT_JSON
+    user message) are stored as a chunk-level delta against the same message
+    of the previous tick, with a full keyframe every `keyframe_every` deltas so
+    reconstruction chains stay short. DedupPromptReader rebuilds the exact text.
+    """
+
+    def __init__(self, writer, delta_min=512, keyframe_every=50):
+        self.writer = writer
+        self.delta_min = delta_min
+        self.keyframe_every = keyframe_every
+        self._seen = dict(getattr(writer, "resumed_blobs", {}))    # hash -> tick of the blob record
+        self._depth = dict.fromkeys(self._seen, 0)   # hash -> length of its delta chain
+        self._prev = {}    # message slot -> (hash, text) logged last time
+
+    def _blob(self, tick, slot, text):
+        h = _content_hash(text)
+        prev = self._prev.get(slot)
+        self._prev[slot] = (h, text)
+        if h in self._seen:
+            return h
+
+        payload = {"hash": h}
+        depth = 0
+        if prev is not None and len(text) >= self.delta_min and self._depth[prev[0]] < self.keyframe_every:
+            base_hash, base = prev
+            delta = _make_delta(base, text)
+            if len(json.dumps(delta["ops"])) < len(text) // 2:
+                delta["base"] = base_hash
+                payload["delta"] = delta
+                depth = self._depth[base_hash] + 1
+        if "delta" not in payload:
+            payload["content"] = text
+        self.writer.write(tick, "blob", payload)
+        self._seen[h] = tick
+        self._depth[h] = depth
+        return h
+
+    def log_prompt_response(self, tick, messages, response_text):
+        refs = [{"role": m["role"], "ref": self._blob(tick, (i, m["role"]), m["content"])}
+                for i, m in enumerate(messages)]
+        resp = self._blob(tick, "response", response_text or "")
+        self.writer.write(tick, "prompt_ref", {"messages": refs, "response": resp,
+                                               "response_none": response_text is None})
+
+    def close(self):
+        path = os.path.join(self.writer.run_dir, "blobs.idx.json")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self._seen, f)
+        os.replace(path + ".tmp", path)
+
+
+class DedupPromptReader:
+    """Reconstructs exact messages from a DedupPromptLog episode."""
+
+    def __init__(self, run_dir):
+        self.log = EpisodeLogReader(run_dir)
+        path = os.path.join(run_dir, "blobs.idx.json")
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self._where = json.load(f)
+        else:
+            self._where = {rec["hash"]: rec["tick"] for rec in self.log.iter_records(kind="blob")}
+        self._blobs = {}
+        self._text = {}
+
+    def _load(self, h):
+        if h not in self._blobs:
+            for rec in self.log.read_tick(self._where[h]):
+                if rec["kind"] == "blob":
+                    self._blobs[rec["hash"]] = rec
+        return self._blobs[h]
+
+    def text(self, h):
+        if h in self._text:
+            return self._text[h]
+        chain, rec = [], self._load(h)
+        while "delta" in rec and rec["delta"]["base"] not in self._text:
+            chain.append(rec)
+            rec = self._load(rec["delta"]["base"])
+        if "delta" not in rec:
+            self._text[rec["hash"]] = rec["content"]
+        else:
+            chain.append(rec)
+        for rec in reversed(chain):
+            self._text[rec["hash"]] = _apply_delta(self._text[rec["delta"]["base"]], rec["delta"])
+        return self._text[h]
+
+    def messages(self, tick):
+        """Return (messages, response_text) logged at `tick`, or None."""
+        for rec in self.log.read_tick(tick):
+            if rec["kind"] == "prompt_ref":
+                return self._expand(rec)
+        return None
+
+    def _expand(self, rec):
+        messages = [{"role": m["role"], "content": self.text(m["ref"])} for m in rec["messages"]]
+        response = None if rec.get("response_none") else self.text(rec["response"])
+        return messages, response
+
+
+def export_tick_files(run_dir, out_dir=None):
+    """
+    Export an episode log to the per-tick layout of log_prompt_response /
+    log_metrics_snapshot (tick_<t>.jsonl + metrics.jsonl).
+    """
+    reader = EpisodeLogReader(run_dir)
+    dedup = None
+    out_dir = out_dir or run_dir
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, "metrics.jsonl"), "w", encoding="utf-8") as mf:
+        for rec in reader.iter_records():
+            if rec["kind"] == "prompt_ref":
+                dedup = dedup or DedupPromptReader(run_dir)
+                messages, response = dedup._expand(rec)
+                rec = {"tick": rec["tick"], "kind": "prompt", "messages": messages, "response": response}
+            if rec["kind"] == "prompt":
+                with open(os.path.join(out_dir, f"tick_{rec['tick']}.jsonl"), "a", encoding="utf-8") as f:
+                    for msg in rec["messages"]:
+                        f.write(json.dumps(msg, ensure_ascii=False) + "\n")
+                    f.write(json.dumps({"role": "assistant", "content": rec["response"]}, ensure_ascii=False) + "\n")
+            elif rec["kind"] == "metrics":
+                snapshot = {"tick": rec["tick"]}
+                snapshot.update(rec["metrics"])
+                mf.write(json.dumps(snapshot, ensure_ascii=False) + "\n")
@@ -0,0 +1,162 @@
+# eval/metrics.py
+import os
+import numpy as np
+
+# ---------------------------------------------------------------------------
+# Schema
+# ---------------------------------------------------------------------------
+# Cumulative counters read off the model after every step.
+COUNTER_FIELDS = [
+    "rescued", "deaths", "fires_extinguished", "roads_cleared", "energy_used",
+    "tool_calls", "invalid_json", "replans", "hospital_overflow_events", "battery_recharges",
+]
+# Per-tick planner measurements supplied by the episode loop.
+PLANNER_FIELDS = [
+    "prompt_tokens", "plan_latency_ms", "shard_latency_max_ms", "tool_latency_ms", "plan_lag", "plan_source",
+]
+METRIC_FIELDS = COUNTER_FIELDS + PLANNER_FIELDS
+
+# plan_source is stored as its index in this list
+PLAN_SOURCES = ["llm", "heuristic", "last_plan"]
+
+
+class MetricsRecorder:
+    """
+    Fixed-schema, preallocated per-tick metrics table.
+
+    One float64 row per tick in a (capacity, fields) array — no per-tick dicts
+    or JSON. With ring=True only the newest `capacity` rows are kept (memory
+    stays flat for arbitrarily long runs); count / sum / min / max still cover
+    every tick (the buffer is folded into running totals each time it wraps),
+    percentiles use the retained rows.
+
+    dump() writes metrics.npz (and optionally metrics.csv) once at the end.
+    """
+
+    def __init__(self, capacity, fields=None, ring=False):
+        self.fields = list(fields or METRIC_FIELDS)
+        self.col = {name: i for i, name in enumerate(self.fields)}
+        self.capacity = max(1, int(capacity))
+        self.ring = ring
+        self.ticks = np.full(self.capacity, -1, dtype=np.int64)
+        self.data = np.zeros((self.capacity, len(self.fields)), dtype=np.float64)
+        self.n = 0        # rows recorded in total (may exceed capacity in ring mode)
+        self._folded = 0  # rows already folded into _sum / _min / _max
+        k = len(self.fields)
+        self._sum = np.zeros(k)
+        self._min = np.full(k, np.inf)
+        self._max = np.full(k, -np.inf)
+
+    # ---- recording ----
+    def record(self, tick, row):
+        """Record one tick; `row` is a sequence in schema order."""
+        if self.n >= self.capacity and not self.ring:
+            raise IndexError(f"MetricsRecorder is full ({self.capacity} rows); use ring=True for open-ended runs")
+        i = self.n % self.capacity
+        self.data[i] = row
+        self.ticks[i] = tick
+        self.n += 1
+        if self.ring and i == self.capacity - 1:
+            self._fold()
+
+    def _fold(self):
+        self._sum += self.data.sum(axis=0)
+        np.minimum(self._min, self.data.min(axis=0), out=self._min)
+        np.maximum(self._max, self.data.max(axis=0), out=self._max)
+        self._folded = self.n
+
+    def record_model(self, tick, model, prompt_tokens=0, plan_latency_ms=0.0, shard_latency_max_ms=0.0,
+                     tool_latency_ms=0.0, plan_lag=0, plan_source="llm"):
+        """Record the model counters plus the planner measurements of one tick (default schema)."""
+        self.record(tick, (
+            model.rescued, model.deaths, model.fires_extinguished, model.roads_cleared, model.energy_used,
+            model.tool_calls, model.invalid_json, model.replans, model.hospital_overflow_events,
+            model.battery_recharges,
+            prompt_tokens, plan_latency_ms, shard_latency_max_ms, tool_latency_ms, plan_lag or 0,
+            PLAN_SOURCES.index(plan_source),
+        ))
+
+    # ---- access ----
+    def _order(self):
+        """Row indices of the retained rows, oldest first."""
+        if self.n <= self.capacity:
+            return np.arange(self.n)
+        start = self.n % self.capacity
+        return np.concatenate([np.arange(start, self.capacity), np.arange(start)])
+
+    def column(self, name):
+        return self.data[self._order(), self.col[name]]
+
+    def tick_column(self):
+        return self.ticks[self._order()]
+
+    def last(self, name, default=0):
+        return self.data[(self.n - 1) % self.capacity, self.col[name]] if self.n else default
+
+    # ---- streaming reductions (over every recorded tick) ----
+    def _live(self, name):
+        """Column values recorded since the last fold (always rows 0..n-folded of the buffer)."""
+        return self.data[:self.n - self._folded, self.col[name]]
+
+    def mean(self, name):
+        return float((self._sum[self.col[name]] + self._live(name).sum()) / self.n) if self.n else 0.0
+
+    def max(self, name):
+        return float(max(self._max[self.col[name]], self._live(name).max(initial=-np.inf))) if self.n else 0.0
+
+    def min(self, name):
+        return float(min(self._min[self.col[name]], self._live(name).min(initial=np.inf))) if self.n else 0.0
+
+    def percentile(self, name, q):
+        """q-th percentile over the retained rows (exact unless ring mode dropped rows)."""
+        col = self.column(name)
+        return float(np.percentile(col, q)) if len(col) else 0.0
+
+    def summary(self, percentiles=(50, 95)):
+        out = {}
+        for name in self.fields:
+            out[name] = {"mean": self.mean(name), "min": self.min(name), "max": self.max(name)}
+            for q in percentiles:
+                out[name][f"p{q}"] = self.percentile(name, q)
+        return out
+
+    # ---- persistence ----
+    def dump(self, run_dir, csv=False):
+        """Write metrics.npz (tick + one array per field) and optionally metrics.csv."""
+        os.makedirs(run_dir, exist_ok=True)
+        order = self._order()
+        arrays = {"tick": self.ticks[order]}
+        arrays.update({name: self.data[order, i] for i, name in enumerate(self.fields)})
+        path = os.path.join(run_dir, "metrics.npz")
+        with open(path + ".tmp", "wb") as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(path + ".tmp", path)
+        if csv:
+            table = np.column_stack([arrays["tick"]] + [arrays[name] for name in self.fields])
+            np.savetxt(os.path.join(run_dir, "metrics.csv"), table, delimiter=",", fmt="%.6g",
+                       header=",".join(["tick"] + self.fields), comments="")
+        return path
+
+    def __getstate__(self):
+        # checkpoints only carry the filled part of the table
+        state = dict(self.__dict__)
+        if self.n < self.capacity:
+            state["data"], state["ticks"] = self.data[:self.n].copy(), self.ticks[:self.n].copy()
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if len(self.data) < self.capacity:
+            data = np.zeros((self.capacity, len(self.fields)), dtype=np.float64)
+            ticks = np.full(self.capacity, -1, dtype=np.int64)
+            data[:len(self.data)], ticks[:len(self.ticks)] = self.data, self.ticks
+            self.data, self.ticks = data, ticks
+
+
+def load_metrics(path):
+    """Read a metrics.npz back as {field: array}; plan_source is decoded to strings."""
+    with np.load(path) as z:
+        out = {k: z[k] for k in z.files}
+    if "plan_source" in out:
+        out["plan_source"] = np.array(PLAN_SOURCES, dtype=object)[out["plan_source"].astype(int)]
+    return out
@@ -1,12 +1,25 @@
 # eval/plots.py
-import argparse, os, pandas as pd, json
-import matplotlib.pyplot as plt
+import argparse, os, json
 from glob import glob
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from eval.logger import EpisodeLogReader
 
 def load_time_series(logdir="logs"):
     """Return DataFrame with columns [run_id, strategy, tick, rescued, deaths, ...]"""
-    rows = []
+    import pandas as pd
+    from eval.metrics import load_metrics
+    frames, rows = [], []
+    # columnar tables written by MetricsRecorder.dump()
+    for npz_file in glob(os.path.join(logdir, "strategy=*/run=*/metrics.npz")):
+        parts = npz_file.split(os.sep)
+        df = pd.DataFrame(load_metrics(npz_file))
+        df["strategy"] = parts[-3].split("=")[1]
+        df["run_id"] = parts[-2].split("=")[1]
+        frames.append(df)
     for metrics_file in glob(os.path.join(logdir, "strategy=*/run=*/metrics.jsonl")):
+        if os.path.exists(os.path.join(os.path.dirname(metrics_file), "metrics.npz")):
+            continue
         parts = metrics_file.split(os.sep)
         strategy = parts[-3].split("=")[1]
         run_id = parts[-2].split("=")[1]
@@ -16,23 +29,77 @@ def load_time_series(logdir="logs"):
                 snap["strategy"] = strategy
                 snap["run_id"] = run_id
                 rows.append(snap)
-    if not rows:
+    # runs logged with EpisodeLogWriter (--log-format episode) and not exported
+    for index_file in glob(os.path.join(logdir, "strategy=*/run=*/episode.idx.json")):
+        run_dir = os.path.dirname(index_file)
+        if os.path.exists(os.path.join(run_dir, "metrics.jsonl")) or os.path.exists(os.path.join(run_dir, "metrics.npz")):
+            continue
+        parts = run_dir.split(os.sep)
+        strategy = parts[-2].split("=")[1]
+        run_id = parts[-1].split("=")[1]
+        for rec in EpisodeLogReader(run_dir).iter_records(kind="metrics"):
+            snap = {"tick": rec["tick"]}
+            snap.update(rec["metrics"])
+            snap["strategy"] = strategy
+            snap["run_id"] = run_id
+            rows.append(snap)
+    if rows:
+        frames.append(pd.DataFrame(rows))
+    if not frames:
         return pd.DataFrame()
-    return pd.DataFrame(rows)
+    return pd.concat(frames, ignore_index=True)
+
+def plot_scale_sweep(scaling_csv="results/agg/scaling.csv", out="results/plots"):
+    """Per-tick time, peak memory and prompt size against map size for a harness --scale sweep."""
+    import pandas as pd
+    import matplotlib.pyplot as plt
+    df = pd.read_csv(scaling_csv).dropna(subset=["map_cells"]).sort_values("map_cells")
+    os.makedirs(out, exist_ok=True)
+    fig, axes = plt.subplots(1, 3, figsize=(18, 5))
+    for ax, col, label in zip(axes, ["ms_per_tick", "peak_rss_mb", "avg_prompt_tokens"],
+                              ["Wall time per tick (ms)", "Peak RSS (MB)", "Avg prompt tokens / tick"]):
+        ax.plot(df["map_cells"], df[col], marker="o")
+        for _, r in df.iterrows():
+            ax.annotate(f"{int(r['survivors'])} surv." if pd.notna(r.get("survivors")) else "",
+                        (r["map_cells"], r[col]), textcoords="offset points", xytext=(4, 4), fontsize=8)
+        ax.set_xscale("log")
+        ax.set_xlabel("Map cells (width × height)")
+        ax.set_ylabel(label)
+        ax.set_title(f"{label} vs map size")
+        ax.grid(True, alpha=0.3)
+    plt.tight_layout()
+    path = os.path.join(out, "scale_sweep.png")
+    plt.savefig(path, dpi=200, bbox_inches='tight')
+    plt.close()
+    return path
 
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--summary", type=str, default="results/agg/summary.csv")
     ap.add_argument("--logs", type=str, default="logs")
     ap.add_argument("--out", type=str, default="results/plots")
+    ap.add_argument("--store", type=str, default=None, metavar="DIR",
+                    help="Read runs and per-tick metrics from a columnar results store (ingesting new runs first)")
     args = ap.parse_args()
+    import pandas as pd
+    import matplotlib.pyplot as plt
     os.makedirs(args.out, exist_ok=True)
 
     # --- Load summary
-    if not os.path.exists(args.summary):
+    store = None
+    if args.store:
+        from eval.store import ResultsStore
+        store = ResultsStore(args.store)
+        store.ingest(logdir=args.logs)
+        df = store.runs()
+        if df.empty:
+            print(f"No runs in {args.store}.")
+            return
+    elif not os.path.exists(args.summary):
         print("No summary.csv found.")
         return
-    df = pd.read_csv(args.summary)
+    else:
+        df = pd.read_csv(args.summary)
 
     # --- 1. Bar plot
     pivot = df.groupby(["map","strategy"])[["rescued","deaths"]].mean().reset_index()
@@ -63,7 +130,7 @@ def main():
     plt.close()
 
     # --- 2. Line plot from per-tick logs
-    ts_df = load_time_series(args.logs)
+    ts_df = store.ticks(columns=["rescued", "strategy"]) if store else load_time_series(args.logs)
     if not ts_df.empty:
         plt.figure(figsize=(14, 8))
         
@@ -145,6 +212,29 @@ def main():
     plt.savefig(os.path.join(args.out, "box_avg_rescue_time.png"))
     plt.close()
 
+    # --- 4. Prompt size & planning latency vs map size
+    if {"map_cells", "avg_prompt_tokens", "avg_plan_latency_ms"}.issubset(df.columns):
+        scale = df.dropna(subset=["map_cells"]).groupby(["strategy", "map_cells"])[
+            ["avg_prompt_tokens", "avg_plan_latency_ms"]].mean().reset_index()
+        if not scale.empty:
+            fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 5))
+            for strat, g in scale.groupby("strategy"):
+                g = g.sort_values("map_cells")
+                ax1.plot(g["map_cells"], g["avg_prompt_tokens"], marker="o", label=strat)
+                ax2.plot(g["map_cells"], g["avg_plan_latency_ms"], marker="o", label=strat)
+            ax1.set_title("Prompt size vs map size")
+            ax1.set_xlabel("Map cells (width × height)")
+            ax1.set_ylabel("Avg prompt tokens / tick")
+            ax2.set_title("Planning latency vs map size")
+            ax2.set_xlabel("Map cells (width × height)")
+            ax2.set_ylabel("Avg plan latency (ms) / tick")
+            for ax in (ax1, ax2):
+                ax.grid(True, alpha=0.3)
+                ax.legend()
+            plt.tight_layout()
+            plt.savefig(os.path.join(args.out, "scaling_prompt_latency.png"), dpi=200, bbox_inches='tight')
+            plt.close()
+
     print("Plots saved.")
 
 if __name__ == "__main__":
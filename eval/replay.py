@@ -0,0 +1,197 @@
+# eval/replay.py
+"""
+Record-and-replay of episodes.
+
+run_episode writes logs/strategy=<name>/run=<id>/replay.jsonl: a header line
+(map, seed, ticks, ...) followed by one line per tick with the commands handed
+to model.set_plan() and a hash of the world state they were planned on.
+Replaying feeds those commands back into a freshly seeded CrisisModel — no LLM
+calls — and checks the state hash every tick to detect divergence.
+
+    python main.py --replay logs/strategy=react/run=map_small_react_seed42
+    python server.py --replay logs/strategy=react/run=map_small_react_seed42
+"""
+import os, json, glob, random
+
+from env.world import CrisisModel
+from reasoning.state import TickState
+from reasoning.utils import validate_action_json
+
+REPLAY_VERSION = 1
+
+
+def state_hash(state):
+    """Content hash of a summarize_state() dict (the same hash TickState carries)."""
+    return TickState(state).hash
+
+
+def seed_globals(seed):
+    """Seed the global random / numpy RNGs (run_episode, the harness and replays all do this)."""
+    random.seed(seed)
+    try:
+        import numpy as np
+        np.random.seed(seed)
+    except ImportError:
+        pass
+
+
+class ReplayRecorder:
+    """Writes the per-tick command stream of one run to replay.jsonl."""
+
+    def __init__(self, run_dir, header, resume_after=None):
+        os.makedirs(run_dir, exist_ok=True)
+        self.path = os.path.join(run_dir, "replay.jsonl")
+        kept = []
+        if resume_after is not None and os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                kept = [l for l in f if l.endswith("\n") and json.loads(l).get("tick", -1) <= resume_after]
+        self._f = open(self.path, "w", encoding="utf-8")
+        if kept:
+            self._f.writelines(kept)
+        else:
+            self._f.write(json.dumps({"kind": "header", "version": REPLAY_VERSION, **header}) + "\n")
+
+    def record(self, tick, commands, state_hash):
+        self._f.write(json.dumps({"tick": tick, "commands": commands, "state_hash": state_hash}) + "\n")
+
+    def close(self):
+        self._f.close()
+
+
+# ---------------------------------------------------------------------------
+# Loading
+# ---------------------------------------------------------------------------
+def _commands_from_response(text):
+    try:
+        return validate_action_json(text or "").get("commands", [])
+    except ValueError:
+        return []
+
+
+def load_recording(path):
+    """
+    Load a recording from a replay.jsonl file or a run directory.
+
+    Run directories without replay.jsonl (older runs) fall back to the prompt
+    logs: commands are re-parsed from each tick's final response. Those carry
+    no state hashes, and the header only has what the caller supplies.
+
+    Returns:
+        tuple: (header, ticks) with ticks = {tick: {"commands", "state_hash"}}
+    """
+    if os.path.isdir(path) and os.path.exists(os.path.join(path, "replay.jsonl")):
+        path = os.path.join(path, "replay.jsonl")
+    if os.path.isfile(path):
+        header, ticks = {}, {}
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    break  # truncated tail of a crashed run
+                rec = json.loads(line)
+                if rec.get("kind") == "header":
+                    header = rec
+                else:
+                    ticks[rec["tick"]] = rec
+        return header, ticks
+
+    ticks = {}
+    if glob.glob(os.path.join(path, "episode.jsonl*")):
+        from eval.logger import EpisodeLogReader, DedupPromptReader
+        reader, dedup = EpisodeLogReader(path), None
+        for rec in reader.iter_records():
+            if rec["kind"] == "prompt_ref":
+                dedup = dedup or DedupPromptReader(path)
+                response = dedup._expand(rec)[1]
+            elif rec["kind"] == "prompt":
+                response = rec["response"]
+            else:
+                continue
+            ticks[rec["tick"]] = {"commands": _commands_from_response(response), "state_hash": None}
+    else:
+        for fp in glob.glob(os.path.join(path, "tick_*.jsonl")):
+            with open(fp, "r", encoding="utf-8") as f:
+                lines = [l for l in f if l.strip()]
+            if lines:
+                tick = int(os.path.basename(fp)[5:-6])
+                last = json.loads(lines[-1])
+                ticks[tick] = {"commands": _commands_from_response(last.get("content")), "state_hash": None}
+    if not ticks:
+        raise FileNotFoundError(f"no recording or prompt logs in {path}")
+    return {}, ticks
+
+
+# ---------------------------------------------------------------------------
+# Replay
+# ---------------------------------------------------------------------------
+class ReplayModel(CrisisModel):
+    """
+    CrisisModel driven by a recorded command stream instead of a planner.
+
+    Every step() applies the commands recorded for the current tick and
+    compares the state hash with the recording; mismatching ticks are
+    collected in `divergences`. The model stops after the last recorded tick.
+    """
+
+    def __init__(self, width, height, rng_seed=42, config=None, render=False,
+                 recording=None, verify=True, strict=False):
+        super().__init__(width, height, rng_seed=rng_seed, config=config, render=render)
+        self.replay_ticks = recording or {}
+        self.replay_last = max(self.replay_ticks, default=-1)
+        self.replay_t = 0
+        self.verify = verify
+        self.strict = strict
+        self.divergences = []
+
+    def step(self):
+        t = self.replay_t
+        rec = self.replay_ticks.get(t)
+        if rec is not None:
+            if self.verify and rec.get("state_hash"):
+                h = state_hash(self.summarize_state())
+                if h != rec["state_hash"]:
+                    self.divergences.append(t)
+                    if self.strict:
+                        raise RuntimeError(f"replay diverged from the recording at t={t}")
+            self.set_plan(rec["commands"])
+        super().step()
+        self.replay_t += 1
+        if self.replay_t > self.replay_last:
+            self.running = False
+
+
+def replay_episode(path, map_path=None, seed=None, ticks=None, verify=True, strict=False, render=False):
+    """
+    Re-run a recorded episode without calling any LLM.
+
+    Args:
+        path: replay.jsonl or a run directory
+        map_path, seed: map and seed for older runs whose recording has no header
+        ticks: stop early after this many ticks
+        verify: compare state hashes with the recording
+        strict: raise on the first divergence instead of collecting it
+
+    Returns:
+        tuple: (model, report) with report = {"ticks", "verified", "divergences", "first_divergence"}
+    """
+    from env.mapcache import load_map_config
+    header, recorded = load_recording(path)
+    map_path = header.get("map") or map_path
+    seed = header.get("seed", 42 if seed is None else seed)
+    if not map_path:
+        raise ValueError("recording has no header; pass map_path (and seed)")
+    cfg = load_map_config(map_path)
+
+    seed_globals(seed)
+    model = ReplayModel(cfg.get("width", 20), cfg.get("height", 20), rng_seed=seed, config=cfg,
+                        render=render, recording=recorded, verify=verify, strict=strict)
+    n = ticks if ticks is not None else header.get("ticks", model.replay_last + 1)
+    for _ in range(n):
+        model.step()
+
+    verified = verify and any(r.get("state_hash") for r in recorded.values())
+    return model, {
+        "ticks": n,
+        "verified": verified,
+        "divergences": len(model.divergences),
+        "first_divergence": model.divergences[0] if model.divergences else None,
+    }
@@ -0,0 +1,226 @@
+# eval/store.py
+"""
+Columnar results store for large sweeps.
+
+ingest() picks up new or changed per-run results (results/raw/<run_id>.json)
+and per-tick metrics (logs/strategy=*/run=*/metrics.npz, metrics.jsonl or an
+episode log) and appends them as one partition file per ingest — Parquet when
+pyarrow is installed, otherwise .npz. A manifest of (mtime, size) per source
+file makes re-ingesting a sweep only touch what changed.
+
+    python eval/store.py ingest
+    python eval/store.py aggregate --by map strategy --metrics rescued deaths
+"""
+import argparse, json, os, sys
+from glob import glob
+import numpy as np
+import pandas as pd
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import pyarrow  # noqa: F401  (pandas' Parquet engine)
+    BACKEND = "parquet"
+except ImportError:
+    BACKEND = "npz"
+
+
+def _read_run_ticks(run_dir):
+    """Per-tick metrics of one run as a DataFrame (newest format first)."""
+    npz = os.path.join(run_dir, "metrics.npz")
+    if os.path.exists(npz):
+        from eval.metrics import load_metrics
+        return pd.DataFrame(load_metrics(npz))
+    jsonl = os.path.join(run_dir, "metrics.jsonl")
+    if os.path.exists(jsonl):
+        return pd.read_json(jsonl, lines=True)
+    from eval.logger import EpisodeLogReader
+    rows = [{"tick": rec["tick"], **rec["metrics"]} for rec in EpisodeLogReader(run_dir).iter_records(kind="metrics")]
+    return pd.DataFrame(rows)
+
+
+def _ticks_source(run_dir):
+    for name in ("metrics.npz", "metrics.jsonl", "episode.idx.json"):
+        path = os.path.join(run_dir, name)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+class ResultsStore:
+    """
+    Append-only partitioned tables `runs` (one row per run) and `ticks`
+    (one row per run and tick), plus manifest.json.
+
+    Rows of a run that was re-ingested (its source changed) supersede older
+    partitions: readers keep the last occurrence per run_id (and tick).
+    """
+
+    def __init__(self, root="results/store", backend=None):
+        self.root = root
+        self.backend = backend or BACKEND
+        self.manifest_path = os.path.join(root, "manifest.json")
+        self.manifest = {"version": 1, "parts": 0, "sources": {}}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                self.manifest = json.load(f)
+        self._cache = {}
+
+    # ---- ingest ----
+    def _changed(self, path):
+        st = os.stat(path)
+        sig = [st.st_mtime_ns, st.st_size]
+        return self.manifest["sources"].get(path) != sig, sig
+
+    def ingest(self, raw_dir="results/raw", logdir="logs"):
+        """Ingest new / changed runs. Returns {"runs": n, "ticks": n} rows added."""
+        seen = {}
+        runs = []
+        for path in sorted(glob(os.path.join(raw_dir, "*.json"))):
+            changed, sig = self._changed(path)
+            if changed:
+                with open(path, "r", encoding="utf-8") as f:
+                    runs.append(json.load(f))
+                seen[path] = sig
+
+        ticks = []
+        for run_dir in sorted(glob(os.path.join(logdir, "strategy=*", "run=*"))):
+            path = _ticks_source(run_dir)
+            if path is None:
+                continue
+            changed, sig = self._changed(path)
+            if not changed:
+                continue
+            df = _read_run_ticks(run_dir)
+            if len(df):
+                df["strategy"] = os.path.basename(os.path.dirname(run_dir)).split("=", 1)[1]
+                df["run_id"] = os.path.basename(run_dir).split("=", 1)[1]
+                ticks.append(df)
+            seen[path] = sig
+
+        added = {"runs": len(runs), "ticks": sum(len(df) for df in ticks)}
+        if not seen:
+            return added
+        part = self.manifest["parts"] + 1
+        if runs:
+            self._write_part("runs", part, pd.DataFrame(runs))
+        if ticks:
+            self._write_part("ticks", part, pd.concat(ticks, ignore_index=True))
+        self.manifest["parts"] = part
+        self.manifest["sources"].update(seen)
+        os.makedirs(self.root, exist_ok=True)
+        with open(self.manifest_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f)
+        os.replace(self.manifest_path + ".tmp", self.manifest_path)
+        self._cache.clear()
+        return added
+
+    def _write_part(self, table, part, df):
+        out_dir = os.path.join(self.root, table)
+        os.makedirs(out_dir, exist_ok=True)
+        path = os.path.join(out_dir, f"part-{part:05d}.{self.backend}")
+        if self.backend == "parquet":
+            df.to_parquet(path + ".tmp", index=False)
+        else:
+            cols = {}
+            for c in df.columns:
+                col = df[c]
+                cols[c] = col.to_numpy() if col.dtype.kind in "biuf" else col.fillna("").astype(str).to_numpy(dtype=str)
+            with open(path + ".tmp", "wb") as f:
+                np.savez(f, **cols)
+        os.replace(path + ".tmp", path)
+
+    # ---- read ----
+    def _load(self, table, columns=None):
+        key = (table, tuple(columns) if columns else None)
+        if key in self._cache:
+            return self._cache[key]
+        frames = []
+        for path in sorted(glob(os.path.join(self.root, table, "part-*"))):
+            if path.endswith(".parquet"):
+                cols = columns
+                if columns:
+                    import pyarrow.parquet as pq
+                    names = set(pq.read_schema(path).names)
+                    cols = [c for c in columns if c in names]
+                frames.append(pd.read_parquet(path, columns=cols))
+            elif path.endswith(".npz"):
+                with np.load(path, allow_pickle=False) as z:
+                    names = [c for c in (columns or z.files) if c in z.files]
+                    frames.append(pd.DataFrame({c: z[c] for c in names}))
+        if not frames:
+            df = pd.DataFrame()
+        else:
+            df = pd.concat(frames, ignore_index=True)
+            keys = [k for k in (("run_id", "tick") if table == "ticks" else ("run_id",)) if k in df.columns]
+            if keys:
+                df = df.drop_duplicates(subset=keys, keep="last").reset_index(drop=True)
+        self._cache[key] = df
+        return df
+
+    def runs(self, columns=None):
+        """One row per run (the contents of results/raw/<run_id>.json)."""
+        return self._load("runs", columns)
+
+    def ticks(self, columns=None):
+        """One row per run and tick; pass columns to read less (run_id and tick are always included)."""
+        if columns:
+            columns = list(dict.fromkeys(["run_id", "tick"] + list(columns)))
+        return self._load("ticks", columns)
+
+    # ---- queries ----
+    def aggregate(self, by=("map", "strategy"), metrics=("rescued", "deaths"), confidence=0.95):
+        """
+        Grouped mean, std, n and a t-based confidence interval of the mean per metric.
+
+        Returns:
+            DataFrame indexed by `by` with columns <metric>_mean/_std/_n/_ci_low/_ci_high
+        """
+        by, metrics = list(by), list(metrics)
+        df = self.runs(columns=by + metrics)
+        if df.empty:
+            return df
+        g = df.groupby(by)[metrics]
+        mean, std, n = g.mean(), g.std(ddof=1), g.count()
+        half = _t_crit(confidence, n - 1) * std / np.sqrt(n)
+        out = {}
+        for m in metrics:
+            out[f"{m}_mean"], out[f"{m}_std"], out[f"{m}_n"] = mean[m], std[m], n[m]
+            out[f"{m}_ci_low"], out[f"{m}_ci_high"] = mean[m] - half[m], mean[m] + half[m]
+        return pd.DataFrame(out)
+
+    def curves(self, metric="rescued", by="strategy"):
+        """Per-tick mean of `metric` across runs, one column per value of `by` (index = tick)."""
+        df = self.ticks(columns=[metric, by])
+        if df.empty:
+            return df
+        if by not in df.columns:
+            # run-level attribute such as the map: join it from the runs table
+            df = df.merge(self.runs(columns=["run_id", by]), on="run_id")
+        return df.groupby([by, "tick"])[metric].mean().unstack(0)
+
+
+def _t_crit(confidence, dof):
+    """Two-sided Student-t critical value per group (see eval.adaptive.t_quantile)."""
+    from eval.adaptive import t_quantile
+    return dof.apply(lambda col: col.map(lambda d: t_quantile(0.5 + confidence / 2, d)))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("cmd", choices=["ingest", "aggregate"])
+    ap.add_argument("--store", type=str, default="results/store")
+    ap.add_argument("--raw", type=str, default="results/raw")
+    ap.add_argument("--logs", type=str, default="logs")
+    ap.add_argument("--by", nargs="+", default=["map", "strategy"])
+    ap.add_argument("--metrics", nargs="+", default=["rescued", "deaths"])
+    args = ap.parse_args()
+
+    store = ResultsStore(args.store)
+    added = store.ingest(args.raw, args.logs)
+    print(f"Ingested {added['runs']} run row(s), {added['ticks']} tick row(s) ({store.backend})")
+    if args.cmd == "aggregate":
+        print(store.aggregate(by=args.by, metrics=args.metrics).to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+# eval/tracing.py
+"""
+Per-tick phase tracing and opt-in profiling.
+
+Span timers wrap each phase of an episode (state export, prompt building, the
+LLM call, validation, set_plan, model.step, logging, ...). They always feed
+per-phase totals, which end up in the run metrics as phase_<name>_ms (mean ms
+per tick); with events=True every span is also kept and dump() writes a
+Chrome trace-event file (open in chrome://tracing or https://ui.perfetto.dev).
+Totals are inclusive: a nested span (prompt, llm, validate, tool:<name>,
+step.agents, ...) also counts towards every phase it ran inside, and a name
+used in several phases (validate runs in plan and in memory) sums them all.
+
+    tracer = Tracer(run_id, events=True)
+    with tracer:                        # active for span() calls anywhere, any thread (start() / stop())
+        with span("step", tick=t):
+            model.step()
+    tracer.dump("logs/.../trace.json")
+    tracer.phase_metrics(ticks)         # {"phase_step_ms": ...}
+
+Without an active tracer span() returns a shared no-op, so instrumented code
+costs one global lookup.
+"""
+import functools, json, logging, os, sys, threading, time
+
+logger = logging.getLogger(__name__)
+
+_active = None      # the started Tracer, if any
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "args", "start")
+
+    def __init__(self, tracer, name, args):
+        self.tracer, self.name, self.args = tracer, name, args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer._add(self.name, self.start, time.perf_counter_ns(), self.args)
+        return False
+
+
+def span(name, **args):
+    """Timer for one phase, recorded by the active tracer (no-op when none is active)."""
+    tracer = _active
+    return NULL_SPAN if tracer is None else _Span(tracer, name, args)
+
+
+def traced(name):
+    """Decorator: run the function inside span(name)."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*a, **kw):
+            with span(name):
+                return fn(*a, **kw)
+        return inner
+    return wrap
+
+
+class Tracer:
+    """
+    Collects spans of one run.
+
+    Args:
+        run_id: label for the trace file
+        events: keep every span for dump() (otherwise only per-phase totals)
+        max_events: cap on kept spans (totals keep counting past it)
+    """
+
+    def __init__(self, run_id="run", events=False, max_events=2_000_000):
+        self.run_id = run_id
+        self.totals = {}        # name -> [total ns, count]
+        self.events = [] if events else None
+        self.max_events = max_events
+        self._lock = threading.Lock()
+        self._t0 = time.perf_counter_ns()
+        self._outer = None
+        self._undo = []
+        self.unhooked = []      # model phases instrument_model() found nothing to wrap for
+
+    def start(self):
+        """Make this the active tracer (one per process: spans from every thread go to it)."""
+        global _active
+        self._outer, _active = _active, self
+        return self
+
+    def stop(self):
+        """Deactivate and undo every wrap()."""
+        global _active
+        _active = self._outer
+        for undo in reversed(self._undo):
+            undo()
+        self._undo.clear()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    def span(self, name, **args):
+        return _Span(self, name, args)
+
+    def _add(self, name, start, end, args):
+        with self._lock:
+            tot = self.totals.get(name)
+            if tot is None:
+                self.totals[name] = [end - start, 1]
+            else:
+                tot[0] += end - start
+                tot[1] += 1
+            if self.events is not None and len(self.events) < self.max_events:
+                self.events.append({"name": name, "ph": "X", "ts": (start - self._t0) / 1000.0,
+                                    "dur": (end - start) / 1000.0, "pid": os.getpid(),
+                                    "tid": threading.get_ident(), "args": args})
+
+    # ---- instrumenting code we do not own ----
+    def wrap(self, owner, attr, name):
+        """
+        Replace owner.attr (owner: a class or module) by a spanned version until
+        stop(). Patching classes rather than instances keeps models picklable
+        for checkpoints. False if there is no such callable.
+        """
+        fn = getattr(owner, attr, None)
+        if not callable(fn):
+            return False
+        own = attr in vars(owner)
+        original = vars(owner)[attr] if own else None
+
+        @functools.wraps(fn)
+        def inner(*a, **kw):
+            with span(name):
+                return fn(*a, **kw)
+
+        setattr(owner, attr, inner)
+        self._undo.append(lambda: setattr(owner, attr, original) if own else delattr(owner, attr))
+        return True
+
+    def instrument_model(self, model):
+        """
+        Spans inside CrisisModel.step where the pieces can be found: the agent
+        schedule (agent actions), the world-dynamics functions as env.world
+        sees them (fire spread, aftershocks) and a hospital service method.
+        Returns the names of the phases hooked; the others are logged and kept
+        in `unhooked` (and in the trace file), so a missing phase_step_* metric
+        reads as "not measured", not as zero cost.
+        """
+        hooked = []
+        schedule = getattr(model, "schedule", None)
+        if schedule is not None and self.wrap(type(schedule), "step", "step.agents"):
+            hooked.append("step.agents")
+        world = sys.modules.get(type(model).__module__)
+        for attr, name in (("spread_fires", "step.fires"), ("trigger_aftershocks", "step.aftershocks")):
+            if world is not None and self.wrap(world, attr, name):
+                hooked.append(name)
+        for attr in ("process_hospitals", "_process_hospitals", "serve_hospitals", "_serve_hospitals",
+                     "update_hospitals", "_update_hospitals", "hospital_step"):
+            if self.wrap(type(model), attr, "step.hospitals"):
+                hooked.append("step.hospitals")
+                break
+        self.unhooked = [name for name in ("step.agents", "step.fires", "step.aftershocks", "step.hospitals")
+                         if name not in hooked]
+        if self.unhooked:
+            logger.info(f"tracing: no hook for {', '.join(self.unhooked)} on {type(model).__name__} (not measured)")
+        return hooked
+
+    # ---- output ----
+    def phase_metrics(self, ticks):
+        """{"phase_<name>_ms": mean ms per tick} for every phase seen (dots in names become underscores)."""
+        ticks = max(1, int(ticks))
+        return {f"phase_{name.replace('.', '_').replace(':', '_')}_ms": round(tot[0] / 1e6 / ticks, 4)
+                for name, tot in sorted(self.totals.items())}
+
+    def dump(self, path):
+        """Write the kept spans as Chrome trace-event JSON. Returns the path."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": self.events or [], "displayTimeUnit": "ms",
+                       "otherData": {"run_id": self.run_id, "unhooked": self.unhooked}}, f)
+        return path
+
+
+# ---------------------------------------------------------------------------
+# Profiling
+# ---------------------------------------------------------------------------
+PROFILERS = ["cprofile", "sampling"]
+
+
+def profile_call(fn, out_base, mode="cprofile"):
+    """
+    Run fn() under a profiler and save its stats next to `out_base`.
+
+    cprofile: <out_base>.prof (pstats / snakeviz) plus <out_base>.txt, the top
+    functions by cumulative time. sampling: pyinstrument when installed
+    (<out_base>.html and .txt); lower overhead, no per-call counts.
+
+    Returns:
+        fn()'s return value
+    """
+    os.makedirs(os.path.dirname(out_base) or ".", exist_ok=True)
+    if mode == "sampling":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            raise SystemExit("--profile sampling needs pyinstrument (pip install pyinstrument)")
+        prof = Profiler()
+        prof.start()
+        try:
+            return fn()
+        finally:
+            prof.stop()
+            with open(out_base + ".html", "w", encoding="utf-8") as f:
+                f.write(prof.output_html())
+            with open(out_base + ".txt", "w", encoding="utf-8") as f:
+                f.write(prof.output_text())
+
+    import cProfile, io, pstats
+    prof = cProfile.Profile()
+    try:
+        return prof.runcall(fn)
+    finally:
+        prof.dump_stats(out_base + ".prof")
+        buf = io.StringIO()
+        pstats.Stats(prof, stream=buf).sort_stats("cumulative").print_stats(40)
+        with open(out_base + ".txt", "w", encoding="utf-8") as f:
+            f.write(buf.getvalue())
@@ -0,0 +1,255 @@
+# eval/workqueue.py
+"""
+Harness work queue on a shared SQLite file — no broker needed.
+
+A coordinator enqueues run specs; workers on any machine that can reach the
+file lease one job at a time, keep the lease alive with heartbeats while the
+episode runs, and commit the metrics in the same transaction that marks the
+job done. Leases whose heartbeat stopped (crashed / killed worker) are put
+back in the queue by the next worker that looks for work.
+
+    python eval/harness.py --maps configs/map_small.yaml --strategies react cot --queue results/queue.db
+    python eval/workqueue.py worker --db results/queue.db      # start as many as you like, anywhere
+    python eval/workqueue.py status --db results/queue.db
+    python eval/workqueue.py export --db results/queue.db      # -> results/agg/summary.csv
+
+The file uses SQLite's rollback journal (journal_mode=DELETE), which works on
+network filesystems as long as their locking does. WAL is faster but needs
+shared memory, so all processes must run on one host: set
+CRISIS_QUEUE_JOURNAL=wal in every process that opens the queue for
+single-host use only.
+"""
+import argparse, json, os, socket, sqlite3, sys, threading, time, uuid
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    seq         INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id      TEXT UNIQUE NOT NULL,
+    spec        TEXT NOT NULL,
+    opts        TEXT NOT NULL,
+    status      TEXT NOT NULL DEFAULT 'queued',   -- queued | leased | done | failed
+    worker      TEXT,
+    lease_until REAL,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    metrics     TEXT,
+    error       TEXT,
+    updated     REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, seq);
+"""
+
+
+class WorkQueue:
+    """
+    SQLite-backed job queue.
+
+    Every state change is a single IMMEDIATE transaction, so concurrent
+    workers (threads, processes or hosts sharing the file) never lease the
+    same job twice. One connection per thread.
+
+    Args:
+        journal_mode: "delete" (default, safe for workers on several hosts) or
+            "wal" (single host only); default from CRISIS_QUEUE_JOURNAL
+    """
+
+    def __init__(self, path, lease_seconds=300, max_attempts=3, journal_mode=None):
+        self.path = path
+        self.journal_mode = (journal_mode or os.environ.get("CRISIS_QUEUE_JOURNAL", "delete")).upper()
+        if self.journal_mode not in ("DELETE", "WAL"):
+            raise ValueError(f"journal_mode must be delete or wal, not {self.journal_mode.lower()}")
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db.executescript(SCHEMA)
+
+    @property
+    def db(self):
+        if getattr(self._local, "db", None) is None:
+            db = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            db.execute(f"PRAGMA journal_mode={self.journal_mode}")
+            db.execute("PRAGMA busy_timeout=60000")
+            self._local.db = db
+        return self._local.db
+
+    def _tx(self):
+        queue = self
+
+        class _Tx:
+            def __enter__(self):
+                queue.db.execute("BEGIN IMMEDIATE")
+                return queue.db
+
+            def __exit__(self, exc_type, *_):
+                queue.db.execute("ROLLBACK" if exc_type else "COMMIT")
+
+        return _Tx()
+
+    # ---- coordinator ----
+    def enqueue(self, specs, opts):
+        """Add run specs (skipping run_ids already in the queue). Returns the number added."""
+        now = time.time()
+        with self._tx() as db:
+            before = db.total_changes
+            db.executemany(
+                "INSERT OR IGNORE INTO jobs (run_id, spec, opts, updated) VALUES (?, ?, ?, ?)",
+                [(s["run_id"], json.dumps(s), json.dumps(opts), now) for s in specs])
+            return db.total_changes - before
+
+    def requeue_stale(self, db=None):
+        """Return expired leases to the queue (or fail them after max_attempts)."""
+        now = time.time()
+
+        def run(db):
+            db.execute("UPDATE jobs SET status='failed', error='lease expired', updated=? "
+                       "WHERE status='leased' AND lease_until < ? AND attempts >= ?", (now, now, self.max_attempts))
+            return db.execute("UPDATE jobs SET status='queued', worker=NULL, updated=? "
+                              "WHERE status='leased' AND lease_until < ?", (now, now)).rowcount
+
+        if db is not None:
+            return run(db)
+        with self._tx() as db:
+            return run(db)
+
+    # ---- worker ----
+    def lease(self, worker):
+        """Lease the oldest queued job. Returns (run_id, spec, opts) or None if nothing is queued."""
+        now = time.time()
+        with self._tx() as db:
+            self.requeue_stale(db)
+            row = db.execute("SELECT run_id, spec, opts FROM jobs WHERE status='queued' ORDER BY seq LIMIT 1").fetchone()
+            if row is None:
+                return None
+            db.execute("UPDATE jobs SET status='leased', worker=?, lease_until=?, attempts=attempts+1, updated=? "
+                       "WHERE run_id=?", (worker, now + self.lease_seconds, now, row[0]))
+        return row[0], json.loads(row[1]), json.loads(row[2])
+
+    def heartbeat(self, run_id, worker):
+        """Extend the lease. Returns False if the job was taken away from this worker."""
+        now = time.time()
+        with self._tx() as db:
+            return db.execute("UPDATE jobs SET lease_until=?, updated=? WHERE run_id=? AND worker=? AND status='leased'",
+                              (now + self.lease_seconds, now, run_id, worker)).rowcount == 1
+
+    def complete(self, run_id, worker, metrics):
+        """Commit the metrics and mark the job done. Returns False if the lease was lost meanwhile."""
+        with self._tx() as db:
+            return db.execute("UPDATE jobs SET status='done', metrics=?, error=NULL, updated=? "
+                              "WHERE run_id=? AND worker=? AND status='leased'",
+                              (json.dumps(metrics), time.time(), run_id, worker)).rowcount == 1
+
+    def fail(self, run_id, worker, error):
+        """Put the job back in the queue, or mark it failed once it used up max_attempts."""
+        with self._tx() as db:
+            db.execute("UPDATE jobs SET status=CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END, "
+                       "worker=NULL, error=?, updated=? WHERE run_id=? AND worker=? AND status='leased'",
+                       (self.max_attempts, str(error), time.time(), run_id, worker))
+
+    # ---- inspection ----
+    def counts(self):
+        rows = self.db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: n for status, n in rows}
+
+    def results(self):
+        """Metrics of finished jobs in enqueue order."""
+        rows = self.db.execute("SELECT metrics FROM jobs WHERE status='done' ORDER BY seq").fetchall()
+        return [json.loads(m) for (m,) in rows]
+
+
+def run_worker(db_path, worker=None, lease_seconds=300, heartbeat_seconds=30, max_attempts=3, wait=False, poll=5.0):
+    """
+    Lease and run jobs until the queue is drained (or forever with wait=True).
+
+    Returns:
+        int: number of jobs this worker completed
+    """
+    from eval.harness import execute_run
+    queue = WorkQueue(db_path, lease_seconds=lease_seconds, max_attempts=max_attempts)
+    worker = worker or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+    done = 0
+    while True:
+        job = queue.lease(worker)
+        if job is None:
+            counts = queue.counts()
+            if not wait and not counts.get("leased"):
+                return done
+            time.sleep(poll)   # others still running: their leases may expire and come back
+            continue
+
+        run_id, spec, opts = job
+        # the job's provider for this job only: the next job without one gets the worker's own again
+        provider = os.environ.get("LLM_PROVIDER")
+        if opts.get("provider"):
+            os.environ["LLM_PROVIDER"] = opts["provider"]
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(heartbeat_seconds):
+                if not queue.heartbeat(run_id, worker):
+                    print(f"[{worker}] lost lease on {run_id}", flush=True)
+                    return
+
+        hb = threading.Thread(target=beat, name="heartbeat", daemon=True)
+        hb.start()
+        t0 = time.perf_counter()
+        try:
+            metrics = execute_run(spec, opts)
+        except Exception as e:
+            stop.set()
+            queue.fail(run_id, worker, e)
+            print(f"[{worker}] {run_id} FAILED ({e})", flush=True)
+            continue
+        finally:
+            stop.set()
+            hb.join()
+            if provider is None:
+                os.environ.pop("LLM_PROVIDER", None)
+            else:
+                os.environ["LLM_PROVIDER"] = provider
+        if queue.complete(run_id, worker, metrics):
+            done += 1
+            print(f"[{worker}] {run_id} done in {time.perf_counter() - t0:.1f}s", flush=True)
+        else:
+            print(f"[{worker}] {run_id} finished after its lease was lost; result discarded", flush=True)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    w = sub.add_parser("worker", help="Lease and run jobs until the queue is empty")
+    w.add_argument("--db", type=str, required=True)
+    w.add_argument("--worker-id", type=str, default=None)
+    w.add_argument("--lease", type=int, default=300, help="Lease length in seconds (renewed by heartbeats)")
+    w.add_argument("--heartbeat", type=int, default=30, help="Seconds between heartbeats")
+    w.add_argument("--max-attempts", type=int, default=3)
+    w.add_argument("--wait", action="store_true", help="Keep polling for new jobs instead of exiting when drained")
+
+    s = sub.add_parser("status", help="Job counts per status")
+    s.add_argument("--db", type=str, required=True)
+
+    e = sub.add_parser("export", help="Write finished runs to summary.csv (enqueue order)")
+    e.add_argument("--db", type=str, required=True)
+    e.add_argument("--out", type=str, default="results/agg/summary.csv")
+
+    args = ap.parse_args()
+    if args.cmd == "worker":
+        n = run_worker(args.db, worker=args.worker_id, lease_seconds=args.lease, heartbeat_seconds=args.heartbeat,
+                       max_attempts=args.max_attempts, wait=args.wait)
+        print(f"Worker finished {n} job(s).")
+    elif args.cmd == "status":
+        queue = WorkQueue(args.db)
+        print(json.dumps(queue.counts(), indent=2))
+        for run_id, error in queue.db.execute("SELECT run_id, error FROM jobs WHERE status='failed' ORDER BY seq"):
+            print(f"failed: {run_id}: {error}")
+    elif args.cmd == "export":
+        from eval.harness import write_summary
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        rows = WorkQueue(args.db).results()
+        write_summary(args.out, rows)
+        print(f"Wrote {len(rows)} row(s) to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
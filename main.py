@@ -1,17 +1,46 @@
-import argparse, os, json, yaml
+import argparse, os, json, sys, time
 from pathlib import Path
-from env.world import CrisisModel
-from reasoning.planner import make_plan, make_plan_with_logging
-from eval.logger import log_metrics_snapshot, log_prompt_response   # 🔹 NEW IMPORT
+from eval.tracing import Tracer, PROFILERS, profile_call
+
+# Mesa, numpy, yaml, jsonschema and the reasoning package are imported inside
+# the functions that use them: `python main.py --help` and `import main` (the
+# harness, run_groq.py / run_ollama.py) stay cheap, and only the code paths a
+# run takes pay for their imports.
 
 
 def load_config(path):
-    with open(path, "r") as f:
-        return yaml.safe_load(f) or {}
+    # compiled on first use, memory-mapped afterwards (env/mapcache.py)
+    from env.mapcache import load_map_config
+    return load_map_config(path)
+
+
+def model_counters(model):
+    """Cumulative episode counters read straight off the model (eval.metrics.COUNTER_FIELDS)."""
+    from eval.metrics import COUNTER_FIELDS
+    return {name: getattr(model, name) for name in COUNTER_FIELDS}
 
 
 def run_episode(map_path, seed=42, ticks=200, provider="mock", strategy="react_reflexion",
-                run_id=None, log_path=None, render=False):
+                run_id=None, log_path=None, render=False,
+                memory_path=None, memory_k=5, memory_tokens=200, context_tokens=None,
+                shards=None, shard_by="spatial",
+                async_plan=False, max_staleness=5, fallback="heuristic", tools=False,
+                log_format="dir", log_compression=None,
+                checkpoint_every=None, checkpoint_dir=None, resume=False, metrics_window=None, trace=False):
+    from env.world import CrisisModel
+    from env.checkpoint import Checkpointer
+    from env.spatial import WorldIndex
+    from reasoning.planner import make_plan_with_logging, make_sharded_plan_with_logging, make_plan_with_tools
+    from reasoning.memory import ReflexionMemory
+    from reasoning.context import build_budgeted_context
+    from reasoning.utils import count_tokens
+    from reasoning.state import TickState
+    from eval.replay import ReplayRecorder, state_hash, seed_globals
+    from eval.metrics import MetricsRecorder
+    from eval.logger import log_prompt_response, EpisodeLogWriter, DedupPromptLog, trim_run_logs
+
+    if tools and (shards or async_plan):
+        raise ValueError("tools runs its own tool-calling loop; it cannot be combined with shards or async_plan")
     if run_id is None:
         run_id = f"{Path(map_path).stem}_{strategy}_seed{seed}"
 
@@ -20,72 +49,344 @@ def run_episode(map_path, seed=42, ticks=200, provider="mock", strategy="react_r
     W = cfg.get("width", 20)
     H = cfg.get("height", 20)
 
+    seed_globals(seed)   # recordings must replay bit-for-bit
     model = CrisisModel(W, H, rng_seed=seed, config=cfg, render=render)
 
+    run_id = f"{Path(map_path).stem}_{strategy}_seed{seed}"   # 🔹 used for per-run logs
+
+    # Checkpoints: model + planner state every N ticks; resume continues after the newest one
+    ckpt, start, resumed = None, 0, None
+    if checkpoint_every or resume:
+        ckpt = Checkpointer(checkpoint_dir or f"results/checkpoints/{run_id}", every=checkpoint_every)
+    if resume:
+        loaded = ckpt.load_latest()
+        if loaded is not None:
+            model, last_t, resumed = loaded
+            start = last_t + 1
+
     if log_path is None:
         log_path = f"logs/seed_{seed}_{Path(map_path).stem}_{provider}_{strategy}.txt"
     os.makedirs(Path(log_path).parent, exist_ok=True)
-    logf = open(log_path, "w", buffering=1, encoding="utf-8")
+    logf = open(log_path, "a" if resumed else "w", buffering=1, encoding="utf-8")
+    if resumed:
+        logf.write(f"=== resumed after t={start - 1} ===\n")
+        if log_format == "dir":
+            trim_run_logs(strategy, run_id, start - 1)
 
-    run_id = f"{Path(map_path).stem}_{strategy}_seed{seed}"   # 🔹 used for per-run logs
+    # "episode": one buffered (optionally compressed) file per run instead of a file per tick
+    # "dedup": same file, but message bodies stored once by hash and contexts as deltas
+    episode_log = prompt_log = None
+    if log_format in ("episode", "dedup"):
+        episode_log = prompt_log = EpisodeLogWriter(strategy, run_id, compression=log_compression, background=True,
+                                                    resume_after=start - 1 if resumed else None)
+        if log_format == "dedup":
+            prompt_log = DedupPromptLog(episode_log)
 
-    transcript = []
-    for t in range(ticks):
-        state = model.summarize_state()
-        plan, messages, response_text = make_plan_with_logging(state, strategy=strategy, scratchpad="\n".join(transcript[-10:]))
-        cmds = plan.get("commands", [])
-        model.set_plan(cmds)
-
-        # Log conversation for this tick
-        log_prompt_response(strategy, run_id, t, messages, response_text)
-
-        logf.write(f"=== t={t} ===\n")
-        logf.write(json.dumps({"context": state, "plan": plan})[:2000] + "\n")
-        transcript.append(f"t={t}: plan={plan}")
-
-        # --- advance environment
-        model.step()
-
-        # --- snapshot per-tick metrics for time-series plots
-        current_metrics = {
-            "rescued": model.rescued,
-            "deaths": model.deaths,
-            "fires_extinguished": model.fires_extinguished,
-            "roads_cleared": model.roads_cleared,
-            "energy_used": model.energy_used,
-            "tool_calls": model.tool_calls,
-            "invalid_json": model.invalid_json,
-            "replans": model.replans,
-            "hospital_overflow_events": model.hospital_overflow_events,
-            "battery_recharges": getattr(model, "battery_recharges", 0),
-        }
-        log_metrics_snapshot(strategy, run_id, t, current_metrics)
+    # command stream + state hashes for replay without LLM calls
+    recorder = ReplayRecorder(os.path.join("logs", f"strategy={strategy}", f"run={run_id}"),
+                              {"map": str(map_path), "seed": seed, "ticks": ticks, "strategy": strategy,
+                               "provider": provider, "run_id": run_id},
+                              resume_after=start - 1 if resumed else None)
+
+    # Reflexion memory is shared by every seed of a map, so lessons carry over between episodes
+    if memory_path is None:
+        memory_path = f"results/memory/{Path(map_path).stem}.json"
+    memory = ReflexionMemory(memory_path)
+    prev = None  # (tick, state, plan, raw response texts, deaths before step)
+    # per-tick metrics: preallocated columns, dumped once at the end (ring buffer when metrics_window is set)
+    metrics_rec = MetricsRecorder(metrics_window or ticks, ring=metrics_window is not None)
+
+    # Non-blocking mode: the LLM plans in the background while a fallback policy keeps the sim moving
+    pipeline = None
+    if async_plan:
+        from reasoning.pipeline import PlanPipeline
+        pipeline = PlanPipeline(strategy=strategy, max_staleness=max_staleness, fallback=fallback,
+                                shards=shards, shard_by=shard_by, shard_tokens=context_tokens or 1500)
+
+    if resumed:
+        prev = resumed["prev"]
+        metrics_rec = resumed["metrics"]
+        memory.restore(resumed["memory"])
+        if pipeline is not None:
+            pipeline.last_plan, pipeline.last_plan_tick = resumed["last_plan"], resumed["last_plan_tick"]
+
+    world_index = getattr(model, "world_index", None)    # restored with a resumed model
 
+    # phase timers (always on, totals only); --trace also keeps every span for trace.json
+    tracer = Tracer(run_id, events=trace).start()
+    try:
+        tracer.instrument_model(model)
+        span = tracer.span
+
+        for t in range(start, ticks):
+            with span("state_export", tick=t):
+                state = model.summarize_state()
+                # model.world_index: the counters StatsPanel shows, without a scan of the schedule
+                if world_index is None:
+                    world_index = model.world_index = WorldIndex.from_state(state)
+                else:
+                    world_index.sync(state, {p: len(q) for p, q in getattr(model, "hospital_queues", {}).items()})
+            with span("memory", tick=t):
+                if prev is not None:
+                    p_t, p_state, p_plan, p_text, p_deaths = prev
+                    memory.observe(p_t, p_state, p_plan, p_text, next_state=state, deaths_delta=model.deaths - p_deaths)
+                scratchpad = memory.render(state, k=memory_k, max_tokens=memory_tokens)
+
+            with span("context", tick=t):
+                context = state if context_tokens is None else build_budgeted_context(state, max_tokens=context_tokens)
+                # serialize the prompt context once; prompt building, the mock, the cache and the logs reuse it
+                tick_state = TickState(context, tick=t)
+            with span("plan", tick=t):
+                t0 = time.perf_counter()
+                shard_stats, tool_stats, pipe_info, plan_tick = [], [], None, t
+                response_texts = None   # per-call raw outputs when response_text joins several (shards)
+                if pipeline is not None:
+                    cmds, pipe_info, arrived = pipeline.step(t, state, context=tick_state, scratchpad=scratchpad)
+                    plan = {"commands": cmds}
+                    messages, response_text, response_texts = [], None, None
+                    if arrived is not None:
+                        messages, response_text, plan_tick = arrived["messages"], arrived["response_text"], arrived["tick"]
+                        response_texts = arrived["response_texts"]
+                elif tools:
+                    plan, messages, response_text, tool_stats = make_plan_with_tools(
+                        tick_state, model, t, strategy=strategy, scratchpad=scratchpad)
+                elif shards:
+                    plan, messages, response_text, shard_stats, response_texts = make_sharded_plan_with_logging(
+                        context, strategy=strategy, scratchpad=scratchpad, shards=shards, by=shard_by,
+                        shard_tokens=context_tokens or 1500)
+                else:
+                    plan, messages, response_text = make_plan_with_logging(tick_state, strategy=strategy, scratchpad=scratchpad)
+                plan_latency_ms = (time.perf_counter() - t0) * 1000.0
+            prompt_tokens = sum(count_tokens(m["content"]) for m in messages)
+            cmds = plan.get("commands", [])
+            with span("set_plan", tick=t):
+                model.set_plan(cmds)
+
+            with span("log", tick=t):
+                recorder.record(t, cmds, tick_state.hash if context is state else state_hash(state))
+
+                # Log conversation for this tick (in async mode: for the tick the arriving plan was made on)
+                if messages:
+                    if prompt_log is not None:
+                        prompt_log.log_prompt_response(plan_tick, messages, response_text)
+                    else:
+                        log_prompt_response(strategy, run_id, plan_tick, messages, response_text)
+
+                logf.write(f"=== t={t} ===\n")
+                logf.write(('{"context": ' + tick_state.text + ', "plan": ' + json.dumps(plan) + "}")[:2000] + "\n")
+                if shard_stats:
+                    logf.write(json.dumps({"shards": shard_stats}) + "\n")
+                if tool_stats:
+                    logf.write(json.dumps({"tools": tool_stats}) + "\n")
+                if pipe_info:
+                    logf.write(json.dumps({"pipeline": pipe_info}) + "\n")
+            prev = (t, state, plan, response_text if response_texts is None else response_texts, model.deaths)
+
+            # --- advance environment
+            with span("step", tick=t):
+                model.step()
+
+            # --- snapshot per-tick metrics for time-series plots
+            with span("metrics", tick=t):
+                metrics_rec.record_model(
+                    t, model,
+                    prompt_tokens=prompt_tokens,
+                    plan_latency_ms=plan_latency_ms,
+                    shard_latency_max_ms=max((st["latency_ms"] for st in shard_stats), default=0),
+                    tool_latency_ms=sum(st["latency_ms"] for st in tool_stats),
+                    plan_lag=pipe_info["plan_lag"] if pipe_info else 0,
+                    plan_source=pipe_info["source"] if pipe_info else "llm",
+                )
+
+            if ckpt is not None:
+                with span("checkpoint", tick=t):
+                    ckpt.maybe_save(t, model, extra={
+                        "prev": prev,
+                        "metrics": metrics_rec,
+                        "memory": memory.snapshot(),
+                        "last_plan": pipeline.last_plan if pipeline is not None else [],
+                        "last_plan_tick": pipeline.last_plan_tick if pipeline is not None else None,
+                    })
+
+    finally:
+        # also on errors: harness / work-queue processes run more episodes after this one
+        tracer.stop()
+    run_dir = os.path.join("logs", f"strategy={strategy}", f"run={run_id}")
+    if trace:
+        tracer.dump(os.path.join(run_dir, "trace.json"))
     logf.close()
+    recorder.close()
+    metrics_rec.dump(run_dir)
+    if episode_log is not None:
+        episode_log.close()
+        if prompt_log is not episode_log:
+            prompt_log.close()
+    if pipeline is not None:
+        pipeline.close()
 
-    # --- end-of-run metrics (summary)
-    hist = model.datacollector.get_model_vars_dataframe()
-    rescued = int(hist["rescued"].max() if len(hist) else 0)
-    deaths = int(hist["deaths"].max() if len(hist) else 0)
-    fires_ext = int(hist["fires_extinguished"].max() if len(hist) else 0)
-    roads_cleared = int(hist["roads_cleared"].max() if len(hist) else 0)
+    if prev is not None:
+        p_t, p_state, p_plan, p_text, p_deaths = prev
+        memory.observe(p_t, p_state, p_plan, p_text, next_state=model.summarize_state(),
+                       deaths_delta=model.deaths - p_deaths)
+    memory.save()
 
+    # --- end-of-run metrics (summary)
     metrics = {
-        "rescued": model.rescued,
-        "deaths": model.deaths,
+        **model_counters(model),
         "avg_rescue_time": model.avg_rescue_time,
-        "fires_extinguished": model.fires_extinguished,
-        "roads_cleared": model.roads_cleared,
-        "energy_used": model.energy_used,
-        "tool_calls": model.tool_calls,
-        "invalid_json": model.invalid_json,
-        "replans": model.replans,
-        "hospital_overflow_events": model.hospital_overflow_events,
-        "battery_recharges": getattr(model, "battery_recharges", 0),
+        "map_cells": W * H,
+        "avg_prompt_tokens": metrics_rec.mean("prompt_tokens"),
+        "avg_plan_latency_ms": metrics_rec.mean("plan_latency_ms"),
+        "p95_plan_latency_ms": metrics_rec.percentile("plan_latency_ms", 95),
+        **tracer.phase_metrics(ticks - start),
     }
     return metrics
 
 
+class LeanEpisode:
+    """
+    run_lean_episode() in pieces: observe() the tick's state, plan it with
+    `self.policy`, advance() with the commands, finish() at the end. Lets a
+    driver advance several episodes in lockstep (eval/lockstep.py).
+
+    Phase timers go to self.tracer; run_lean_episode also start()s it so the
+    spans inside the planner and model.step land there (lockstep does not:
+    one active tracer per process).
+    """
+
+    def __init__(self, map_path, seed=42, ticks=200, policy="heuristic", strategy="react",
+                 provider="mock", run_id=None, log_level="metrics", context_tokens=None, trace=False):
+        if log_level not in ("none", "metrics", "full"):
+            raise ValueError(f"Unknown log level: {log_level}")
+        from env.world import CrisisModel
+        from reasoning.policy import make_policy
+        from eval.replay import ReplayRecorder, seed_globals
+        from eval.metrics import MetricsRecorder
+        from eval.logger import EpisodeLogWriter
+        label = strategy if policy == "llm" else policy
+        if run_id is None:
+            run_id = f"{Path(map_path).stem}_{label}_seed{seed}"
+        self.run_id, self.seed, self.ticks, self.tick = run_id, seed, ticks, 0
+
+        cfg = load_config(map_path)
+        self.W = cfg.get("width", 20)
+        self.H = cfg.get("height", 20)
+        seed_globals(seed)
+        self.model = CrisisModel(self.W, self.H, rng_seed=seed, config=cfg, render=False)
+
+        if policy == "llm":
+            os.environ["LLM_PROVIDER"] = provider
+            self.policy = make_policy("llm", strategy=strategy, context_tokens=context_tokens)
+        else:
+            self.policy = make_policy(policy)
+        self.policy.reset(seed)
+
+        self.run_dir = os.path.join("logs", f"strategy={label}", f"run={run_id}")
+        self.episode_log = self.recorder = None
+        if log_level != "none":
+            self.recorder = ReplayRecorder(self.run_dir, {"map": str(map_path), "seed": seed, "ticks": ticks,
+                                                          "strategy": label, "provider": provider, "run_id": run_id})
+        if log_level == "full":
+            self.episode_log = EpisodeLogWriter(label, run_id, flush_records=1024)
+
+        self.metrics_rec = MetricsRecorder(ticks)
+        self.source = "llm" if policy == "llm" else "heuristic"
+        self.state = None
+        self.trace = trace
+        self.tracer = Tracer(run_id, events=trace)
+
+    @property
+    def done(self):
+        return self.tick >= self.ticks
+
+    def observe(self):
+        """summarize_state() of the current tick (also kept as self.state)."""
+        with self.tracer.span("state_export", tick=self.tick):
+            self.state = self.model.summarize_state()
+        return self.state
+
+    def plan(self):
+        """Run the policy on self.state. Returns (commands, latency in ms)."""
+        with self.tracer.span("plan", tick=self.tick):
+            t0 = time.perf_counter()
+            cmds = self.policy.observe(self.tick, self.state)
+        return cmds, (time.perf_counter() - t0) * 1000.0
+
+    def advance(self, cmds, plan_latency_ms=0.0):
+        """Apply the plan of the current tick, step the model and record the tick."""
+        from reasoning.utils import count_tokens
+        from eval.replay import state_hash
+        t, span = self.tick, self.tracer.span
+        with span("set_plan", tick=t):
+            self.model.set_plan(cmds)
+
+        prompt_tokens = 0
+        with span("log", tick=t):
+            if self.recorder is not None:
+                self.recorder.record(t, cmds, state_hash(self.state))
+            messages = getattr(self.policy, "messages", None)
+            if messages:
+                prompt_tokens = sum(count_tokens(m["content"]) for m in messages)
+                if self.episode_log is not None:
+                    self.episode_log.log_prompt_response(t, messages, self.policy.response_text)
+
+        with span("step", tick=t):
+            self.model.step()
+        with span("metrics", tick=t):
+            self.metrics_rec.record_model(t, self.model, prompt_tokens=prompt_tokens,
+                                          plan_latency_ms=plan_latency_ms, plan_source=self.source)
+        self.tick += 1
+
+    def finish(self):
+        """Close the policy and logs. Returns the end-of-run metrics (same keys as run_episode)."""
+        self.policy.close()
+        if self.trace:
+            self.tracer.dump(os.path.join(self.run_dir, "trace.json"))
+        if self.recorder is not None:
+            self.recorder.close()
+            self.metrics_rec.dump(self.run_dir)
+        if self.episode_log is not None:
+            self.episode_log.close()
+
+        model, rec = self.model, self.metrics_rec
+        return {
+            **model_counters(model),
+            "avg_rescue_time": model.avg_rescue_time,
+            "map_cells": self.W * self.H,
+            "avg_prompt_tokens": rec.mean("prompt_tokens"),
+            "avg_plan_latency_ms": rec.mean("plan_latency_ms"),
+            "p95_plan_latency_ms": rec.percentile("plan_latency_ms", 95),
+            **self.tracer.phase_metrics(self.tick),
+        }
+
+
+def run_lean_episode(map_path, seed=42, ticks=200, policy="heuristic", strategy="react",
+                     provider="mock", run_id=None, log_level="metrics", context_tokens=None, trace=False):
+    """
+    Policy-driven episode loop without the per-tick extras of run_episode
+    (no reflexion memory, no .txt log, no per-tick files).
+
+    Args:
+        policy: "heuristic" / "numpy" (no LLM at all) or "llm" (prompt strategy `strategy`)
+        log_level: "none" writes nothing; "metrics" dumps the per-tick metrics
+            table (metrics.npz) and the replay recording at the end; "full"
+            also logs prompts and responses to one buffered episode log
+            (LLM policy only)
+        trace: also write every phase span to <run dir>/trace.json (Chrome trace format)
+
+    Returns:
+        dict of end-of-run metrics (same keys as run_episode)
+    """
+    ep = LeanEpisode(map_path, seed=seed, ticks=ticks, policy=policy, strategy=strategy, provider=provider,
+                     run_id=run_id, log_level=log_level, context_tokens=context_tokens, trace=trace)
+    with ep.tracer:
+        ep.tracer.instrument_model(ep.model)
+        while not ep.done:
+            ep.observe()
+            ep.advance(*ep.plan())
+    return ep.finish()
+
+
 # --- context discovery helper -----------------------------------------------
 def build_state(model):
     """
@@ -150,7 +451,7 @@ def build_state(model):
 # ---------------------------------------------------------------------------
 
 
-def main():
+def main(argv=None):
     ap = argparse.ArgumentParser()
     ap.add_argument("--map", type=str, default="configs/map_small.yaml")
     ap.add_argument("--provider", type=str, default="mock", choices=["mock","groq","gemini","ollama"])
@@ -158,8 +459,72 @@ def main():
     ap.add_argument("--seed", type=int, default=42)
     ap.add_argument("--ticks", type=int, default=200)
     ap.add_argument("--render", action="store_true")
-    args = ap.parse_args()
-    m = run_episode(args.map, seed=args.seed, ticks=args.ticks, provider=args.provider, strategy=args.strategy, render=args.render)
+    ap.add_argument("--memory", type=str, default=None, help="Reflexion memory file (default: results/memory/<map>.json)")
+    ap.add_argument("--context-tokens", type=int, default=None, help="Token budget for the planner context (default: full state)")
+    ap.add_argument("--shards", type=int, default=None, help="Plan agents in N concurrent shards")
+    ap.add_argument("--shard-by", type=str, default="spatial", choices=["spatial", "role"])
+    ap.add_argument("--async-plan", action="store_true", help="Plan in the background; step with a fallback policy meanwhile")
+    ap.add_argument("--max-staleness", type=int, default=5, help="Discard async plans older than N ticks")
+    ap.add_argument("--fallback", type=str, default="heuristic", choices=["heuristic", "last_plan"])
+    ap.add_argument("--tools", action="store_true", help="Let the planner call routing/inventory/hospital tools")
+    ap.add_argument("--log-format", type=str, default="dir", choices=["dir", "episode", "dedup"],
+                    help="dir: tick_<t>.jsonl + metrics.jsonl; episode: one buffered episode.jsonl per run; "
+                         "dedup: episode + content-addressed message bodies")
+    ap.add_argument("--log-compression", type=str, default=None, choices=["gzip", "lzma"])
+    ap.add_argument("--checkpoint-every", type=int, default=None, help="Snapshot model + planner state every N ticks")
+    ap.add_argument("--checkpoint-dir", type=str, default=None, help="Checkpoint directory (default: results/checkpoints/<run_id>)")
+    ap.add_argument("--resume", action="store_true", help="Continue from the newest checkpoint of this run")
+    ap.add_argument("--replay", type=str, default=None,
+                    help="Re-run a recorded episode (replay.jsonl or run dir) without LLM calls; --map/--seed only for old runs")
+    ap.add_argument("--metrics-window", type=int, default=None,
+                    help="Keep only the last N ticks of per-tick metrics (ring buffer for very long runs)")
+    ap.add_argument("--policy", type=str, default=None, choices=["llm", "heuristic", "numpy"],
+                    help="Run the lean policy loop instead of the full planner loop (llm uses --strategy)")
+    ap.add_argument("--log-level", type=str, default="metrics", choices=["none", "metrics", "full"],
+                    help="Logging for --policy runs")
+    ap.add_argument("--trace", action="store_true",
+                    help="Write every phase span to logs/strategy=<s>/run=<id>/trace.json (chrome://tracing)")
+    ap.add_argument("--profile", nargs="?", const="cprofile", default=None, choices=PROFILERS,
+                    help="Profile the run (cprofile, or sampling via pyinstrument); stats in results/profiles/")
+    args = ap.parse_args(argv)
+    if args.tools and (args.shards or args.async_plan):
+        ap.error("--tools runs its own tool-calling loop; it cannot be combined with --shards or --async-plan")
+    if args.policy:
+        # options of the full planner loop that the lean policy loop has no use for
+        ignored = [flag for flag, on in [
+            ("--render", args.render), ("--memory", args.memory), ("--shards", args.shards),
+            ("--async-plan", args.async_plan), ("--tools", args.tools), ("--log-format", args.log_format != "dir"),
+            ("--log-compression", args.log_compression), ("--checkpoint-every", args.checkpoint_every),
+            ("--checkpoint-dir", args.checkpoint_dir), ("--resume", args.resume),
+            ("--metrics-window", args.metrics_window)] if on]
+        if ignored:
+            ap.error(f"--policy runs the lean policy loop; drop {' / '.join(ignored)}")
+    if args.replay:
+        from eval.replay import replay_episode
+        model, report = replay_episode(args.replay, map_path=args.map, seed=args.seed, render=args.render)
+        print(json.dumps({**model_counters(model), "avg_rescue_time": model.avg_rescue_time, "replay": report}, indent=2))
+        return
+    if args.policy:
+        label = args.strategy if args.policy == "llm" else args.policy
+        run = lambda: run_lean_episode(
+            args.map, seed=args.seed, ticks=args.ticks, policy=args.policy, strategy=args.strategy,
+            provider=args.provider, log_level=args.log_level, context_tokens=args.context_tokens, trace=args.trace)
+    else:
+        label = args.strategy
+        run = lambda: run_episode(
+            args.map, seed=args.seed, ticks=args.ticks, provider=args.provider, strategy=args.strategy,
+            render=args.render, memory_path=args.memory, context_tokens=args.context_tokens,
+            shards=args.shards, shard_by=args.shard_by,
+            async_plan=args.async_plan, max_staleness=args.max_staleness, fallback=args.fallback,
+            tools=args.tools, log_format=args.log_format, log_compression=args.log_compression,
+            checkpoint_every=args.checkpoint_every, checkpoint_dir=args.checkpoint_dir, resume=args.resume,
+            metrics_window=args.metrics_window, trace=args.trace)
+    if args.profile:
+        out = os.path.join("results", "profiles", f"{Path(args.map).stem}_{label}_seed{args.seed}")
+        m = profile_call(run, out, mode=args.profile)
+        print(f"Profile saved to {out}.*", file=sys.stderr)
+    else:
+        m = run()
     print(json.dumps(m, indent=2))
 
 
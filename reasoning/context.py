@@ -0,0 +1,165 @@
+# reasoning/context.py
+import json
+from typing import Dict, Any, List, Optional, Tuple
+
+from env.spatial import SpatialIndex
+from .utils import count_tokens
+
+# entity lists in summarize_state() that get pruned / clustered
+ENTITY_KEYS = ("survivors", "fires", "rubble", "hospitals")
+
+
+def _pos(item) -> Tuple[int, int]:
+    """Entities are either {"pos": [x, y], ...} dicts or bare [x, y] pairs."""
+    p = item["pos"] if isinstance(item, dict) else item
+    return int(p[0]), int(p[1])
+
+
+def _index(items, cell: int) -> SpatialIndex:
+    """SpatialIndex over entity positions, keyed by position in `items`."""
+    idx = SpatialIndex(cell)
+    for i, item in enumerate(items):
+        idx.add(i, _pos(item))
+    return idx
+
+
+def _region_summaries(kind, items, region: int) -> List[Dict[str, Any]]:
+    """Cluster entities into region x region blocks: count, centroid and urgency."""
+    groups: Dict[Tuple[int, int], List[Any]] = {}
+    for item in items:
+        x, y = _pos(item)
+        groups.setdefault((x // region, y // region), []).append(item)
+
+    out = []
+    for (rx, ry), members in sorted(groups.items()):
+        xs = [_pos(m)[0] for m in members]
+        ys = [_pos(m)[1] for m in members]
+        summary = {
+            "kind": kind,
+            "region": [rx * region, ry * region, region],
+            "count": len(members),
+            "centroid": [round(sum(xs) / len(xs), 1), round(sum(ys) / len(ys), 1)],
+        }
+        # urgency: tightest remaining life among survivors when the state exposes it,
+        # otherwise the number of entities waiting in the region
+        deadlines = [
+            m[key] for m in members if isinstance(m, dict)
+            for key in ("time_left", "deadline", "ttl") if isinstance(m.get(key), (int, float))
+        ]
+        summary["urgency"] = min(deadlines) if deadlines else len(members)
+        out.append(summary)
+    return out
+
+
+def _compact_agent(agent):
+    keep = ("id", "kind", "pos", "carrying", "battery")
+    return {k: agent[k] for k in keep if k in agent} if isinstance(agent, dict) else agent
+
+
+def build_budgeted_context(
+    state: Dict[str, Any],
+    max_tokens: int = 1500,
+    k: int = 3,
+    region: Optional[int] = None,
+    cell: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Shrink summarize_state() output to a bounded prompt context.
+
+    Keeps the k entities of each kind nearest to every agent, folds the rest
+    into per-region summaries under "regions", and tightens k / region size
+    until the serialized context fits in max_tokens. Nearest entities are
+    queried once per agent; each attempt then costs one pass over the
+    entities left for the region summaries plus one serialization.
+
+    Args:
+        state: full world state from CrisisModel.summarize_state()
+        max_tokens: hard upper bound on tokens of json.dumps(context)
+        k: nearest entities of each kind kept per agent
+        region: side of the clustering blocks (default: ~1/4 of the map)
+        cell: spatial index bucket size (default: region / 2)
+
+    Returns:
+        dict with the same keys as `state` plus "regions" (and "omitted_agents"
+        if even the agent list alone had to be cut: agents carrying a survivor
+        are kept first, then the others in state order).
+    """
+    agents = state.get("agents", []) or []
+    extent = 1
+    for key in ENTITY_KEYS:
+        for item in state.get(key, []) or []:
+            extent = max(extent, *_pos(item))
+    for a in agents:
+        if a.get("pos") is not None:
+            extent = max(extent, *_pos(a))
+    region = region or max(4, (extent + 1) // 4)
+    cell = cell or max(2, region // 2)
+
+    entities = {key: state.get(key, []) or [] for key in ENTITY_KEYS}
+    # one index and one k-nearest query per (kind, agent) per call; every attempt
+    # below reuses them (k_near < k takes a prefix of the same answer)
+    nearest = {}
+    for key, items in entities.items():
+        idx = _index(items, cell)
+        nearest[key] = [[i for _, i in idx.nearest_k(a["pos"], k)] if a.get("pos") is not None else []
+                        for a in agents]
+
+    def assemble(k_near, region_size, n_agents, agent_list=agents, with_regions=True, last_resort=False):
+        ctx = {key: val for key, val in state.items() if key not in ENTITY_KEYS and key != "agents"}
+        ctx["agents"] = agent_list[:n_agents]
+        regions = []
+        for key, items in entities.items():
+            near = set()
+            if k_near:
+                for ids in nearest[key][:n_agents]:
+                    near.update(ids[:k_near])
+            ctx[key] = [items[i] for i in sorted(near)]
+            if with_regions and len(near) < len(items):
+                rest = [item for i, item in enumerate(items) if i not in near]
+                regions.extend(_region_summaries(key, rest, region_size))
+        if regions:
+            ctx["regions"] = regions
+        if last_resort:
+            # part of what fits() measures: the returned dict is the measured one
+            ctx["omitted_agents"] = len(agent_list) - n_agents
+        return ctx
+
+    def fits(ctx):
+        return count_tokens(json.dumps(ctx)) <= max_tokens
+
+    # full state already fits: nothing to do (skip serializing it when it clearly cannot:
+    # every entity takes at least 2 tokens)
+    if 2 * sum(len(items) for items in entities.values()) <= max_tokens and fits(state):
+        return state
+
+    n = len(agents)
+    region_size = region
+    for k_near in range(k, -1, -1):
+        ctx = assemble(k_near, region_size, n)
+        if fits(ctx):
+            return ctx
+    while region_size < 4 * extent:
+        region_size *= 2
+        ctx = assemble(0, region_size, n)
+        if fits(ctx):
+            return ctx
+
+    # last resort: compact agents, drop region detail, then keep the longest prefix of
+    # the agents in priority order (carrying a survivor first, then state order) that
+    # fits; binary search, as the context only grows with the number of agents kept
+    order = sorted(range(n), key=lambda i: not agents[i].get("carrying"))
+    compact = [_compact_agent(agents[i]) for i in order]
+    def cut(n_agents):
+        return assemble(0, region_size, n_agents, compact, with_regions=False, last_resort=True)
+
+    ctx = cut(n)
+    if not fits(ctx):
+        lo, hi = 0, n - 1     # n agents do not fit; lo is the longest prefix known to fit (or 0)
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if fits(cut(mid)):
+                lo = mid
+            else:
+                hi = mid - 1
+        ctx = cut(lo)     # over budget only if even the agent-less context is
+    return ctx
@@ -1,5 +1,5 @@
 # reasoning/cot.py
-import json
+from .state import context_text
 
 SYSTEM_PROMPT = """
 You are a Chain-of-Thought planner.
@@ -8,7 +8,7 @@ End with FINAL_JSON matching schema.
 """
 
 def build_messages(context_json, scratchpad=None):
-    user_msg = "CONTEXT_JSON:\n" + json.dumps(context_json)
+    user_msg = "CONTEXT_JSON:\n" + context_text(context_json)
     return [
         {"role": "system", "content": SYSTEM_PROMPT},
         {"role": "user", "content": user_msg},
@@ -1,8 +1,12 @@
 # reasoning/llm_client.py
 import os
+import threading
 import time
+from collections import OrderedDict
 from typing import List, Dict, Any, Union
 from dotenv import load_dotenv
+from .state import context_data
+from eval.tracing import traced
 
 # Load environment variables from .env file
 load_dotenv()
@@ -13,6 +17,8 @@ GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "gemma3n:e4b")
+# cap on commands the mock returns per call (0 = no cap); with sharded planning the cap applies per shard
+MOCK_MAX_COMMANDS = int(os.getenv("MOCK_MAX_COMMANDS", "3"))
 
 # Debug info (uncomment for debugging)
 # print(f"LLM Provider: {PROVIDER}")
@@ -25,12 +31,58 @@ class LLMError(Exception):
     pass
 
 
+class ResponseCache:
+    """
+    Thread-safe LRU of LLM response texts.
+
+    Keys are built by the planner from the TickState hash (plus provider,
+    strategy and scratchpad), so identical states are answered without a
+    provider call and without hashing the prompt text again.
+    """
+
+    def __init__(self, maxsize: int = 4096):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+
+# opt-in: only safe for deterministic providers / temperature 0
+RESPONSE_CACHE = ResponseCache()
+RESPONSE_CACHE_ENABLED = os.getenv("LLM_RESPONSE_CACHE", "0") == "1"
+
+
+DEFAULT_MODELS = {"groq": "llama-3.3-70b-versatile", "gemini": "gemini-1.5-flash"}
+
+
+def resolve_model(provider: str, model: str = None) -> str:
+    """Model name a call with `model` goes to on `provider` (read at call time, like the provider)."""
+    if model:
+        return model
+    if provider == "ollama":
+        return os.getenv("OLLAMA_MODEL", OLLAMA_MODEL)
+    return DEFAULT_MODELS.get(provider, "mock")
+
+
 def _call_groq(messages: List[Dict[str, str]], model: str, temperature: float):
     try:
         from groq import Groq
         client = Groq(api_key=GROQ_API_KEY)
         resp = client.chat.completions.create(
-            model=model or "llama-3.3-70b-versatile",
+            model=resolve_model("groq", model),
             messages=messages,
             temperature=temperature,
         )
@@ -46,7 +98,7 @@ def _call_gemini(messages: List[Dict[str, str]], model: str, temperature: float)
     try:
         import google.generativeai as genai
         genai.configure(api_key=GEMINI_API_KEY)
-        mdl = genai.GenerativeModel(model or "gemini-1.5-flash")
+        mdl = genai.GenerativeModel(resolve_model("gemini", model))
         # flatten messages into a single string (Gemini doesn't support roles the same way)
         prompt = "\n".join([f"{m['role'].upper()}: {m['content']}" for m in messages])
         resp = mdl.generate_content(prompt, generation_config={"temperature": temperature})
@@ -64,7 +116,7 @@ def _call_ollama(messages: List[Dict[str, str]], model: str, temperature: float)
         import json
         
         # Use the model from environment or parameter
-        model_name = model or OLLAMA_MODEL
+        model_name = resolve_model("ollama", model)
         
         # Prepare the request payload
         payload = {
@@ -80,7 +132,7 @@ def _call_ollama(messages: List[Dict[str, str]], model: str, temperature: float)
         
         # Make the API call to Ollama
         response = requests.post(
-            f"{OLLAMA_BASE_URL}/api/chat",
+            f"{os.getenv('OLLAMA_BASE_URL', OLLAMA_BASE_URL)}/api/chat",
             json=payload,
             timeout=60
         )
@@ -101,41 +153,33 @@ def _call_ollama(messages: List[Dict[str, str]], model: str, temperature: float)
         raise LLMError(f"Ollama call failed: {e}")
 
 
-def _call_mock(messages: List[Dict[str, str]], *_args, **_kwargs):
+def mock_policy(context_json: Dict[str, Any], paths=None, wanted=None) -> List[Dict[str, Any]]:
     """
-    Context-aware mock LLM that analyzes the game state and provides intelligent responses.
+    Rule-based policy behind the mock provider: nearest-target moves for every agent.
+
+    Also used directly as the deterministic fallback while a real LLM plan is in flight.
+    Returns the full command list (one command per agent at most, no cap).
+
+    Args:
+        context_json: world state
+        paths: optional {(start, goal): path} from the shortest_path tool; steps
+            follow the path instead of a straight line when one is known
+        wanted: optional list that collects the (start, goal) pairs the policy
+            would like routed
     """
-    import json
-    import random
-    
-    # Extract context from user message
-    context_json = None
-    for msg in messages:
-        if msg["role"] == "user" and "CONTEXT_JSON:" in msg["content"]:
-            try:
-                # Find the JSON part after CONTEXT_JSON:
-                json_start = msg["content"].find("CONTEXT_JSON:") + len("CONTEXT_JSON:")
-                # Look for various end patterns
-                json_end = msg["content"].find("\n\nAllowed actions:")
-                if json_end == -1:
-                    json_end = msg["content"].find("\n\nOutput PLAN")
-                if json_end == -1:
-                    json_end = msg["content"].find("\n\nExample:")
-                if json_end == -1:
-                    json_end = len(msg["content"])
-                json_str = msg["content"][json_start:json_end].strip()
-                context_json = json.loads(json_str)
-                break
-            except (json.JSONDecodeError, ValueError):
-                pass
-    
-    if not context_json:
-        # Fallback to simple response
-        return {
-            "content": "Thought: I need to analyze the situation and take appropriate action.\nFINAL_JSON: {\"commands\":[]}",
-            "raw": {"mock": True, "messages": messages}
-        }
-    
+    def next_step(pos, target):
+        key = (tuple(pos), tuple(target))
+        if wanted is not None and key not in wanted:
+            wanted.append(key)
+        path = (paths or {}).get(key)
+        if path and len(path) > 1:
+            return list(path[1])
+        dx = target[0] - pos[0]
+        dy = target[1] - pos[1]
+        if abs(dx) > abs(dy):
+            return pos[0] + (1 if dx > 0 else -1), pos[1]
+        return pos[0], pos[1] + (1 if dy > 0 else -1)
+
     # Analyze the game state
     agents = context_json.get("agents", [])
     survivors = context_json.get("survivors", [])
@@ -210,12 +254,7 @@ def _call_mock(messages: List[Dict[str, str]], *_args, **_kwargs):
                         })
                     else:
                         # Move one step towards target
-                        if abs(dx) > abs(dy):
-                            new_x = agent_pos[0] + (1 if dx > 0 else -1)
-                            new_y = agent_pos[1]
-                        else:
-                            new_x = agent_pos[0]
-                            new_y = agent_pos[1] + (1 if dy > 0 else -1)
+                        new_x, new_y = next_step(agent_pos, target_pos)
                         
                         commands.append({
                             "agent_id": agent_id,
@@ -246,15 +285,7 @@ def _call_mock(messages: List[Dict[str, str]], *_args, **_kwargs):
                     else:
                         # Move towards fire
                         target_pos = nearest_fire
-                        dx = target_pos[0] - agent_pos[0]
-                        dy = target_pos[1] - agent_pos[1]
-                        
-                        if abs(dx) > abs(dy):
-                            new_x = agent_pos[0] + (1 if dx > 0 else -1)
-                            new_y = agent_pos[1]
-                        else:
-                            new_x = agent_pos[0]
-                            new_y = agent_pos[1] + (1 if dy > 0 else -1)
+                        new_x, new_y = next_step(agent_pos, target_pos)
                         
                         commands.append({
                             "agent_id": agent_id,
@@ -283,15 +314,7 @@ def _call_mock(messages: List[Dict[str, str]], *_args, **_kwargs):
                     else:
                         # Move towards rubble
                         target_pos = nearest_rubble
-                        dx = target_pos[0] - agent_pos[0]
-                        dy = target_pos[1] - agent_pos[1]
-                        
-                        if abs(dx) > abs(dy):
-                            new_x = agent_pos[0] + (1 if dx > 0 else -1)
-                            new_y = agent_pos[1]
-                        else:
-                            new_x = agent_pos[0]
-                            new_y = agent_pos[1] + (1 if dy > 0 else -1)
+                        new_x, new_y = next_step(agent_pos, target_pos)
                         
                         commands.append({
                             "agent_id": agent_id,
@@ -312,15 +335,7 @@ def _call_mock(messages: List[Dict[str, str]], *_args, **_kwargs):
                     })
                 else:
                     # Move towards depot
-                    dx = depot[0] - agent_pos[0]
-                    dy = depot[1] - agent_pos[1]
-                    
-                    if abs(dx) > abs(dy):
-                        new_x = agent_pos[0] + (1 if dx > 0 else -1)
-                        new_y = agent_pos[1]
-                    else:
-                        new_x = agent_pos[0]
-                        new_y = agent_pos[1] + (1 if dy > 0 else -1)
+                    new_x, new_y = next_step(agent_pos, depot)
                     
                     commands.append({
                         "agent_id": agent_id,
@@ -340,15 +355,7 @@ def _call_mock(messages: List[Dict[str, str]], *_args, **_kwargs):
                     
                     if nearest_survivor:
                         target_pos = nearest_survivor["pos"]
-                        dx = target_pos[0] - agent_pos[0]
-                        dy = target_pos[1] - agent_pos[1]
-                        
-                        if abs(dx) > abs(dy):
-                            new_x = agent_pos[0] + (1 if dx > 0 else -1)
-                            new_y = agent_pos[1]
-                        else:
-                            new_x = agent_pos[0]
-                            new_y = agent_pos[1] + (1 if dy > 0 else -1)
+                        new_x, new_y = next_step(agent_pos, target_pos)
                         
                         commands.append({
                             "agent_id": agent_id,
@@ -356,8 +363,88 @@ def _call_mock(messages: List[Dict[str, str]], *_args, **_kwargs):
                             "to": [new_x, new_y]
                         })
     
-    # Limit to 3 commands to avoid overwhelming the system
-    commands = commands[:3]
+    return commands
+
+
+def _call_mock(messages: List[Dict[str, str]], *_args, context=None, **_kwargs):
+    """
+    Context-aware mock LLM that analyzes the game state and provides intelligent responses.
+
+    When the caller passes the TickState (or dict) the prompt was built from as
+    `context`, it is used directly instead of parsing CONTEXT_JSON back out of
+    the prompt text.
+    """
+    import json
+    import random
+    
+    # Extract context from user message
+    context_json = context_data(context) if context is not None else None
+    for msg in ([] if context_json is not None else messages):
+        if msg["role"] == "user" and "CONTEXT_JSON:" in msg["content"]:
+            try:
+                # Find the JSON part after CONTEXT_JSON:
+                json_start = msg["content"].find("CONTEXT_JSON:") + len("CONTEXT_JSON:")
+                # Look for various end patterns
+                json_end = msg["content"].find("\n\nAllowed actions:")
+                if json_end == -1:
+                    json_end = msg["content"].find("\n\nOutput PLAN")
+                if json_end == -1:
+                    json_end = msg["content"].find("\n\nExample:")
+                if json_end == -1:
+                    json_end = msg["content"].find("\n\nSCRATCHPAD:")
+                if json_end == -1:
+                    json_end = len(msg["content"])
+                json_str = msg["content"][json_start:json_end].strip()
+                context_json = json.loads(json_str)
+                break
+            except (json.JSONDecodeError, ValueError):
+                pass
+    
+    if not context_json:
+        # Fallback to simple response
+        return {
+            "content": "Thought: I need to analyze the situation and take appropriate action.\nFINAL_JSON: {\"commands\":[]}",
+            "raw": {"mock": True, "messages": messages}
+        }
+    
+    # Analyze the game state
+    survivors = context_json.get("survivors", [])
+    fires = context_json.get("fires", [])
+    rubble = context_json.get("rubble", [])
+    
+    # Tool-calling: route moves with shortest_path first, then follow the returned paths
+    tools_offered = any(m["role"] == "system" and "TOOL_CALLS:" in m["content"] for m in messages)
+    paths = {}
+    tool_results = [m for m in messages if m["role"] == "user" and m["content"].startswith("TOOL_RESULTS:")]
+    for msg in tool_results:
+        try:
+            results = json.loads(msg["content"][len("TOOL_RESULTS:"):])
+        except json.JSONDecodeError:
+            continue
+        for r in results:
+            res = r.get("result") or {}
+            if r.get("name") == "shortest_path" and res.get("status") == "ok":
+                args = r.get("arguments", {})
+                paths[(tuple(args["start"]), tuple(args["goal"]))] = res["path"]
+    
+    wanted = [] if tools_offered and not tool_results else None
+    commands = mock_policy(context_json, paths=paths, wanted=wanted)
+    
+    # Limit commands to avoid overwhelming the system
+    if MOCK_MAX_COMMANDS > 0:
+        commands = commands[:MOCK_MAX_COMMANDS]
+    
+    if wanted:
+        starts = {tuple(a["pos"]) for a in context_json.get("agents", [])
+                  if a["id"] in {c["agent_id"] for c in commands if c["type"] == "move"}}
+        calls = [{"name": "shortest_path", "arguments": {"start": list(a), "goal": list(b)}}
+                 for a, b in wanted if a in starts]
+        if calls:
+            return {
+                "content": "Thought: Routing moving agents with shortest_path before committing moves.\n"
+                           f"TOOL_CALLS: {json.dumps(calls)}",
+                "raw": {"mock": True, "messages": messages, "tool_calls": calls}
+            }
     
     # Generate response based on strategy
     system_msg = messages[0]["content"] if messages else ""
@@ -387,12 +474,14 @@ def _call_mock(messages: List[Dict[str, str]], *_args, **_kwargs):
     }
 
 
+@traced("llm")
 def call_llm(
     messages: List[Dict[str, str]],
     model: str = None,
     temperature: float = 0.2,
     retries: int = 2,
     backoff: float = 2.0,
+    context=None,
 ) -> Dict[str, Any]:
     """
     Call an LLM provider with chat-style messages.
@@ -403,22 +492,25 @@ def call_llm(
         temperature: sampling temperature
         retries: number of retry attempts on failure
         backoff: exponential backoff base in seconds
+        context: optional TickState the messages were built from (used by the mock)
 
     Returns:
         dict with keys:
             - content: str (assistant’s main text reply)
             - raw: provider’s raw response object
     """
+    # read at call time so run_episode(provider=...) takes effect after import
+    provider = os.getenv("LLM_PROVIDER", PROVIDER).lower()
     for attempt in range(retries):
         try:
-            if PROVIDER == "groq":
+            if provider == "groq":
                 return _call_groq(messages, model, temperature)
-            elif PROVIDER == "gemini":
+            elif provider == "gemini":
                 return _call_gemini(messages, model, temperature)
-            elif PROVIDER == "ollama":
+            elif provider == "ollama":
                 return _call_ollama(messages, model, temperature)
             else:
-                return _call_mock(messages, model, temperature)
+                return _call_mock(messages, model, temperature, context=context)
         except LLMError as e:
             if attempt < retries - 1:
                 time.sleep(backoff * (2 ** attempt))
@@ -0,0 +1,215 @@
+# reasoning/memory.py
+import json
+import os
+from typing import Dict, Any, List, Optional
+
+from .utils import count_tokens, validate_action_json
+
+# ----------------------
+# Lesson templates
+# ----------------------
+# Lessons are keyed by failure kind (+ agent kind where relevant) so repeated
+# failures strengthen one short lesson instead of piling up transcript lines.
+LESSONS = {
+    "malformed_json": "Output was not parseable JSON. End with exactly one line `FINAL_JSON: {...}` and nothing after it.",
+    "schema_mismatch": "Output broke the action schema. Each command needs agent_id (string) and type move|act; moves use to:[x,y], acts use action_name.",
+    "unknown_agent": "Commands referenced agent ids that do not exist. Only use ids listed under agents in CONTEXT_JSON.",
+    "blocked_move": "{kind} move was blocked (fire, rubble or building in the way). Target a free neighbouring cell or clear the route with a truck first.",
+    "death": "Survivors died while waiting. Send free medics to the nearest survivors first and keep carrying medics heading to a hospital.",
+    "death_fire": "Survivors died with fires still burning. Send trucks to fires close to survivors before clearing rubble.",
+}
+
+
+def situation_features(state: Dict[str, Any]) -> List[str]:
+    """
+    Reduce a world state to a small set of discrete features used to index lessons.
+
+    Args:
+        state: context dict from CrisisModel.summarize_state()
+
+    Returns:
+        Sorted list of feature strings, e.g. ["fires", "medic", "survivors:many"].
+    """
+    feats = set()
+    agents = state.get("agents", []) or []
+    survivors = state.get("survivors", []) or []
+
+    if state.get("fires"):
+        feats.add("fires")
+    if state.get("rubble"):
+        feats.add("rubble")
+
+    n = len(survivors)
+    feats.add("survivors:none" if n == 0 else "survivors:few" if n <= 5 else "survivors:many")
+
+    for a in agents:
+        kind = a.get("kind")
+        if kind:
+            feats.add(kind)
+        if a.get("carrying"):
+            feats.add("carrying")
+        battery = a.get("battery")
+        if battery is not None and battery < 20:
+            feats.add("low_battery")
+    return sorted(feats)
+
+
+class ReflexionMemory:
+    """
+    Persistent Reflexion memory: distills planning failures into short lessons,
+    indexes them by situation features and retrieves only the most relevant
+    ones under a fixed token budget.
+
+    One store is meant to be shared by every episode (and seed) of a map; call
+    save() at the end of an episode and pass the same path next time.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path: Optional[str] = None, max_lessons: int = 200):
+        self.path = path
+        self.max_lessons = max_lessons
+        self.lessons: Dict[str, Dict[str, Any]] = {}
+        self.index: Dict[str, set] = {}
+        if path and os.path.exists(path):
+            self.load(path)
+
+    # ---- storage ----
+    def load(self, path: str):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != self.VERSION:
+            return
+        for lesson in data.get("lessons", []):
+            self._insert(lesson)
+
+    def save(self, path: Optional[str] = None):
+        path = path or self.path
+        if not path:
+            return
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": self.VERSION, "lessons": list(self.lessons.values())}, f, indent=2)
+        os.replace(tmp, path)
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Copy of the current lessons (for episode checkpoints)."""
+        return [dict(l, features=list(l["features"])) for l in self.lessons.values()]
+
+    def restore(self, lessons: List[Dict[str, Any]]):
+        """Replace the in-memory lessons with a snapshot() taken earlier."""
+        self.lessons, self.index = {}, {}
+        for lesson in lessons:
+            self._insert(dict(lesson, features=list(lesson["features"])))
+
+    def _insert(self, lesson: Dict[str, Any]):
+        self.lessons[lesson["key"]] = lesson
+        for feat in lesson["features"]:
+            self.index.setdefault(feat, set()).add(lesson["key"])
+
+    def add(self, key: str, text: str, features: List[str], tick: Optional[int] = None):
+        """Record one occurrence of a lesson; repeated keys only bump the count."""
+        lesson = self.lessons.get(key)
+        if lesson is None:
+            if len(self.lessons) >= self.max_lessons:
+                self._evict()
+            lesson = {"key": key, "text": text, "features": sorted(set(features)), "count": 0, "last_tick": None}
+            self._insert(lesson)
+        else:
+            for feat in features:
+                if feat not in lesson["features"]:
+                    lesson["features"].append(feat)
+                    self.index.setdefault(feat, set()).add(key)
+            lesson["features"].sort()
+        lesson["count"] += 1
+        lesson["last_tick"] = tick
+
+    def _evict(self):
+        weakest = min(self.lessons.values(), key=lambda l: l["count"])
+        del self.lessons[weakest["key"]]
+        for feat in weakest["features"]:
+            self.index.get(feat, set()).discard(weakest["key"])
+
+    # ---- distillation ----
+    def observe(self, tick, state, plan, response_text, next_state=None, deaths_delta=0):
+        """
+        Distill lessons from one planning round.
+
+        Args:
+            tick: tick the plan was made at
+            state: context the plan was built from
+            plan: validated plan dict ({"commands": [...]})
+            response_text: raw LLM output (checked for invalid JSON; None if no LLM call was made),
+                or a list of them when the plan took several calls (one per shard)
+            next_state: context after model.step(), used to detect blocked moves
+            deaths_delta: number of survivors that died during the step
+        """
+        feats = situation_features(state)
+
+        texts = response_text if isinstance(response_text, list) else [response_text]
+        for text in texts:
+            if text is None:
+                continue
+            try:
+                validate_action_json(text)
+            except ValueError as e:
+                key = "malformed_json" if str(e).startswith("malformed json") else "schema_mismatch"
+                self.add(key, LESSONS[key], feats, tick)
+
+        agents = {str(a.get("id")): a for a in state.get("agents", []) or []}
+        after = {}
+        if next_state is not None:
+            after = {str(a.get("id")): a for a in next_state.get("agents", []) or []}
+
+        for cmd in plan.get("commands", []):
+            aid = str(cmd.get("agent_id"))
+            if aid not in agents:
+                self.add("unknown_agent", LESSONS["unknown_agent"], feats, tick)
+                continue
+            if cmd.get("type") != "move" or aid not in after:
+                continue
+            before_pos = list(agents[aid].get("pos") or [])
+            if list(cmd.get("to") or []) != before_pos and list(after[aid].get("pos") or []) == before_pos:
+                kind = agents[aid].get("kind", "agent")
+                self.add(f"blocked_move:{kind}", LESSONS["blocked_move"].format(kind=kind.capitalize()),
+                         feats + [kind], tick)
+
+        if deaths_delta > 0:
+            key = "death_fire" if "fires" in feats else "death"
+            self.add(key, LESSONS[key], feats, tick)
+
+    # ---- retrieval ----
+    def retrieve(self, state: Dict[str, Any], k: int = 5, max_tokens: int = 200) -> List[Dict[str, Any]]:
+        """
+        Return up to k lessons relevant to `state` whose rendered text fits in max_tokens.
+
+        Candidates come from the feature index; they are ranked by feature
+        overlap, then by how often the failure was seen.
+        """
+        feats = situation_features(state)
+        scores: Dict[str, int] = {}
+        for feat in feats:
+            for key in self.index.get(feat, ()):
+                scores[key] = scores.get(key, 0) + 1
+
+        ranked = sorted(scores, key=lambda key: (-scores[key], -self.lessons[key]["count"], key))
+        picked, used = [], 0
+        for key in ranked:
+            lesson = self.lessons[key]
+            cost = count_tokens(self._line(lesson)) + 1
+            if used + cost > max_tokens:
+                continue
+            picked.append(lesson)
+            used += cost
+            if len(picked) >= k:
+                break
+        return picked
+
+    def render(self, state: Dict[str, Any], k: int = 5, max_tokens: int = 200) -> str:
+        """Scratchpad text for the strategies: one bullet per retrieved lesson."""
+        return "\n".join(self._line(l) for l in self.retrieve(state, k=k, max_tokens=max_tokens))
+
+    @staticmethod
+    def _line(lesson):
+        return f"- {lesson['text']} (seen {lesson['count']}x)"
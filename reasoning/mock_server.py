@@ -0,0 +1,67 @@
+# reasoning/mock_server.py
+"""
+Local stand-in for an Ollama server, answering /api/chat with the mock provider.
+
+Lets the HTTP path (provider=ollama, tool-calling loop, timeouts) be exercised
+without a real model:
+
+    python -m reasoning.mock_server --port 11435
+    OLLAMA_BASE_URL=http://127.0.0.1:11435 python main.py --provider ollama --tools
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .llm_client import _call_mock
+
+
+class _Handler(BaseHTTPRequestHandler):
+    latency = 0.0
+
+    def do_POST(self):
+        if self.path != "/api/chat":
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.latency:
+            time.sleep(self.latency)
+        reply = _call_mock(body.get("messages", []))
+        out = json.dumps({
+            "model": body.get("model", "mock"),
+            "message": {"role": "assistant", "content": reply["content"]},
+            "done": True,
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+    def log_message(self, *_args):
+        pass
+
+
+def serve(host="127.0.0.1", port=11435, latency=0.0, background=False):
+    """Start the stand-in server; with background=True return it running in a daemon thread."""
+    handler = type("Handler", (_Handler,), {"latency": latency})
+    server = ThreadingHTTPServer((host, port), handler)
+    if background:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+    print(f"Mock Ollama server at http://{host}:{server.server_port}  (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return server
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", type=str, default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=11435)
+    ap.add_argument("--latency", type=float, default=0.0, help="Simulated seconds per request")
+    args = ap.parse_args()
+    serve(args.host, args.port, args.latency)
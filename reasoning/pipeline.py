@@ -0,0 +1,192 @@
+# reasoning/pipeline.py
+import copy
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+
+from .planner import make_plan_with_logging, make_sharded_plan_with_logging
+from .llm_client import mock_policy
+from .state import TickState
+
+logger = logging.getLogger(__name__)
+
+
+def _cell(p):
+    return (int(p[0]), int(p[1]))
+
+
+def revalidate_commands(commands: List[Dict[str, Any]], state: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Drop commands from a (possibly stale) plan that no longer make sense in `state`.
+
+    Removes commands for agents that are gone, moves into burning / rubble
+    cells or onto the agent's own cell, and acts whose preconditions no longer
+    hold (e.g. pickup_survivor with nobody left on the tile).
+    """
+    agents = {str(a["id"]): a for a in state.get("agents", [])}
+    survivors = {_cell(s["pos"]) for s in state.get("survivors", []) or []}
+    fires = {_cell(f) for f in state.get("fires", []) or []}
+    rubble = {_cell(r) for r in state.get("rubble", []) or []}
+    hospitals = {_cell(h["pos"]) for h in state.get("hospitals", []) or []}
+    depot = _cell(state["depot"]) if state.get("depot") else None
+
+    valid, seen = [], set()
+    for cmd in commands:
+        aid = str(cmd.get("agent_id"))
+        agent = agents.get(aid)
+        if agent is None or aid in seen:
+            continue
+        pos = _cell(agent["pos"])
+        if cmd.get("type") == "move":
+            to = cmd.get("to")
+            if not to or _cell(to) == pos or _cell(to) in fires or _cell(to) in rubble:
+                continue
+        else:
+            action = cmd.get("action_name")
+            ok = {
+                "pickup_survivor": pos in survivors and not agent.get("carrying"),
+                "drop_at_hospital": pos in hospitals and agent.get("carrying"),
+                "extinguish_fire": pos in fires,
+                "clear_rubble": pos in rubble,
+                "recharge": depot is None or pos == depot,
+            }.get(action, True)
+            if not ok:
+                continue
+        seen.add(aid)
+        valid.append(cmd)
+    return valid
+
+
+class AsyncPlanner:
+    """
+    Runs the LLM planner in a background thread on a snapshot of the state,
+    so the simulation can keep stepping while a request is in flight.
+
+    submit() is a no-op while a request is outstanding; poll() returns the
+    finished result (once) or None.
+    """
+
+    def __init__(self, strategy="react", shards=None, shard_by="spatial", shard_tokens=1500):
+        self.strategy = strategy
+        self.shards = shards
+        self.shard_by = shard_by
+        self.shard_tokens = shard_tokens
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="planner")
+        self._future = None
+        self._tick = None
+
+    @property
+    def busy(self) -> bool:
+        return self._future is not None and not self._future.done()
+
+    def submit(self, tick: int, context: Dict[str, Any], scratchpad: str = "") -> bool:
+        if self._future is not None:
+            return False
+        # a TickState is already a frozen serialization of the state
+        snapshot = context if isinstance(context, TickState) else copy.deepcopy(context)
+        self._tick = tick
+        self._future = self._pool.submit(self._plan, snapshot, scratchpad)
+        return True
+
+    def _plan(self, context, scratchpad):
+        t0 = time.perf_counter()
+        if self.shards:
+            plan, messages, text, _, texts = make_sharded_plan_with_logging(
+                context, strategy=self.strategy, scratchpad=scratchpad, shards=self.shards,
+                by=self.shard_by, shard_tokens=self.shard_tokens)
+        else:
+            plan, messages, text = make_plan_with_logging(context, strategy=self.strategy, scratchpad=scratchpad)
+            texts = [text]
+        return {"plan": plan, "messages": messages, "response_text": text, "response_texts": texts,
+                "latency_ms": (time.perf_counter() - t0) * 1000.0}
+
+    def poll(self) -> Optional[Dict[str, Any]]:
+        """
+        Return {"tick", "plan", "messages", "response_text", "response_texts",
+        "latency_ms"} once the plan is ready (response_texts: the raw output of
+        every LLM call, for validation; response_text joins them for logging).
+        """
+        if self._future is None or not self._future.done():
+            return None
+        fut, self._future = self._future, None
+        try:
+            result = fut.result()
+        except Exception as e:
+            logger.error(f"Background planning for t={self._tick} failed: {e}")
+            return None
+        result["tick"] = self._tick
+        return result
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+class PlanPipeline:
+    """
+    Non-blocking planning loop for run_episode.
+
+    Every tick it returns commands immediately: an LLM plan if one arrived
+    and is at most `max_staleness` ticks old (re-validated against the
+    current state), otherwise the fallback — the mock's rule-based policy
+    ("heuristic") or whatever is still valid from the last LLM plan
+    ("last_plan", while that plan is at most `max_staleness` ticks old; the
+    heuristic takes over after that). Agents an LLM or last_plan plan leaves
+    idle are filled in by the heuristic when fill_idle is set.
+    """
+
+    def __init__(self, strategy="react", max_staleness=5, fallback="heuristic", fill_idle=True, **planner_kwargs):
+        self.planner = AsyncPlanner(strategy=strategy, **planner_kwargs)
+        self.max_staleness = max_staleness
+        self.fallback = fallback
+        self.fill_idle = fill_idle
+        self.last_plan: List[Dict[str, Any]] = []
+        self.last_plan_tick: Optional[int] = None
+
+    def step(self, tick: int, state: Dict[str, Any], context: Optional[Dict[str, Any]] = None, scratchpad: str = ""):
+        """
+        Args:
+            tick: current simulation tick
+            state: full current state (used for re-validation and the fallback)
+            context: prompt context to plan on (defaults to state)
+
+        Returns:
+            tuple: (commands, info, arrived) where info carries "source",
+            "plan_lag" (ticks between the snapshot the newest LLM plan was made
+            on and now; None before the first plan) and "stale_dropped";
+            arrived is the poll() result when an LLM plan landed this tick.
+        """
+        info = {"source": self.fallback, "plan_lag": None, "stale_dropped": False}
+        commands = None
+
+        arrived = self.planner.poll()
+        if arrived is not None:
+            lag = tick - arrived["tick"]
+            if lag <= self.max_staleness:
+                self.last_plan = arrived["plan"].get("commands", [])
+                self.last_plan_tick = arrived["tick"]
+                commands = revalidate_commands(self.last_plan, state)
+                info["source"] = "llm"
+            else:
+                info["stale_dropped"] = True
+
+        if commands is None:
+            if (self.fallback == "last_plan" and self.last_plan
+                    and tick - self.last_plan_tick <= self.max_staleness):
+                commands = revalidate_commands(self.last_plan, state)
+                info["source"] = "last_plan"
+            else:
+                commands = mock_policy(state)
+                info["source"] = "heuristic"
+        if self.fill_idle and info["source"] != "heuristic":
+            planned = {str(c["agent_id"]) for c in commands}
+            commands = commands + [c for c in mock_policy(state) if str(c["agent_id"]) not in planned]
+
+        if self.last_plan_tick is not None:
+            info["plan_lag"] = tick - self.last_plan_tick
+
+        self.planner.submit(tick, state if context is None else context, scratchpad)
+        return commands, info, arrived
+
+    def close(self):
+        self.planner.close()
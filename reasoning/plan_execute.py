@@ -1,5 +1,5 @@
 # reasoning/plan_execute.py
-import json
+from .state import context_text
 
 SYSTEM_PROMPT = """
 You are a disaster response planner using Plan-and-Execute.
@@ -13,7 +13,7 @@ No extra text after FINAL_JSON line.
 """
 
 def build_messages(context_json, scratchpad=None):
-    user_msg = "CONTEXT_JSON:\n" + json.dumps(context_json)
+    user_msg = "CONTEXT_JSON:\n" + context_text(context_json)
     return [
         {"role": "system", "content": SYSTEM_PROMPT},
         {"role": "user", "content": user_msg + "\n\nOutput PLAN then FINAL_JSON."},
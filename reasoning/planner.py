@@ -1,16 +1,61 @@
 # reasoning/planner.py
+import hashlib
+import importlib
 import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from .utils import get_validated_actions, get_validated_actions_with_logging
-
-# Import your strategy implementations
-from .react import react_plan
-from .reflexion import reflexion_plan
-from .plan_execute import plan_execute_plan
-from .cot import cot_plan
-from .tot import tot_plan
+from .context import build_budgeted_context
+from .tool_calling import get_validated_actions_with_tools
+from .state import TickState, context_data
+from . import llm_client
+from eval.tracing import traced
 
 logger = logging.getLogger(__name__)
 
+# Strategy implementations: name -> (module, function), imported on first use
+STRATEGIES = {
+    "react": ("react", "react_plan"),
+    "reflexion": ("reflexion", "reflexion_plan"),
+    "plan_execute": ("plan_execute", "plan_execute_plan"),
+    "cot": ("cot", "cot_plan"),
+    "tot": ("tot", "tot_plan"),
+}
+_strategy_fns = {}
+
+
+def strategy_fn(strategy):
+    """The message builder of `strategy` (None for unknown names)."""
+    fn = _strategy_fns.get(strategy)
+    if fn is None and strategy in STRATEGIES:
+        module, name = STRATEGIES[strategy]
+        fn = _strategy_fns[strategy] = getattr(importlib.import_module(f".{module}", __package__), name)
+    return fn
+
+
+@traced("prompt")
+def build_strategy_messages(context, strategy="react", scratchpad=""):
+    """Build the chat messages for `strategy` (unknown names fall back to react)."""
+    fn = strategy_fn(strategy)
+    if fn is None:
+        logger.warning(f"Unknown strategy={strategy}, defaulting to react.")
+        fn = strategy_fn("react")
+    return fn(context, scratchpad=scratchpad)
+
+
+def _cache_key(context, strategy, scratchpad, model=None, temperature=0.2):
+    """
+    Response-cache key for a TickState context (None when caching is off or not
+    applicable): provider, resolved model name and temperature of the call, so
+    switching OLLAMA_MODEL (or the model / temperature) never reuses answers.
+    """
+    if not llm_client.RESPONSE_CACHE_ENABLED or not isinstance(context, TickState):
+        return None
+    pad = hashlib.blake2b((scratchpad or "").encode("utf-8"), digest_size=8).hexdigest()
+    provider = os.getenv("LLM_PROVIDER", llm_client.PROVIDER).lower()
+    return (provider, llm_client.resolve_model(provider, model), temperature, strategy, context.hash, pad)
+
 
 def make_plan(context, strategy="react", scratchpad=""):
     """
@@ -25,19 +70,7 @@ def make_plan(context, strategy="react", scratchpad=""):
         dict with "commands" key (validated against ACTION_SCHEMA).
     """
     # --- Choose the planner function ---
-    if strategy == "react":
-        messages = react_plan(context, scratchpad=scratchpad)
-    elif strategy == "reflexion":
-        messages = reflexion_plan(context, scratchpad=scratchpad)
-    elif strategy == "plan_execute":
-        messages = plan_execute_plan(context, scratchpad=scratchpad)
-    elif strategy == "cot":
-        messages = cot_plan(context, scratchpad=scratchpad)
-    elif strategy == "tot":
-        messages = tot_plan(context, scratchpad=scratchpad)
-    else:
-        logger.warning(f"Unknown strategy={strategy}, defaulting to react.")
-        messages = react_plan(context, scratchpad=scratchpad)
+    messages = build_strategy_messages(context, strategy=strategy, scratchpad=scratchpad)
 
     # --- Always run through validated JSON wrapper ---
     actions = get_validated_actions(messages, logger=logger)
@@ -49,7 +82,7 @@ def make_plan_with_logging(context, strategy="react", scratchpad=""):
     Top-level planner dispatcher with logging support.
 
     Args:
-        context: JSON context from sensors.py (world state).
+        context: JSON context from sensors.py (world state), or its TickState.
         strategy: Which LLM planning strategy to use.
         scratchpad: Optional running memory/log for strategies like Reflexion.
 
@@ -57,20 +90,185 @@ def make_plan_with_logging(context, strategy="react", scratchpad=""):
         tuple: (actions_dict, messages, response_text) for logging
     """
     # --- Choose the planner function ---
-    if strategy == "react":
-        messages = react_plan(context, scratchpad=scratchpad)
-    elif strategy == "reflexion":
-        messages = reflexion_plan(context, scratchpad=scratchpad)
-    elif strategy == "plan_execute":
-        messages = plan_execute_plan(context, scratchpad=scratchpad)
-    elif strategy == "cot":
-        messages = cot_plan(context, scratchpad=scratchpad)
-    elif strategy == "tot":
-        messages = tot_plan(context, scratchpad=scratchpad)
-    else:
-        logger.warning(f"Unknown strategy={strategy}, defaulting to react.")
-        messages = react_plan(context, scratchpad=scratchpad)
+    messages = build_strategy_messages(context, strategy=strategy, scratchpad=scratchpad)
 
     # --- Get validated actions and response text ---
-    actions, response_text = get_validated_actions_with_logging(messages, logger=logger)
+    actions, response_text = get_validated_actions_with_logging(
+        messages, logger=logger, context=context, cache_key=_cache_key(context, strategy, scratchpad))
     return actions, messages, response_text
+
+
+def make_plan_with_tools(context, model, tick, strategy="react", scratchpad="", max_rounds=3):
+    """
+    Planner dispatcher with a function-calling loop over tools/ (shortest_path,
+    inventory_state, hospital_queue_state). Tool results are memoized per tick.
+
+    Returns:
+        tuple: (actions_dict, messages, response_text, tool_stats)
+    """
+    messages = build_strategy_messages(context, strategy=strategy, scratchpad=scratchpad)
+    return get_validated_actions_with_tools(messages, model, tick, max_rounds=max_rounds, context=context)
+
+
+# ----------------------
+# Sharded planning
+# ----------------------
+def partition_agents(agents, shards=4, by="spatial"):
+    """
+    Split agents into planning groups.
+
+    Args:
+        agents: "agents" list from the context
+        shards: maximum number of groups
+        by: "spatial" (recursive median split along the wider axis) or "role" (one group per kind)
+
+    Returns:
+        list of non-empty agent lists
+    """
+    if by == "role":
+        groups = {}
+        for a in agents:
+            groups.setdefault(a.get("kind", "agent"), []).append(a)
+        return [groups[k] for k in sorted(groups)]
+
+    groups = [list(agents)]
+    while len(groups) < shards:
+        groups.sort(key=len, reverse=True)
+        big = groups[0]
+        if len(big) < 2:
+            break
+        xs = [a["pos"][0] for a in big]
+        ys = [a["pos"][1] for a in big]
+        axis = 0 if max(xs) - min(xs) >= max(ys) - min(ys) else 1
+        big = sorted(big, key=lambda a: (a["pos"][axis], a["pos"][1 - axis], str(a["id"])))
+        mid = len(big) // 2
+        groups[0:1] = [big[:mid], big[mid:]]
+    return [g for g in groups if g]
+
+
+def _step_towards(pos, target):
+    dx, dy = target[0] - pos[0], target[1] - pos[1]
+    if abs(dx) > abs(dy):
+        return [pos[0] + (1 if dx > 0 else -1), pos[1]]
+    if dy != 0:
+        return [pos[0], pos[1] + (1 if dy > 0 else -1)]
+    return list(pos)
+
+
+def _claimed_survivor(cmd, agent, survivors):
+    """Index of the survivor a free medic is heading for (nearest survivor to its target cell)."""
+    if cmd.get("type") == "move" and cmd.get("to"):
+        target = cmd["to"]
+    elif cmd.get("action_name") == "pickup_survivor":
+        target = agent["pos"]
+    else:
+        return None
+    best, best_d = None, None
+    for i, s in enumerate(survivors):
+        d = abs(s["pos"][0] - target[0]) + abs(s["pos"][1] - target[1])
+        if best_d is None or d < best_d:
+            best, best_d = i, d
+    return best
+
+
+def merge_shard_commands(context, shard_commands):
+    """
+    Merge per-shard command lists into one plan.
+
+    Keeps one command per agent (first shard wins) and resolves survivor
+    conflicts: when several free medics head for the same survivor, the closest
+    keeps it and the others are redirected one step towards the nearest
+    unclaimed survivor.
+    """
+    agents = {str(a["id"]): a for a in context.get("agents", [])}
+    survivors = context.get("survivors", []) or []
+
+    merged, seen = [], set()
+    for cmds in shard_commands:
+        for cmd in cmds:
+            aid = str(cmd.get("agent_id"))
+            if aid in seen or aid not in agents:
+                continue
+            seen.add(aid)
+            merged.append(cmd)
+
+    claims = {}
+    for i, cmd in enumerate(merged):
+        agent = agents[str(cmd["agent_id"])]
+        if agent.get("kind") != "medic" or agent.get("carrying"):
+            continue
+        sid = _claimed_survivor(cmd, agent, survivors)
+        if sid is not None:
+            claims.setdefault(sid, []).append(i)
+
+    taken = set(claims)
+    for sid, idxs in claims.items():
+        if len(idxs) < 2:
+            continue
+        spos = survivors[sid]["pos"]
+        idxs.sort(key=lambda i: abs(agents[str(merged[i]["agent_id"])]["pos"][0] - spos[0])
+                  + abs(agents[str(merged[i]["agent_id"])]["pos"][1] - spos[1]))
+        for i in idxs[1:]:
+            agent = agents[str(merged[i]["agent_id"])]
+            free = [j for j in range(len(survivors)) if j not in taken]
+            if not free:
+                merged[i] = None
+                continue
+            j = min(free, key=lambda j: abs(survivors[j]["pos"][0] - agent["pos"][0])
+                    + abs(survivors[j]["pos"][1] - agent["pos"][1]))
+            taken.add(j)
+            target = survivors[j]["pos"]
+            if list(target) == list(agent["pos"]):
+                merged[i] = {"agent_id": str(agent["id"]), "type": "act", "action_name": "pickup_survivor"}
+            else:
+                merged[i] = {"agent_id": str(agent["id"]), "type": "move", "to": _step_towards(agent["pos"], target)}
+    return [cmd for cmd in merged if cmd is not None]
+
+
+def make_sharded_plan_with_logging(context, strategy="react", scratchpad="", shards=4, by="spatial",
+                                   shard_tokens=1500, max_workers=None):
+    """
+    Plan for large fleets by splitting agents into shards and planning them concurrently.
+
+    Each shard gets a focused sub-context (its own agents plus the entities
+    nearest to them, bounded by shard_tokens) and its own LLM call; the command
+    sets are merged with merge_shard_commands(). Tick latency is bounded by the
+    slowest shard rather than by the total number of agents.
+
+    Returns:
+        tuple: (actions_dict, messages, response_text, shard_stats, shard_texts)
+        where messages / response_text concatenate every shard for logging
+        (response_text is not one JSON document: validate shard_texts, the raw
+        output of each shard, instead) and shard_stats is a list of
+        {"shard", "agents", "latency_ms", "commands"}.
+    """
+    context = context_data(context)
+    groups = partition_agents(context.get("agents", []), shards=shards, by=by)
+    if not groups:
+        actions, messages, text = make_plan_with_logging(context, strategy=strategy, scratchpad=scratchpad)
+        return actions, messages, text, [], [text]
+
+    def plan_shard(i, group):
+        sub = dict(context)
+        sub["agents"] = group
+        sub = TickState(build_budgeted_context(sub, max_tokens=shard_tokens))
+        messages = build_strategy_messages(sub, strategy=strategy, scratchpad=scratchpad)
+        t0 = time.perf_counter()
+        actions, text = get_validated_actions_with_logging(
+            messages, logger=logger, context=sub, cache_key=_cache_key(sub, strategy, scratchpad))
+        latency_ms = (time.perf_counter() - t0) * 1000.0
+        return messages, text, actions.get("commands", []), {
+            "shard": i, "agents": len(group), "latency_ms": round(latency_ms, 3),
+        }
+
+    with ThreadPoolExecutor(max_workers=max_workers or len(groups)) as pool:
+        results = list(pool.map(lambda args: plan_shard(*args), enumerate(groups)))
+
+    commands = merge_shard_commands(context, [r[2] for r in results])
+    messages, texts, stats = [], [], []
+    for msgs, text, cmds, stat in results:
+        messages.extend(msgs)
+        texts.append(f"--- shard {stat['shard']} ---\n{text}")
+        stat["commands"] = len(cmds)
+        stats.append(stat)
+    return {"commands": commands}, messages, "\n".join(texts), stats, [r[1] for r in results]
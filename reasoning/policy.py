@@ -0,0 +1,183 @@
+# reasoning/policy.py
+import logging
+from typing import Dict, Any, List, Optional
+
+from .llm_client import mock_policy
+from .state import TickState
+
+logger = logging.getLogger(__name__)
+
+
+class Policy:
+    """
+    observe -> commands.
+
+    A policy sees the summarize_state() dict of one tick and returns the
+    command list for CrisisModel.set_plan(). LLM strategies and native
+    heuristics share this interface so the episode loop does not care which
+    one is driving.
+    """
+
+    name = "policy"
+
+    def reset(self, seed: Optional[int] = None):
+        """Called once before an episode starts."""
+
+    def observe(self, tick: int, state: Dict[str, Any]) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def close(self):
+        """Release threads / connections held by the policy."""
+
+
+class LLMPolicy(Policy):
+    """
+    Adapter for the prompt-based strategies (react, cot, tot, ...).
+
+    The last exchange is kept in `messages` / `response_text` so a caller that
+    logs prompts can pick it up after observe().
+    """
+
+    name = "llm"
+
+    def __init__(self, strategy: str = "react", scratchpad: str = "", context_tokens: Optional[int] = None):
+        self.strategy = strategy
+        self.scratchpad = scratchpad
+        self.context_tokens = context_tokens
+        self.messages: List[Dict[str, str]] = []
+        self.response_text: Optional[str] = None
+
+    def observe(self, tick, state):
+        from .planner import make_plan_with_logging
+        from .context import build_budgeted_context
+
+        context = state if self.context_tokens is None else build_budgeted_context(state, max_tokens=self.context_tokens)
+        plan, self.messages, self.response_text = make_plan_with_logging(
+            TickState(context, tick=tick), strategy=self.strategy, scratchpad=self.scratchpad)
+        return plan.get("commands", [])
+
+
+class HeuristicPolicy(Policy):
+    """The mock provider's nearest-target rules, called directly (no prompt, no parsing)."""
+
+    name = "heuristic"
+
+    def observe(self, tick, state):
+        return mock_policy(state)
+
+
+class NumpyHeuristicPolicy(Policy):
+    """
+    Same rules as HeuristicPolicy, with the nearest-target searches done as
+    one Manhattan distance matrix per target kind instead of a Python loop per
+    agent. Produces identical commands; pays off once maps carry hundreds of
+    survivors / fires.
+    """
+
+    name = "numpy"
+
+    def __init__(self):
+        import numpy as np
+        self.np = np
+
+    def _nearest(self, pos, targets):
+        """Index of and distance to the nearest target for every row of pos (first wins ties)."""
+        np = self.np
+        if len(targets) == 0 or len(pos) == 0:
+            return None, None
+        dist = np.abs(pos[:, None, :] - targets[None, :, :]).sum(axis=2)
+        idx = dist.argmin(axis=1)
+        return idx, dist[np.arange(len(pos)), idx]
+
+    def _step(self, pos, target):
+        np = self.np
+        d = target - pos
+        step = np.where(d > 0, 1, -1)
+        along_x = np.abs(d[:, 0]) > np.abs(d[:, 1])
+        nxt = pos.copy()
+        nxt[along_x, 0] += step[along_x, 0]
+        nxt[~along_x, 1] += step[~along_x, 1]
+        return nxt
+
+    def observe(self, tick, state):
+        np = self.np
+        agents = state.get("agents", []) or []
+        if not agents:
+            return []
+        survivors = np.array([s["pos"] for s in state.get("survivors", []) or []], dtype=np.int64).reshape(-1, 2)
+        fires = np.array(state.get("fires", []) or [], dtype=np.int64).reshape(-1, 2)
+        rubble = np.array(state.get("rubble", []) or [], dtype=np.int64).reshape(-1, 2)
+        hospitals = np.array([h["pos"] for h in state.get("hospitals", []) or []], dtype=np.int64).reshape(-1, 2)
+        depot = np.array(state.get("depot", [1, 1]), dtype=np.int64)
+
+        pos = np.array([a["pos"] for a in agents], dtype=np.int64).reshape(-1, 2)
+        kind = np.array([a["kind"] for a in agents])
+        carrying = np.array([bool(a.get("carrying", False)) for a in agents])
+        battery = np.array([a.get("battery", 100) for a in agents], dtype=np.float64)
+
+        out: Dict[int, Dict[str, Any]] = {}
+
+        def move(rows, target):
+            for i, to in zip(rows, self._step(pos[rows], target)):
+                out[i] = {"agent_id": agents[i]["id"], "type": "move", "to": [int(to[0]), int(to[1])]}
+
+        def act(rows, name):
+            for i in rows:
+                out[i] = {"agent_id": agents[i]["id"], "type": "act", "action_name": name}
+
+        # medics: deliver when carrying, otherwise go for the nearest survivor
+        rows = np.flatnonzero((kind == "medic") & carrying)
+        idx, dist = self._nearest(pos[rows], hospitals)
+        if idx is not None:
+            act(rows[dist == 0], "drop_at_hospital")
+            out.update({i: {"agent_id": agents[i]["id"], "type": "move", "to": [int(x) for x in hospitals[j]]}
+                        for i, j in zip(rows[dist > 0], idx[dist > 0])})
+
+        rows = np.flatnonzero((kind == "medic") & ~carrying)
+        idx, dist = self._nearest(pos[rows], survivors)
+        if idx is not None:
+            act(rows[dist == 0], "pickup_survivor")
+            move(rows[dist > 0], survivors[idx[dist > 0]])
+
+        # trucks: fires first, then rubble
+        rows = np.flatnonzero(kind == "truck")
+        for targets, action in ((fires, "extinguish_fire"), (rubble, "clear_rubble")):
+            if len(targets):
+                idx, dist = self._nearest(pos[rows], targets)
+                if idx is not None:
+                    act(rows[dist == 0], action)
+                    move(rows[dist > 0], targets[idx[dist > 0]])
+                break
+
+        # drones: recharge below 20% battery, otherwise shadow the nearest survivor
+        drones = kind == "drone"
+        rows = np.flatnonzero(drones & (battery < 20))
+        at_depot = (pos[rows] == depot).all(axis=1)
+        act(rows[at_depot], "recharge")
+        move(rows[~at_depot], np.broadcast_to(depot, (int((~at_depot).sum()), 2)))
+        rows = np.flatnonzero(drones & (battery >= 20))
+        idx, _ = self._nearest(pos[rows], survivors)
+        if idx is not None:
+            move(rows, survivors[idx])
+
+        return [out[i] for i in sorted(out)]
+
+
+POLICIES = {
+    "llm": LLMPolicy,
+    "heuristic": HeuristicPolicy,
+    "numpy": NumpyHeuristicPolicy,
+}
+
+
+def make_policy(name: str, **kwargs) -> Policy:
+    """
+    Build a policy by name.
+
+    Args:
+        name: one of POLICIES ("llm", "heuristic", "numpy")
+        **kwargs: passed to the policy constructor (e.g. strategy= for "llm")
+    """
+    if name not in POLICIES:
+        raise ValueError(f"Unknown policy: {name} (expected one of {sorted(POLICIES)})")
+    return POLICIES[name](**kwargs)
@@ -1,5 +1,5 @@
 # reasoning/react.py
-import json
+from .state import context_text
 
 SYSTEM_PROMPT = """
 You are an autonomous disaster response planner.
@@ -17,7 +17,7 @@ Rules:
 """
 
 def build_messages(context_json, scratchpad=None):
-    user_msg = "CONTEXT_JSON:\n" + json.dumps(context_json)
+    user_msg = "CONTEXT_JSON:\n" + context_text(context_json)
     user_msg += "\n\nAllowed actions: move, act. Follow schema exactly."
 
     # tiny demonstration
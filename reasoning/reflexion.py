@@ -1,17 +1,20 @@
 # reasoning/reflexion.py
 import json
+from .state import context_text
 
 SYSTEM_PROMPT = """
 You are a Reflexion-based disaster planner.
-Use context and optional SCRATCHPAD (past errors, rules).
+Use context and optional SCRATCHPAD (lessons distilled from past failures).
 Always output FINAL_JSON matching schema.
 If SCRATCHPAD mentions invalid JSON, fix that issue.
 """
 
 def build_messages(context_json, scratchpad=None):
-    user_msg = "CONTEXT_JSON:\n" + json.dumps(context_json)
+    user_msg = "CONTEXT_JSON:\n" + context_text(context_json)
     if scratchpad:
-        user_msg += "\n\nSCRATCHPAD:\n" + json.dumps(scratchpad)
+        if not isinstance(scratchpad, str):
+            scratchpad = json.dumps(scratchpad)
+        user_msg += "\n\nSCRATCHPAD:\n" + scratchpad
     return [
         {"role": "system", "content": SYSTEM_PROMPT},
         {"role": "user", "content": user_msg},
@@ -24,7 +27,7 @@ def reflexion_plan(context_json, scratchpad=None):
     
     Args:
         context_json: Current world state from sensors
-        scratchpad: Running memory/log of past errors and corrections
+        scratchpad: Lessons retrieved from ReflexionMemory (plain text)
     
     Returns:
         List of messages for LLM call
@@ -0,0 +1,37 @@
+# reasoning/state.py
+import hashlib
+import json
+from typing import Dict, Any, Optional, Union
+
+
+class TickState:
+    """
+    World state of one tick, serialized exactly once.
+
+    Holds the dict from summarize_state(), its serialized text / bytes (the same
+    json.dumps() text the strategies always put after CONTEXT_JSON:) and a
+    content hash. Strategy builders, the .txt log, the response cache and the
+    mock provider all read from here instead of dumping or parsing the state again.
+    """
+
+    __slots__ = ("tick", "data", "text", "bytes", "hash")
+
+    def __init__(self, data: Dict[str, Any], tick: Optional[int] = None):
+        self.tick = tick
+        self.data = data
+        self.text = json.dumps(data)
+        self.bytes = self.text.encode("utf-8")
+        self.hash = hashlib.blake2b(self.bytes, digest_size=16).hexdigest()
+
+    def __repr__(self):
+        return f"TickState(tick={self.tick}, hash={self.hash[:8]}, bytes={len(self.bytes)})"
+
+
+def context_text(context: Union["TickState", Dict[str, Any]]) -> str:
+    """Serialized context: the cached text of a TickState, or json.dumps() of a plain dict."""
+    return context.text if isinstance(context, TickState) else json.dumps(context)
+
+
+def context_data(context: Union["TickState", Dict[str, Any]]) -> Dict[str, Any]:
+    """Plain dict view of a context (TickState or dict)."""
+    return context.data if isinstance(context, TickState) else context
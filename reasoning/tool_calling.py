@@ -0,0 +1,214 @@
+# reasoning/tool_calling.py
+import json
+import logging
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+
+from tools.routing import shortest_path
+from tools.resources import inventory_state
+from tools.hospital import hospital_queue_state
+from .llm_client import call_llm
+from .utils import validate_action_json
+from eval.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# ----------------------
+# Tool registry
+# ----------------------
+# Every tool takes the live model as first argument; the LLM only supplies the
+# keyword arguments described in "parameters".
+TOOLS = {
+    "shortest_path": {
+        "fn": lambda model, start, goal, avoid=("fire", "rubble"): shortest_path(model, start, goal, avoid=tuple(avoid)),
+        "description": "A* path on the 4-connected grid avoiding fire and rubble. Returns {status, path, cost}.",
+        "parameters": {"start": "[x, y]", "goal": "[x, y]", "avoid": "optional list of cell types"},
+    },
+    "inventory_state": {
+        "fn": lambda model, agent_id: inventory_state(model, agent_id),
+        "description": "Battery, energy, water, tools and carrying state of one agent.",
+        "parameters": {"agent_id": "string"},
+    },
+    "hospital_queue_state": {
+        "fn": lambda model: hospital_queue_state(model),
+        "description": "Queue length per hospital and the service rate.",
+        "parameters": {},
+    },
+}
+
+TOOLS_PROMPT = """
+You can call tools before answering. To call tools, output one line:
+TOOL_CALLS: [{"name": "<tool>", "arguments": {...}}, ...]
+and stop. Results come back as TOOL_RESULTS. Independent calls in one line run in parallel.
+When you are done, output FINAL_JSON as usual.
+Tools:
+"""
+
+
+def tools_system_prompt() -> str:
+    lines = [f"- {name}({json.dumps(spec['parameters'])}): {spec['description']}" for name, spec in TOOLS.items()]
+    return TOOLS_PROMPT + "\n".join(lines)
+
+
+class ToolCache:
+    """
+    Memoizes tool results of one model per (tick, tool, arguments).
+
+    The world does not change during a tick, so repeated calls from retries,
+    shards or other strategies planning the same model in the same tick are
+    served from memory. Entries from older ticks are dropped when a new tick
+    is first seen. Results depend on the model, so every model gets its own
+    cache (cache_for); never share one between models.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tick = None
+        self._data: Dict[tuple, Any] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, tick, name, arguments):
+        return (tick, name, json.dumps(arguments, sort_keys=True))
+
+    def get(self, key):
+        with self._lock:
+            if key[0] != self._tick:
+                self._tick = key[0]
+                self._data.clear()
+            if key in self._data:
+                self.hits += 1
+                return True, self._data[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value):
+        with self._lock:
+            if key[0] == self._tick:
+                self._data[key] = value
+
+
+_MODEL_CACHES = weakref.WeakKeyDictionary()    # model -> ToolCache, dropped with the model
+_MODEL_CACHES_LOCK = threading.Lock()
+
+
+def cache_for(model) -> ToolCache:
+    """The ToolCache of `model` (created on first use)."""
+    with _MODEL_CACHES_LOCK:
+        cache = _MODEL_CACHES.get(model)
+        if cache is None:
+            cache = _MODEL_CACHES[model] = ToolCache()
+        return cache
+
+
+def parse_tool_calls(text: str) -> List[Dict[str, Any]]:
+    """Return the calls from a `TOOL_CALLS: [...]` line, or [] if the text has none."""
+    if not text:
+        return []
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith("TOOL_CALLS:"):
+            try:
+                calls = json.loads(line[len("TOOL_CALLS:"):].strip())
+            except json.JSONDecodeError:
+                return []
+            return [c for c in calls if isinstance(c, dict) and c.get("name") in TOOLS]
+    return []
+
+
+def run_tool_calls(model, tick, calls, cache: Optional[ToolCache] = None, max_workers=8):
+    """
+    Execute tool calls in parallel, memoized per tick (in the model's own
+    cache unless `cache` is given). model.tool_calls counts executions only;
+    calls served from the cache show up as "cached" in the stats.
+
+    Returns:
+        tuple: (results, stats) where results is a list of
+        {"name", "arguments", "result"} in call order and stats a list of
+        {"name", "latency_ms", "cached"}.
+    """
+    cache = cache if cache is not None else cache_for(model)
+
+    def run_one(call):
+        name, args = call["name"], call.get("arguments") or {}
+        key = cache.key(tick, name, args)
+        t0 = time.perf_counter()
+        hit, result = cache.get(key)
+        if not hit:
+            with span(f"tool:{name}"):
+                try:
+                    result = TOOLS[name]["fn"](model, **args)
+                except Exception as e:
+                    result = {"status": "error", "reason": str(e)}
+            cache.put(key, result)
+        latency_ms = (time.perf_counter() - t0) * 1000.0
+        logger.debug(f"tool {name} {'(cached) ' if hit else ''}took {latency_ms:.2f} ms")
+        return {"name": name, "arguments": args, "result": result}, {
+            "name": name, "latency_ms": round(latency_ms, 3), "cached": hit,
+        }
+
+    if len(calls) == 1:
+        out = [run_one(calls[0])]
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(calls))) as pool:
+            out = list(pool.map(run_one, calls))
+    if hasattr(model, "tool_calls"):
+        model.tool_calls += sum(1 for _, s in out if not s["cached"])
+    return [r for r, _ in out], [s for _, s in out]
+
+
+def get_validated_actions_with_tools(messages, model, tick, max_rounds=3, cache=None, temperature=0.2, context=None):
+    """
+    Function-calling loop: let the LLM call tools until it answers with FINAL_JSON.
+
+    Args:
+        messages: strategy messages (the tools prompt is appended to the system message)
+        model: live CrisisModel the tools read from
+        tick: current tick (cache key)
+        max_rounds: maximum tool rounds before the answer is forced
+        context: optional TickState the messages were built from (handed to the provider)
+
+    Returns:
+        tuple: (actions_dict, messages, response_text, tool_stats)
+    """
+    msgs = [dict(m) for m in messages]
+    if msgs and msgs[0]["role"] == "system":
+        msgs[0]["content"] = msgs[0]["content"] + tools_system_prompt()
+    else:
+        msgs.insert(0, {"role": "system", "content": tools_system_prompt()})
+
+    tool_stats = []
+    text = ""
+    for _ in range(max_rounds):
+        text = call_llm(msgs, temperature=temperature, context=context)["content"]
+        calls = parse_tool_calls(text)
+        if not calls:
+            break
+        results, stats = run_tool_calls(model, tick, calls, cache=cache)
+        tool_stats.extend(stats)
+        msgs.append({"role": "assistant", "content": text})
+        msgs.append({"role": "user", "content": "TOOL_RESULTS: " + json.dumps(results)})
+    else:
+        msgs.append({"role": "system", "content": "No more tool calls. Output FINAL_JSON now."})
+        text = call_llm(msgs, temperature=temperature, context=context)["content"]
+
+    try:
+        return validate_action_json(text), msgs, text, tool_stats
+    except ValueError as e1:
+        logger.warning(f"Invalid JSON attempt 1: {e1}")
+        retry = msgs + [{
+            "role": "system",
+            "content": (
+                "Your previous output was invalid JSON / schema mismatch. "
+                "Produce ONLY the final JSON matching schema and nothing else."
+            ),
+        }]
+        text2 = call_llm(retry, temperature=temperature, context=context)["content"]
+        try:
+            return validate_action_json(text2), retry, text2, tool_stats
+        except ValueError as e2:
+            logger.error(f"Invalid JSON attempt 2: {e2} — defaulting to empty commands.")
+            return {"commands": []}, retry, text2, tool_stats
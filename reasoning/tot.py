@@ -1,5 +1,5 @@
 # reasoning/tot.py
-import json
+from .state import context_text
 
 SYSTEM_PROMPT = """
 You are a Tree-of-Thought (ToT) disaster planner.
@@ -8,7 +8,7 @@ Then select the best branch and output FINAL_JSON strictly following schema.
 """
 
 def build_messages(context_json, scratchpad=None):
-    user_msg = "CONTEXT_JSON:\n" + json.dumps(context_json)
+    user_msg = "CONTEXT_JSON:\n" + context_text(context_json)
     return [
         {"role": "system", "content": SYSTEM_PROMPT},
         {"role": "user", "content": user_msg + "\n\nExplore branches, then decide."},
@@ -1,8 +1,11 @@
 # reasoning/utils.py
 import json
-import jsonschema
 from typing import Dict, Any
-from .llm_client import call_llm
+from .llm_client import call_llm, RESPONSE_CACHE
+from eval.tracing import traced
+
+_TOKEN_ENCODER = None
+_ACTION_VALIDATOR = None
 
 # ----------------------
 # JSON Action Schema
@@ -35,6 +38,28 @@ ACTION_SCHEMA = {
 }
 
 
+def count_tokens(text: str) -> int:
+    """
+    Count prompt tokens for budgeting.
+
+    Uses tiktoken's cl100k_base encoding when it is installed, otherwise falls
+    back to the usual ~4 characters per token estimate.
+    """
+    global _TOKEN_ENCODER
+    if not text:
+        return 0
+    if _TOKEN_ENCODER is None:
+        try:
+            import tiktoken
+            _TOKEN_ENCODER = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _TOKEN_ENCODER = False
+    if _TOKEN_ENCODER:
+        return len(_TOKEN_ENCODER.encode(text))
+    return (len(text) + 3) // 4
+
+
+@traced("validate")
 def validate_action_json(s: str) -> Dict[str, Any]:
     """
     Extract and validate FINAL_JSON from a string.
@@ -60,13 +85,32 @@ def validate_action_json(s: str) -> Dict[str, Any]:
         raise ValueError(f"malformed json: {e}")
 
     try:
-        jsonschema.validate(instance=data, schema=ACTION_SCHEMA)
+        error = _action_validator()(data)
     except Exception as e:
         raise ValueError(f"schema validation error: {e}")
+    if error is not None:
+        raise ValueError(f"schema validation error: {error}")
 
     return data
 
 
+def _action_validator():
+    """
+    Checker for ACTION_SCHEMA, built on first use: jsonschema is imported only
+    when a response is validated, and the schema is checked and compiled once
+    instead of on every jsonschema.validate() call. The checker returns the
+    error jsonschema.validate() would raise, or None.
+    """
+    global _ACTION_VALIDATOR
+    if _ACTION_VALIDATOR is None:
+        import jsonschema
+        cls = jsonschema.validators.validator_for(ACTION_SCHEMA)
+        cls.check_schema(ACTION_SCHEMA)
+        validator = cls(ACTION_SCHEMA)
+        _ACTION_VALIDATOR = lambda data: jsonschema.exceptions.best_match(validator.iter_errors(data))
+    return _ACTION_VALIDATOR
+
+
 def get_validated_actions(messages, model=None, temperature=0.2, logger=None) -> Dict[str, Any]:
     """
     Call LLM and enforce JSON validity. Retry once with stricter instructions.
@@ -104,17 +148,25 @@ def get_validated_actions(messages, model=None, temperature=0.2, logger=None) ->
             return {"commands": []}
 
 
-def get_validated_actions_with_logging(messages, model=None, temperature=0.2, logger=None):
+def get_validated_actions_with_logging(messages, model=None, temperature=0.2, logger=None, context=None, cache_key=None):
     """
     Call LLM and enforce JSON validity. Retry once with stricter instructions.
     Returns both actions and response text for logging.
 
+    Args:
+        context: optional TickState the messages were built from (handed to the provider)
+        cache_key: optional RESPONSE_CACHE key; a hit skips the first provider call
+
     Returns:
         tuple: (actions_dict, response_text)
     """
     # ---- First Attempt ----
-    resp = call_llm(messages, model=model, temperature=temperature)
-    text = resp["content"]
+    text = RESPONSE_CACHE.get(cache_key) if cache_key is not None else None
+    if text is None:
+        resp = call_llm(messages, model=model, temperature=temperature, context=context)
+        text = resp["content"]
+        if cache_key is not None:
+            RESPONSE_CACHE.put(cache_key, text)
 
     try:
         actions = validate_action_json(text)
@@ -132,7 +184,7 @@ def get_validated_actions_with_logging(messages, model=None, temperature=0.2, lo
                 ),
             }
         ]
-        resp2 = call_llm(retry_messages, model=model, temperature=temperature)
+        resp2 = call_llm(retry_messages, model=model, temperature=temperature, context=context)
         text2 = resp2["content"]
 
         try:
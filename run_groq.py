@@ -6,7 +6,6 @@ Usage: python3 run_groq.py [strategy] [ticks] [map]
 
 import os
 import sys
-import subprocess
 from pathlib import Path
 
 def main():
@@ -36,9 +35,9 @@ def main():
     print(f"Map: {map_file}")
     print("-" * 50)
     
-    # Run the simulation
-    cmd = [
-        "python3", "main.py",
+    # Run the simulation in this process (no second interpreter start-up)
+    import main as simulation
+    argv = [
         "--map", map_file,
         "--strategy", strategy,
         "--ticks", ticks,
@@ -46,12 +45,16 @@ def main():
     ]
     
     try:
-        result = subprocess.run(cmd, check=True)
-        print("\n" + "=" * 50)
-        print("Simulation completed successfully!")
-    except subprocess.CalledProcessError as e:
+        simulation.main(argv)
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            print(f"\nSimulation failed with exit code: {e.code}")
+            sys.exit(1)
+    except Exception as e:
         print(f"\nSimulation failed with error: {e}")
         sys.exit(1)
+    print("\n" + "=" * 50)
+    print("Simulation completed successfully!")
 
 if __name__ == "__main__":
     main()
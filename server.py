@@ -1,10 +1,10 @@
 # server.py — Mesa 1.2.1 compatible, enhanced GUI (legend, stats, charts)
 import os
-import yaml
 from typing import Dict, Tuple, Iterable
 from mesa.visualization.modules import CanvasGrid, ChartModule, TextElement
 from mesa.visualization.ModularVisualization import ModularServer
 from env.world import CrisisModel
+from env.mapcache import load_map_config
 from env.agents import DroneAgent, MedicAgent, TruckAgent, Survivor
 
 MAP_PATH = "configs/map_small.yaml"  # change if needed
@@ -60,8 +60,7 @@ def load_cfg(path: str) -> Dict:
     if not os.path.exists(path):
         # No YAML — run with an empty config
         return {}
-    with open(path, "r", encoding="utf-8") as f:
-        return yaml.safe_load(f) or {}
+    return load_map_config(path)
 
 
 def _iter_points_from_cfg(cfg: Dict) -> Iterable[Tuple[int, int]]:
@@ -109,22 +108,24 @@ class StatsPanel(TextElement):
     a concise human-readable snapshot for the sidebar.
     """
     def render(self, model) -> str:
-        # survivors still on the map (not picked, not dead)
-        on_map = sum(
-            1 for a in model.schedule.agents
-            if a.__class__.__name__ == "Survivor"
-            and not getattr(a, "_picked", False)
-            and not getattr(a, "_dead", False)
-        )
-
-        # survivors currently being carried by medics
-        carrying_now = sum(
-            1 for a in model.schedule.agents
-            if a.__class__.__name__ == "MedicAgent" and getattr(a, "carrying", False)
-        )
-
-        # survivors waiting in hospital queues (not yet admitted)
-        queued = sum(len(q) for q in getattr(model, "hospital_queues", {}).values())
+        index = getattr(model, "world_index", None)
+        if index is not None:
+            # counters kept by the env.spatial.WorldIndex hooks, no scan
+            c = index.counters
+            on_map, carrying_now, queued = c.on_map, c.carried, c.queued
+        else:
+            # one pass over the schedule: survivors still on the map (not picked,
+            # not dead) and medics currently carrying
+            on_map = carrying_now = 0
+            for a in model.schedule.agents:
+                name = a.__class__.__name__
+                if name == "Survivor":
+                    on_map += not getattr(a, "_picked", False) and not getattr(a, "_dead", False)
+                elif name == "MedicAgent":
+                    carrying_now += bool(getattr(a, "carrying", False))
+
+            # survivors waiting in hospital queues (not yet admitted)
+            queued = sum(len(q) for q in getattr(model, "hospital_queues", {}).values())
 
         # termination / final lock
         terminated = not getattr(model, "running", True)
@@ -179,8 +180,24 @@ class LegendPanel(TextElement):
 
 # ---------------- Launch ----------------
 
-def launch(port: int = 8521):
-    cfg = load_cfg(MAP_PATH)
+def launch(port: int = 8521, replay: str = None):
+    model_cls, map_path, params = CrisisModel, MAP_PATH, {"rng_seed": SEED}
+    if replay:
+        # visualize a recorded run: same map + seed, recorded commands, no LLM calls
+        from eval.replay import ReplayModel, load_recording, seed_globals
+
+        class SeededReplayModel(ReplayModel):
+            # seed the global RNGs like run_episode / replay_episode did, here so
+            # that the browser's Reset (a new model) replays from the same state
+            def __init__(self, *args, rng_seed=SEED, **kwargs):
+                seed_globals(rng_seed)
+                super().__init__(*args, rng_seed=rng_seed, **kwargs)
+
+        header, ticks = load_recording(replay)
+        model_cls, map_path = SeededReplayModel, header.get("map", MAP_PATH)
+        params = {"rng_seed": header.get("seed", SEED), "recording": ticks}
+
+    cfg = load_cfg(map_path)
     width, height = infer_grid_size(cfg, default=(20, 20))
 
     grid = CanvasGrid(agent_portrayal, width, height, CANVAS_W, CANVAS_H)
@@ -199,10 +216,10 @@ def launch(port: int = 8521):
     stats = StatsPanel()
 
     server = ModularServer(
-        CrisisModel,
+        model_cls,
         [legend, stats, grid, charts],  # order = top-to-bottom in UI
-        "CrisisSim",
-        {"width": width, "height": height, "rng_seed": SEED, "config": cfg, "render": True},
+        "CrisisSim (replay)" if replay else "CrisisSim",
+        {"width": width, "height": height, "config": cfg, "render": True, **params},
     )
     server.port = port
     print(f"Starting web UI at http://127.0.0.1:{port}  (Ctrl+C to stop)")
@@ -210,4 +227,9 @@ def launch(port: int = 8521):
 
 
 if __name__ == "__main__":
-    launch(port=8522)  # different port to avoid conflicts
+    import argparse
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=8522)  # different port to avoid conflicts
+    ap.add_argument("--replay", type=str, default=None, help="replay.jsonl or run dir to visualize")
+    args = ap.parse_args()
+    launch(port=args.port, replay=args.replay)